@@ -0,0 +1,315 @@
+from __future__ import unicode_literals
+
+import asyncio
+import os
+import signal
+import subprocess
+import time
+from datetime import datetime
+
+from radish.executor import (
+    BaseExecutor,
+    ExecutionResult,
+    Executor,
+    OutputPump,
+    new_process_group,
+    reap,
+    resource_usage,
+    signal_process,
+)
+from radish.utils import TimeTaken
+
+
+class AsyncExecutor(BaseExecutor):
+    """Runs commands as subprocesses of an asyncio event loop
+
+    All projects passed to :meth:`run_all` share one event loop in the
+    calling thread, so running hundreds of them at the same time doesn't
+    need a thread per project.
+    """
+    CHUNK_SIZE = Executor.CHUNK_SIZE
+
+    def __init__(self, outputter=None, base_path='.', process_groups=False):
+        self.outputter = outputter
+        self.base_path = base_path
+        self.process_groups = process_groups
+        self._running = {}
+        self._terminated = False
+        self._loop = None
+        self._exits = {}
+        self._watching_children = False
+
+    def execute(self, path, command, outputter=None):
+        if command is None:
+            return self._null_response()
+
+        return self._run_until_complete(self.execute_async(path, command, outputter))
+
+    def run_all(self, jobs, max_jobs, on_done=None, poll_interval=None, on_poll=None,
+                on_start=None):
+        """Runs all jobs with at most ``max_jobs`` running at the same time
+
+        Args:
+            jobs (Iterable[tuple[Path, str, Union[Outputter, None]]]): The
+                path, command, and outputter of each job to run, they're
+                started in order
+            max_jobs (int): How many jobs to run at the same time, jobs
+                that haven't started when :meth:`terminate` is called
+                are cancelled
+            on_done (Callable[[Path, asyncio.Future], Union[Iterable, None]]):
+                Called in the calling thread as each job finishes, the
+                future holds the :class:`ExecutionResult` or the raised
+                exception. Jobs it returns are started as well.
+            poll_interval (Union[float, None]): Seconds between calls of
+                ``on_poll`` while jobs are running
+            on_poll (Callable[[], Union[Iterable, None]]): Called in the
+                calling thread every ``poll_interval``, jobs it returns are
+                started as well
+            on_start (Callable[[Path], None]): Called in the calling
+                thread as each job starts
+
+        Returns:
+            list[asyncio.Future]: The finished jobs in the order they finished
+        """
+        return self._run_until_complete(
+            self._run_all(list(jobs), max_jobs, on_done, poll_interval, on_poll, on_start)
+        )
+
+    async def execute_async(self, path, command, outputter=None):
+        """
+
+        Args:
+            path (Path): the path where the command should be executed
+            command (str): the command to execute
+            outputter (Union[Outputter, SpooledOutputter, None]): Where to
+                write the output instead of the executor's outputter
+
+        Returns:
+            ExecutionResult: The result of running the command
+        """
+        if command is None:
+            return self._null_response()
+
+        outputter = outputter or self.outputter
+        missing = self._skip_missing(path, outputter)
+        if missing is not None:
+            return missing
+
+        loop = asyncio.get_event_loop()
+        start_time = datetime.now()
+
+        # Started and reaped here instead of by asyncio, which throws
+        # away the resources the process used
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            cwd=str(path),
+            stderr=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            **(new_process_group() if self.process_groups else {})
+        )
+        self._running[process.pid] = (process, str(path))
+        try:
+            await asyncio.gather(
+                self._pump(loop, process.stdout, outputter and outputter.info),
+                self._pump(loop, process.stderr, outputter and outputter.error),
+            )
+            usage = await self._wait(loop, process)
+        finally:
+            self._running.pop(process.pid, None)
+
+        return ExecutionResult(
+            exit_code=process.returncode,
+            run_time=TimeTaken(datetime.now() - start_time),
+            path=path,
+            **resource_usage(usage)
+        )
+
+    def terminate(self, grace_period=None, paths=None):
+        """Stops the running commands, must be called from the event loop's thread
+
+        Jobs that haven't started are cancelled unless ``paths`` is given.
+        """
+        if paths is None:
+            self._terminated = True
+        else:
+            paths = {str(path) for path in paths}
+        running = [process for process, path in self._running.values()
+                   if paths is None or path in paths]
+
+        def send(signum):
+            for process in running:
+                # The returncode is set once the process is reaped and its pid can be reused
+                if process.returncode is None:
+                    signal_process(process.pid, signum, self.process_groups)
+
+        send(signal.SIGTERM)
+
+        grace_period = self.GRACE_PERIOD if grace_period is None else grace_period
+        if not running:
+            return
+        if self._loop is not None:
+            self._loop.call_later(grace_period, send, signal.SIGKILL)
+        else:
+            # Interrupted, the loop that would have reaped them is gone
+            self._stop(running, grace_period, send)
+
+    def _stop(self, processes, grace_period, send):
+        """Waits for terminated processes outside of the event loop
+
+        Args:
+            processes (list[subprocess.Popen]): The terminated processes
+            grace_period (float): Seconds to wait before killing them
+            send (Callable[[int], None]): Sends a signal to the ones that
+                are still running
+        """
+        deadline = time.time() + grace_period
+        for process in processes:
+            try:
+                process.wait(max(deadline - time.time(), 0))
+            except subprocess.TimeoutExpired:
+                pass
+
+        send(signal.SIGKILL)
+        for process in processes:
+            process.wait()
+            self._running.pop(process.pid, None)
+
+    async def _run_all(self, jobs, max_jobs, on_done, poll_interval=None, on_poll=None,
+                       on_start=None):
+        semaphore = asyncio.Semaphore(max_jobs)
+        self._terminated = False
+
+        async def run(path, command, outputter):
+            # Released once on_done has handled the job, so terminating
+            # from on_done is seen by every job that hasn't started
+            await semaphore.acquire()
+            if self._terminated:
+                return ExecutionResult.cancel(path)
+            if on_start:
+                on_start(path)
+
+            return await self.execute_async(path, command, outputter)
+
+        pending = {asyncio.ensure_future(run(*job)): job[0] for job in jobs}
+        finished = []
+
+        def start(new_jobs):
+            for job in new_jobs or ():
+                pending[asyncio.ensure_future(run(*job))] = job[0]
+
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                path = pending.pop(future)
+                finished.append(future)
+                if on_done:
+                    start(on_done(path, future))
+                semaphore.release()
+
+            if on_poll and not done:
+                start(on_poll())
+
+        return finished
+
+    async def _pump(self, loop, pipe, stream):
+        reader = asyncio.StreamReader(loop=loop)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe
+        )
+        output = OutputPump(stream, self.CHUNK_SIZE)
+
+        try:
+            chunk = await reader.read(self.CHUNK_SIZE)
+            while chunk:
+                output.feed(chunk)
+                chunk = await reader.read(self.CHUNK_SIZE)
+        finally:
+            transport.close()
+
+        output.close()
+
+    async def _wait(self, loop, process):
+        """Waits for a process to exit without blocking the event loop
+
+        The exit is told by a pidfd where there is one, otherwise by
+        SIGCHLD when the loop runs in the main thread. Only elsewhere is
+        it waited for in a thread.
+
+        Returns:
+            Union[resource.struct_rusage, None]: The resources it used,
+                where the platform can tell
+        """
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):  # Before Python 3.9 or Linux 5.3
+            pidfd = None
+
+        if pidfd is not None:
+            exited = loop.create_future()
+            loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+        elif self._watch_children(loop):
+            exited = self._exits[process.pid] = loop.create_future()
+            # It may have exited before there was anything to tell
+            self._check_exits()
+            try:
+                await exited
+            finally:
+                self._exits.pop(process.pid, None)
+        elif hasattr(os, 'waitid'):
+            await loop.run_in_executor(
+                None, os.waitid, os.P_PID, process.pid, os.WEXITED | os.WNOWAIT
+            )
+        else:  # pragma: no cover
+            self._running.pop(process.pid, None)
+            return await loop.run_in_executor(None, reap, process)
+
+        # Reaped in the loop's thread right after it's no longer running,
+        # so terminate never signals a pid that was reused
+        self._running.pop(process.pid, None)
+        return reap(process)
+
+    def _watch_children(self, loop):
+        """Has the loop check on the waited for processes on every SIGCHLD
+
+        Returns:
+            bool: Whether it does, signals are only handled by a loop in
+                the main thread
+        """
+        if not self._watching_children and hasattr(os, 'waitid'):
+            try:
+                loop.add_signal_handler(signal.SIGCHLD, self._check_exits)
+            except (ValueError, RuntimeError, NotImplementedError):  # Not in the main thread
+                return False
+            self._watching_children = True
+
+        return self._watching_children
+
+    def _check_exits(self):
+        # Signals are merged while one is pending, so every process is checked
+        for pid, exited in list(self._exits.items()):
+            try:
+                # Not reaped yet, so its pid can't be reused while terminate may signal it
+                waited = os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+            except ChildProcessError:  # Reaped already
+                waited = True
+            if waited is not None and not exited.done():
+                exited.set_result(None)
+
+    def _run_until_complete(self, coroutine):
+        self._loop = loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            if self._watching_children:
+                loop.remove_signal_handler(signal.SIGCHLD)
+                self._watching_children = False
+            self._loop = None
+            loop.close()
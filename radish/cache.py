@@ -0,0 +1,471 @@
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+
+class DiffCache(object):
+    def __init__(self, directory, max_entries=256):
+        """Stores the changed projects between two commits on disk
+
+        Each entry is a small JSON file named after its key, the least
+        recently used entries are removed when there are more than
+        ``max_entries`` of them.
+
+        Args:
+            directory (str): Where to store the cache entries
+            max_entries (int): How many entries to keep before evicting
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(from_commit, to_commit, paths, differ=''):
+        """
+
+        Args:
+            from_commit (str): The resolved sha of the commit to compare from
+            to_commit (str): The resolved sha of the commit to compare to
+            paths (Iterable[Path]): The configured paths that changes are matched against
+            differ (str): The name of the differ that compares the commits,
+                differs don't have to agree on what changed
+
+        Returns:
+            str: A key identifying the diff between the commits for these paths
+        """
+        digest = hashlib.sha1()
+        for value in [differ, from_commit, to_commit] + sorted(str(path) for path in paths):
+            digest.update(value.encode('utf-8'))
+            digest.update(b'\0')
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+
+        Args:
+            key (str): A key created by :meth:`key`
+
+        Returns:
+            Union[list[str], None]: The cached paths or ``None`` when
+                there's no entry for the key
+        """
+        filename = self._filename(key)
+
+        try:
+            with open(filename, 'r') as fh:
+                paths = json.load(fh)
+            os.utime(filename, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        return paths
+
+    def set(self, key, paths):
+        """
+
+        Args:
+            key (str): A key created by :meth:`key`
+            paths (Iterable[Union[str, Path]]): The paths to store
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        fd, tmp_filename = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(sorted(str(path) for path in paths), fh)
+        os.rename(tmp_filename, self._filename(key))
+
+        self._evict()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, '{0}.json'.format(key))
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                filename = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(filename), filename))
+                except OSError:  # Evicted by another radish in the meantime
+                    continue
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, filename in entries[0:len(entries) - self.max_entries]:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
+class ConfigCache(object):
+    # Bump when what read_config produces changes shape
+    VERSION = 2
+
+    def __init__(self, filename):
+        """Stores a parsed Radishfile, with its globs expanded, as JSON
+
+        Only the plain data from the YAML is stored, so reading the cache
+        can't run anything. The entry is only used for the same
+        Radishfile contents, working directory, and Python version, and
+        while none of the directories the globs listed have changed.
+
+        Args:
+            filename (str): The file to store the parsed config in
+        """
+        self.filename = filename
+
+    def get(self, digest):
+        """
+
+        Args:
+            digest (str): The hash of the contents of the Radishfile
+
+        Returns:
+            Union[dict, None]: The parsed config or ``None`` when there's
+                no valid entry
+        """
+        try:
+            with open(self.filename, 'r') as fh:
+                entry = json.load(fh)
+        except (IOError, OSError, ValueError):  # Missing, truncated, or not JSON
+            return None
+
+        if not isinstance(entry, dict) or entry.get('key') != self._key(digest):
+            return None
+
+        for directory, mtime in entry['directories'].items():
+            try:
+                if os.stat(directory).st_mtime != mtime:
+                    return None
+            except OSError:
+                return None
+
+        return entry['config']
+
+    def set(self, digest, config, directories):
+        """
+
+        Args:
+            digest (str): The hash of the contents of the Radishfile
+            config (dict): The parsed config, as plain data
+            directories (dict[str, float]): The modification time of each
+                directory the globs listed, from before they were listed
+
+        Raises:
+            TypeError: When the config holds values JSON can't store
+            ValueError: When the config wouldn't be the same read back,
+                like with keys that aren't strings
+        """
+        entry = {
+            'key': self._key(digest),
+            'directories': dict(directories),
+            'config': config,
+        }
+        contents = json.dumps(entry)
+        if json.loads(contents)['config'] != config:
+            raise ValueError('The config changes when stored as JSON')
+
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        fd, tmp_filename = tempfile.mkstemp(dir=directory or '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(contents)
+        os.rename(tmp_filename, self.filename)
+
+    def _key(self, digest):
+        return [self.VERSION, digest, os.getcwd(), list(sys.version_info[:2])]
+
+
+class CacheBackend(object):
+    """Where the results of commands are cached
+
+    A result is a small dict of what's known about a successful run.
+    Backends can also store the outputs the command created as a
+    ``tar.gz`` archive, which is restored when the result is reused.
+    """
+
+    @staticmethod
+    def key(tree_id, command, environment=None, dependencies=None):
+        """
+
+        Args:
+            tree_id (str): The id of the tree of the project
+            command (str): The command run for the project
+            environment (dict[str, str]): The environment variables that
+                affect the result of the command
+            dependencies (dict[str, str]): The id of the tree of every
+                project it depends on, directly or through other projects
+
+        Returns:
+            str: A key identifying the result
+        """
+        digest = hashlib.sha1()
+        values = [tree_id, command] + [
+            '{0}={1}'.format(name, value) for name, value in sorted((environment or {}).items())
+        ]
+        if dependencies:
+            values.append('depends_on')
+            values.extend('{0}={1}'.format(path, dependency_tree_id)
+                          for path, dependency_tree_id in sorted(dependencies.items()))
+        for value in values:
+            digest.update(value.encode('utf-8'))
+            digest.update(b'\0')
+
+        return digest.hexdigest()
+
+    def get(self, key):  # pragma: no cover
+        """
+
+        Args:
+            key (str): A key created by :meth:`key`
+
+        Returns:
+            Union[dict, None]: The cached result or ``None`` when there's
+                no entry for the key
+
+        Raises:
+            IOError: When the backend can't be reached
+        """
+        raise NotImplementedError('get is not implemented')
+
+    def set(self, key, result, artifacts=None):  # pragma: no cover
+        """
+
+        Args:
+            key (str): A key created by :meth:`key`
+            result (dict): What to store about the result
+            artifacts (Union[bytes, None]): A ``tar.gz`` archive of the
+                outputs of the command, stored before the result
+
+        Raises:
+            IOError: When the backend can't be reached
+        """
+        raise NotImplementedError('set is not implemented')
+
+    def artifacts(self, key):  # pragma: no cover
+        """
+
+        Args:
+            key (str): A key created by :meth:`key`
+
+        Returns:
+            Union[bytes, None]: The archive stored with the result, or
+                ``None`` when there's none
+
+        Raises:
+            IOError: When the backend can't be reached
+        """
+        raise NotImplementedError('artifacts is not implemented')
+
+
+class DirectoryBackend(CacheBackend):
+    def __init__(self, directory, max_size=16 * 1024 * 1024):
+        """Stores results as files in a directory, which can be shared
+
+        The least recently used files are removed when they take up more
+        than ``max_size`` bytes together.
+
+        Args:
+            directory (str): Where to store the cache entries
+            max_size (int): How many bytes to keep before evicting
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    def get(self, key):
+        data = self._read('{0}.json'.format(key))
+        if data is None:
+            return None
+
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def set(self, key, result, artifacts=None):
+        if artifacts is not None:
+            self._write('{0}.tar.gz'.format(key), artifacts)
+        self._write('{0}.json'.format(key), json.dumps(result, sort_keys=True).encode('utf-8'))
+
+        self._evict()
+
+    def artifacts(self, key):
+        return self._read('{0}.tar.gz'.format(key))
+
+    def _filename(self, key):
+        return os.path.join(self.directory, '{0}.json'.format(key))
+
+    def _read(self, name):
+        filename = os.path.join(self.directory, name)
+
+        try:
+            with open(filename, 'rb') as fh:
+                data = fh.read()
+            os.utime(filename, None)
+        except (IOError, OSError):
+            return None
+
+        return data
+
+    def _write(self, name, data):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        fd, tmp_filename = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.rename(tmp_filename, os.path.join(self.directory, name))
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(('.json', '.tar.gz')):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:  # Evicted by someone else sharing the directory
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            size -= entry_size
+
+
+class HTTPBackend(CacheBackend):
+    def __init__(self, url, timeout=10):
+        """Stores results on an HTTP server
+
+        Results are read with ``GET <url>/<key>.json`` and written with
+        ``PUT``, artifacts live next to them as ``<key>.tar.gz``. A
+        ``404`` is a miss.
+
+        Args:
+            url (str): The base URL of the cache
+            timeout (float): Seconds to wait for the server
+        """
+        self.url = url.rstrip('/') + '/'
+        self.timeout = timeout
+
+    def get(self, key):
+        data = self._get('{0}.json'.format(key))
+        if data is None:
+            return None
+
+        return json.loads(data.decode('utf-8'))
+
+    def set(self, key, result, artifacts=None):
+        if artifacts is not None:
+            self._put('{0}.tar.gz'.format(key), artifacts, 'application/gzip')
+        self._put(
+            '{0}.json'.format(key),
+            json.dumps(result, sort_keys=True).encode('utf-8'),
+            'application/json'
+        )
+
+    def artifacts(self, key):
+        return self._get('{0}.tar.gz'.format(key))
+
+    def _get(self, name):
+        from six.moves.urllib.error import HTTPError
+        from six.moves.urllib.request import urlopen
+
+        try:
+            response = urlopen(self.url + name, timeout=self.timeout)
+        except HTTPError as exc:
+            if exc.code == 404:
+                return None
+            raise
+
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def _put(self, name, data, content_type):
+        from six.moves.urllib.request import Request, urlopen
+
+        request = Request(self.url + name, data=data, headers={'Content-Type': content_type})
+        request.get_method = lambda: 'PUT'
+
+        urlopen(request, timeout=self.timeout).close()
+
+
+def create_backend(location, max_size=None, timeout=None):
+    """
+
+    Args:
+        location (str): An ``http://`` or ``https://`` URL, or a directory
+        max_size (Union[int, None]): Bytes a directory keeps before evicting
+        timeout (Union[float, None]): Seconds to wait for an HTTP server
+
+    Returns:
+        CacheBackend: The backend for the location
+    """
+    if location.startswith(('http://', 'https://')):
+        return HTTPBackend(location, **({} if timeout is None else {'timeout': timeout}))
+
+    return DirectoryBackend(location, **({} if max_size is None else {'max_size': max_size}))
+
+
+def pack_outputs(directory, outputs):
+    """
+
+    Args:
+        directory (str): The directory of the project
+        outputs (list[str]): Files and directories in it to pack, the
+            ones that don't exist are left out
+
+    Returns:
+        bytes: A ``tar.gz`` archive of the outputs
+    """
+    import tarfile
+
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode='w:gz') as archive:
+        for output in outputs:
+            filename = os.path.join(directory, output)
+            if os.path.exists(filename):
+                archive.add(filename, arcname=output.rstrip('/'))
+
+    return data.getvalue()
+
+
+def unpack_outputs(data, directory):
+    """Extracts the outputs packed by :func:`pack_outputs`
+
+    Links and members outside of the directory are left out.
+
+    Args:
+        data (bytes): A ``tar.gz`` archive
+        directory (str): The directory of the project
+    """
+    import tarfile
+
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as archive:
+        members = [
+            member for member in archive.getmembers()
+            if not (os.path.isabs(member.name) or '..' in member.name.split('/') or
+                    member.issym() or member.islnk())
+        ]
+
+        if hasattr(tarfile, 'data_filter'):
+            archive.extractall(directory, members, filter='data')
+        else:  # pragma: no cover
+            archive.extractall(directory, members)
@@ -1,87 +1,796 @@
 from __future__ import unicode_literals, print_function
 
-import concurrent.futures
+import fnmatch
 import glob
+import hashlib
 import itertools
 import os
+import signal
+import sys
+import threading
 
 import six
-import yaml
-from docopt import docopt
 
 import radish
 from radish import differs
+from radish import scheduler
 from radish import splitter
+from radish import cache
+from radish.cache import ConfigCache, DiffCache
 from radish.command import Command
-from radish.executor import Executor, ExecutionResults
-from radish.outputter import Outputter
-from radish.path import Path
-from radish.utils import timer
+from radish.executor import Executor, ExecutionResult, ExecutionResults
+from radish.graph import DependencyGraph, DependencyQueue
+from radish.outputter import Outputter, SpooledOutputter
+from radish.path import Path, PathIndex
+from radish.timings import Timings
+from radish.utils import timer, total_seconds, TimeTaken
 
 
 class CLI(object):
-    def __init__(self, base_path='.', config=None, executor=None, differ=None, outputter=None):
+    # How many results are looked up in, or stored to, the cache at the same time
+    CACHE_THREADS = 8
+    # Seconds between checks for finished lookups while projects wait on them
+    LOOKUP_POLL_INTERVAL = 0.1
+    # Seconds interrupted projects get to exit before they're killed
+    INTERRUPT_GRACE_PERIOD = 1
+
+    def __init__(self, base_path='.', config=None, executor=None, differ=None, outputter=None,
+                 cache_diffs=False, cache_results=False):
         self.base_dir = os.path.abspath(base_path)
         self.outputter = outputter or Outputter()
         self.executor = executor or Executor(base_path=self.base_dir, outputter=self.outputter)
         self.config = config
         self.differ = differ or differs.Git(self.base_dir)
+        self.cache_diffs = cache_diffs
+        self.cache_results = cache_results
         self.results = ExecutionResults()
+        self._path_index = None
+        self._graph = None
+        self._diff_cache = None
+        self._result_cache = None
+        self._result_keys = {}
+        self._lookups = {}
+        self._looking_up = {}
+        self._cache_pool = None
+        self._outputs = None
+        self._start_order = {}
+        self._starts = itertools.count()
+        self._output_lock = threading.RLock()
+        self._tail = False
+        self._fail_fast = False
+        self._cancelling = False
+        self._completed = None
+        self._controller = None
+        self._max_jobs = 1
+        self._backlog = []
+        self._running = {}
+        self._budget = None
+        self._resources = {}
+
+    @property
+    def diff_cache(self):
+        """
+        Returns:
+            Union[DiffCache, None]: The cache of changed projects between
+                commits, ``None`` when caching is off or the differ has
+                nowhere to store it.
+        """
+        if self._diff_cache is None and self.cache_diffs and self.differ.cache_dir:
+            self._diff_cache = DiffCache(os.path.join(self.differ.cache_dir, 'diffs'))
+        return self._diff_cache
+
+    @diff_cache.setter
+    def diff_cache(self, value):
+        self._diff_cache = value
+
+    @property
+    def result_cache(self):
+        """
+        Returns:
+            Union[CacheBackend, None]: The cache of successful results,
+                ``None`` when caching is off or there's nowhere to store it.
+        """
+        if self._result_cache is None and self.cache_results:
+            options = self._result_cache_options(('backend', 'max_size', 'timeout'))
+            backend = options.pop('backend', None)
+
+            if backend is None and self.differ.cache_dir:
+                backend = os.path.join(self.differ.cache_dir, 'results')
+            elif backend is not None and '://' not in backend:
+                backend = os.path.join(self.base_dir, backend)
+
+            if backend is not None:
+                self._result_cache = cache.create_backend(backend, **options)
+        return self._result_cache
+
+    @result_cache.setter
+    def result_cache(self, value):
+        self._result_cache = value
+
+    @property
+    def path_index(self):
+        """
+        Returns:
+            PathIndex: An index of the configured paths, built on first use
+        """
+        if self._path_index is None:
+            self._path_index = PathIndex(self.config['paths'])
+        return self._path_index
+
+    @property
+    def graph(self):
+        """
+        Returns:
+            DependencyGraph: The dependencies between the configured paths
+
+        Raises:
+            ValueError: When ``depends_on`` in the config isn't valid
+        """
+        if self._graph is None:
+            self._graph = DependencyGraph(self.config['paths'], self.config.get('depends_on'))
+        return self._graph
+
+    def run(self, command_name, paths, jobs=1, tail=False, timings=None, fail_fast=False,
+            peak_rss=None):
+        """Runs a command for the paths
+
+        With more than one job the output of each project is captured
+        and written when the project finishes, so output from projects
+        running at the same time doesn't interleave.
+
+        When results are cached, projects whose tree already succeeded
+        with the same command aren't run again. The cache is looked up
+        in the background while projects are being scheduled.
+
+        Executors that can run many projects themselves, like
+        :class:`radish.async_executor.AsyncExecutor`, are handed all projects
+        at once instead of being called from a thread pool.
+
+        A project starts as soon as the projects it depends on have
+        succeeded, and is skipped if one of them fails.
+
+        With ``fail_fast`` the first failure cancels every project that
+        hasn't started and terminates the ones that are running, they're
+        recorded as cancelled. They start in process groups of their own
+        then, so when radish is interrupted it terminates them itself.
+
+        With a :class:`radish.scheduler.ConcurrencyController` as ``jobs``
+        projects start while fewer are running than it allows, and how
+        that changed is kept in ``concurrency_changes`` of the results.
+
+        Projects also share a budget of CPUs and memory, set by
+        ``resources`` in the config. By default that's a CPU per job and
+        the memory available when the run starts. A project only starts
+        when the CPUs and memory its command needs fit next to the
+        running ones, or when nothing else is running. The memory a
+        project used before wins over what its command claims.
 
-    def run(self, command_name, paths, jobs=1):
+        Args:
+            command_name (Union[str, Command]): The command to run
+            paths (Iterable[Path]): The paths to run the command for
+            jobs (Union[int, ConcurrencyController]): How many projects
+                to run at the same time
+            tail (bool): When running in parallel, write the output of
+                the longest running project as it happens
+            timings (dict[str, float]): How many seconds each path usually
+                takes, the slowest projects are started first and the
+                total run time is predicted
+            fail_fast (bool): Stop running projects after the first failure
+            peak_rss (dict[str, int]): The peak memory in kilobytes each
+                path used in earlier runs
+
+        Returns:
+            ExecutionResults: The results of all run projects
+        """
         if isinstance(command_name, Command):
             command = command_name
         else:
             command = self.find_command(command_name)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool_executor:
-            futures = self._schedule_command(command, paths, pool_executor)
-            self._resolve_futures(futures)
+        import concurrent.futures
+
+        if isinstance(jobs, scheduler.ConcurrencyController):
+            self._controller, self._max_jobs = jobs, jobs.max_jobs
+        else:
+            self._controller, self._max_jobs = None, jobs
+        self._backlog = []
+        self._running = {}
+
+        items = self._order_items(command, paths, self._jobs(), timings)
+        self._budget = self._resource_budget()
+        self._resources = {path: self._project_resources(command, path, peak_rss or {})
+                           for path, _ in items}
+        queue = DependencyQueue(self.graph, items)
+        self._fail_fast = fail_fast
+        self._cancelling = False
+        if fail_fast:
+            # Terminating a project has to stop everything it started
+            self.executor.process_groups = True
+
+        self._look_up_results(items)
+        try:
+            if hasattr(self.executor, 'run_all'):
+                self._outputs = {}
+                self._tail = tail or self._max_jobs == 1
+
+                def on_done(path, future):
+                    self._release(path)
+                    result = self._resolve_result(path, future.result)
+                    self._backlog.extend(self._next_items(queue, path, result))
+                    # The event loop stops once nothing runs, unless there's something to start
+                    self._backlog.extend(self._looked_up_items(queue, wait=not self._running))
+                    return self._prepare_command(command, self._admit())
+
+                def on_poll():
+                    self._backlog.extend(self._looked_up_items(queue))
+                    return self._prepare_command(command, self._admit())
+
+                self._backlog.extend(self._ready_items(queue))
+                self._backlog.extend(self._looked_up_items(queue, wait=True))
+                try:
+                    self.executor.run_all(
+                        self._prepare_command(command, self._admit()),
+                        self._max_jobs,
+                        on_start=self._started,
+                        on_done=on_done,
+                        poll_interval=self._poll_interval(),
+                        on_poll=on_poll
+                    )
+                except KeyboardInterrupt:
+                    self._interrupt()
+                    raise
+            else:
+                self._outputs = {} if self._max_jobs > 1 else None
+                self._tail = tail
+
+                self._completed = six.moves.queue.Queue()
+                for lookup in self._lookups.values():
+                    # Wakes up the scheduler to start or skip the project
+                    lookup.add_done_callback(self._completed.put)
+                with concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self._max_jobs) as pool_executor:
+                    try:
+                        self._backlog.extend(self._ready_items(queue))
+                        futures = self._schedule_command(command, self._admit(), pool_executor)
+                        self._resolve_futures(futures, command, queue, pool_executor)
+                    except KeyboardInterrupt:
+                        # Before leaving the pool, which waits for the running projects
+                        self._interrupt()
+                        raise
+        finally:
+            self._store_results()
+            if self._controller is not None:
+                self.results.concurrency_changes = list(self._controller.changes)
 
         return self.results
 
-    def changed_projects(self, from_commit=None, to_commit=None):
+    def _interrupt(self):
+        """Stops the running projects when radish is interrupted
+
+        Projects in a process group of their own don't get the Ctrl-C
+        radish got, and would keep running without it.
+        """
+        self.outputter.error.write('Interrupted, stopping the running projects\n')
+        self.executor.terminate(grace_period=self.INTERRUPT_GRACE_PERIOD)
+
+    def changed_projects(self, from_commit=None, to_commit=None, uncommitted=False):
+        """
+
+        Args:
+            from_commit (Union[str, None]): The commit to compare from,
+                every configured path has changed without it
+            to_commit (Union[str, None]): The commit to compare to, or
+                ``None`` for the working copy
+            uncommitted (bool): Only the paths with staged, unstaged or
+                untracked files have changed, the commits are ignored
+
+        Returns:
+            set[Path]: The changed paths and every path depending on them
+        """
+        if uncommitted:
+            return self.graph.with_dependents(self.differ.dirty_paths(self.path_index))
+
         if from_commit is None:
             return set(self.config['paths'])
 
-        return match(
-            self.differ.changed_files_between(
-                from_commit=from_commit,
-                to_commit=to_commit
-            ),
-            self.config['paths']
+        return self.graph.with_dependents(self._changed_projects(from_commit, to_commit))
+
+    def _changed_projects(self, from_commit, to_commit):
+        # Without a to commit the diff is against the working copy, which can change
+        if to_commit is None or self.diff_cache is None:
+            return self._changed_projects_between(from_commit, to_commit)
+
+        key = self.diff_cache.key(
+            self.differ.resolve_commit(from_commit),
+            self.differ.resolve_commit(to_commit),
+            self.config['paths'],
+            differ=type(self.differ).__name__
         )
+        cached = self.diff_cache.get(key)
+        if cached is not None:
+            return {Path(path) for path in cached}
+
+        changed = self._changed_projects_between(from_commit, to_commit)
+        try:
+            self.diff_cache.set(key, changed)
+        except (IOError, OSError) as exc:
+            self.outputter.error.write('Failed to cache the changed paths: {0}\n'.format(exc))
+
+        return changed
+
+    def _changed_projects_between(self, from_commit, to_commit):
+        return self.differ.changed_paths_between(
+            from_commit=from_commit,
+            to_commit=to_commit,
+            paths=self.path_index
+        )
+
+    def expand_paths(self, commit):
+        """Expands the globbed paths against the tree of a commit
+
+        Projects are then found the way they are in the commit, not in
+        the working copy. Differs that can't read trees fall back to
+        the working copy.
+
+        Args:
+            commit (str): A commit reference
+        """
+        patterns = [str(path) for path in self.config['paths']]
+        globs = [pattern for pattern in patterns if Path.GLOB_CHARACTER in pattern]
+        if not globs:
+            return
+
+        expanded = self.differ.expand_globs(globs, commit)
+        if expanded is None:
+            expanded = {pattern: sorted(glob.glob(pattern)) for pattern in globs}
+
+        self.config['paths'] = [
+            Path(name)
+            for pattern in patterns
+            for name in expanded.get(pattern, [pattern])
+        ]
+        self._path_index = None
+        self._graph = None
 
     def find_command(self, command_name):
         return next((c for c in self.config['commands'] if c.name == command_name), None)
 
-    def _schedule_command(self, command, paths, pool_executor):
-        futures = dict()
-        for path, cmd in command.items(filter=paths):
-            if cmd is None:
+    def _order_items(self, command, paths, jobs, timings):
+        items = [(path, cmd) for path, cmd in command.items(filter=paths) if cmd is not None]
+        if not timings:
+            return items
+
+        expected = scheduler.expected_times(timings, [str(path) for path, _ in items])
+        items = scheduler.order_by_timings(items, expected)
+        self.results.predicted_run_time = TimeTaken(scheduler.predict_run_time(
+            [expected[str(path)] for path, _ in items],
+            jobs
+        ))
+
+        return items
+
+    def _jobs(self):
+        """
+
+        Returns:
+            int: How many projects to run at the same time now
+        """
+        if self._controller is None:
+            return self._max_jobs
+
+        return self._controller.update()
+
+    def _poll_interval(self):
+        """
+
+        Returns:
+            Union[float, None]: Seconds between checks whether more
+                projects can start, ``None`` when only finished projects
+                make room
+        """
+        intervals = [self._controller.interval] if self._controller else []
+        if self._lookups:  # Looked up projects can start or be skipped any time
+            intervals.append(self.LOOKUP_POLL_INTERVAL)
+
+        return min(intervals) if intervals else None
+
+    def _admit(self):
+        """Takes as many waiting projects as can start now
+
+        Projects that don't fit the resource budget wait, projects after
+        them that do fit start in the meantime.
+
+        Returns:
+            list[tuple[Path, str]]: The projects to start
+        """
+        limit = self._jobs()
+        items, waiting = [], []
+
+        for path, cmd in self._backlog:
+            resources = self._resources[path]
+            if len(self._running) < limit and (self._budget.fits(resources) or
+                                               not self._running):
+                self._budget.take(resources)
+                self._running[path] = resources
+                items.append((path, cmd))
+            else:
+                waiting.append((path, cmd))
+
+        self._backlog = waiting
+
+        return items
+
+    def _release(self, path):
+        """Gives back what a project that stopped running took from the budget
+
+        Args:
+            path (Path): The project that stopped running
+        """
+        resources = self._running.pop(path, None)
+        if resources is not None:
+            self._budget.give(resources)
+
+    def _resource_budget(self):
+        """
+
+        Returns:
+            ResourceBudget: The CPUs and memory the projects share
+        """
+        options = self.config.get('resources') or {}
+        memory = scheduler.parse_memory(options.get('memory'))
+
+        return scheduler.ResourceBudget(
+            cpu=options.get('cpu', self._max_jobs),
+            memory=scheduler.available_memory() if memory is None else memory
+        )
+
+    def _project_resources(self, command, path, peak_rss):
+        resources = command.resources(path)
+        if peak_rss.get(str(path)):
+            resources = resources._replace(memory=peak_rss[str(path)])
+
+        return resources
+
+    def _look_up_results(self, items):
+        """Starts looking up the cached result of every project
+
+        Args:
+            items (list[tuple[Path, str]]): The path and command of each project
+        """
+        self._result_keys = {}
+        self._lookups = {}
+        if self.result_cache is None or not items:
+            return
+
+        import concurrent.futures
+
+        # A result is only reused when the projects it depends on are the same too
+        dependencies = {path: self.graph.with_dependencies([path]) - {path} for path, _ in items}
+        paths = sorted(set(dependencies).union(*dependencies.values()), key=str)
+        dirty = self.differ.dirty_paths(paths)
+        tree_ids = self.differ.tree_ids([path for path in paths if path not in dirty])
+        environment = {name: os.environ.get(name, '')
+                       for name in self._result_cache_options(('env',)).get('env', [])}
+
+        self._cache_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.CACHE_THREADS)
+        for path, cmd in items:
+            if all(project in tree_ids for project in dependencies[path] | {path}):
+                key = self.result_cache.key(tree_ids[path], cmd, environment, {
+                    str(dependency): tree_ids[dependency] for dependency in dependencies[path]
+                })
+                self._result_keys[path] = key
+                self._lookups[path] = self._cache_pool.submit(self._restore_result, path, key)
+
+    def _restore_result(self, path, key):
+        """
+
+        Args:
+            path (Path): The project to restore the result of
+            key (str): The key of the project's result
+
+        Returns:
+            bool: Whether there was a result, and the project's outputs
+                were restored
+        """
+        import tarfile
+
+        outputs = self._result_cache_options(('outputs',)).get('outputs')
+
+        try:
+            if self.result_cache.get(key) is None:
+                return False
+
+            if outputs:
+                artifacts = self.result_cache.artifacts(key)
+                if artifacts is None:
+                    return False
+                cache.unpack_outputs(artifacts, os.path.join(self.base_dir, str(path)))
+        except (IOError, OSError, ValueError, tarfile.TarError) as exc:
+            self.outputter.error.write(
+                'Failed to look up the cached result for "{0}": {1}\n'.format(path, exc)
+            )
+            return False
+
+        return True
+
+    def _ready_items(self, queue):
+        """Takes the projects that can start
+
+        Projects whose cached result is still being looked up wait in
+        ``_looking_up``, :meth:`_looked_up_items` starts or skips them.
+
+        Args:
+            queue (DependencyQueue): The projects left to run
+
+        Returns:
+            list[tuple[Path, str]]: The projects that have to run
+        """
+        items = []
+        for path, cmd in queue.ready():
+            if path in self._lookups:
+                self._looking_up[path] = cmd
+            else:
+                items.append((path, cmd))
+
+        return items
+
+    def _looked_up_items(self, queue, wait=False):
+        """Handles the projects whose cached result has been looked up
+
+        Projects with a cached result are done, the projects that became
+        ready because of them are taken as well.
+
+        Args:
+            queue (DependencyQueue): The projects left to run
+            wait (bool): Wait for the lookups until there's a project to
+                run, or no project is waiting on its lookup anymore
+
+        Returns:
+            list[tuple[Path, str]]: The projects that have to run
+        """
+        import concurrent.futures
+
+        items = []
+        while self._looking_up:
+            finished = [path for path in self._looking_up if self._lookups[path].done()]
+            if not finished:
+                if not wait or items or self._backlog:
+                    break
+                concurrent.futures.wait([self._lookups[path] for path in self._looking_up],
+                                        return_when=concurrent.futures.FIRST_COMPLETED)
                 continue
 
-            self.outputter.info.write('Running {0} for {1}:\n'.format(command.name, path))
+            for path in finished:
+                cmd = self._looking_up.pop(path)
+                if self._lookups.pop(path).result():
+                    self.results.add(ExecutionResult.from_cache(path))
+                    queue.done(path)
+                    items.extend(self._ready_items(queue))
+                else:
+                    items.append((path, cmd))
 
-            futures[pool_executor.submit(self.executor.execute, path, cmd)] = path
+        return items
 
-            self.outputter.info.write('\n')
+    def _store_results(self):
+        import concurrent.futures
+
+        if self._cache_pool is None:
+            return
+
+        for lookup in self._lookups.values():
+            lookup.cancel()
+
+        outputs = self._result_cache_options(('outputs',)).get('outputs')
+        stores = {}
+        for result in self.results:
+            key = self._result_keys.get(result.path)
+            if key is not None and result.success and not result.cached:
+                stores[self._cache_pool.submit(self._store_result, result, key, outputs)] = result
+
+        for future in concurrent.futures.as_completed(stores):
+            try:
+                future.result()
+            except (IOError, OSError) as exc:
+                self.outputter.error.write(
+                    'Failed to cache the result for "{0}": {1}\n'.format(stores[future].path, exc)
+                )
+
+        self._cache_pool.shutdown()
+        self._cache_pool = None
+
+    def _store_result(self, result, key, outputs):
+        artifacts = None
+        if outputs:
+            artifacts = cache.pack_outputs(os.path.join(self.base_dir, str(result.path)), outputs)
+
+        self.result_cache.set(key, {
+            'run_time': total_seconds(result.run_time),
+            'cpu_time': result.cpu_time,
+            'max_rss': result.max_rss,
+        }, artifacts)
+
+    def _result_cache_options(self, names):
+        options = self.config.get('cache_results')
+        if not isinstance(options, dict):
+            return {}
+
+        return {name: options[name] for name in names if name in options}
+
+    def _schedule_command(self, command, items, pool_executor):
+        futures = dict()
+        for path, cmd in items:
+            if self._outputs is None:
+                self.outputter.info.write('Running {0} for {1}:\n'.format(command.name, path))
+
+                future = pool_executor.submit(self.executor.execute, path, cmd)
+
+                self.outputter.info.write('\n')
+            else:
+                output = self._spool_output(command, path)
+
+                future = pool_executor.submit(self._execute, path, cmd, output)
+
+            futures[future] = path
+            future.add_done_callback(self._completed.put)
 
         return futures
 
-    def _resolve_futures(self, futures):
-        for future in concurrent.futures.as_completed(futures):
-            path = futures[future]
+    def _execute(self, path, cmd, output):
+        # In a thread of the pool, once the project actually starts
+        self._started(path)
+
+        return self.executor.execute(path, cmd, output)
+
+    def _prepare_command(self, command, items):
+        return [(path, cmd, self._spool_output(command, path)) for path, cmd in items]
+
+    def _spool_output(self, command, path):
+        output = SpooledOutputter(lock=self._output_lock)
+        output.info.write('Running {0} for {1}:\n'.format(command.name, path))
+        with self._output_lock:
+            self._outputs[path] = output
+
+        return output
+
+    def _started(self, path):
+        with self._output_lock:
+            if self._outputs and path in self._outputs:
+                self._start_order[path] = next(self._starts)
+
+        self._tail_longest_running()
+
+    def _resolve_futures(self, futures, command, queue, pool_executor):
+        # Every future, and every cache lookup, puts itself on the completion
+        # queue when it's done, so futures submitted later are waited on
+        # without starting over
+        while True:
+            # The projects that became ready, and more when the controller allows it
+            self._backlog.extend(self._looked_up_items(queue))
+            items = self._admit()
+            if items:
+                futures.update(self._schedule_command(command, items, pool_executor))
+
+            if not futures and not self._looking_up:
+                break
+
             try:
-                self.results.add(future.result())
-            except Exception as exc:
-                self.results.add(radish.executor.ExecutionResult(99, 0, path))
+                future = self._completed.get(timeout=self._poll_interval())
+            except six.moves.queue.Empty:
+                future = None
+
+            if future in futures:
+                path = futures.pop(future)
+                self._release(path)
+                result = self._resolve_result(path, future.result)
+                self._backlog.extend(self._next_items(queue, path, result))
+
+                if self._cancelling:
+                    self._cancel_futures(futures)
+
+    def _cancel_futures(self, futures):
+        for future, path in list(futures.items()):
+            if future.cancel():
+                del futures[future]
+                self._release(path)
+                self._cancel(path)
+
+    def _next_items(self, queue, path, result):
+        """
+
+        Args:
+            queue (DependencyQueue): The projects left to run
+            path (Path): The project that finished
+            result (ExecutionResult): How it finished
+
+        Returns:
+            list[tuple[Path, str]]: The projects that can start now
+        """
+        if self._cancelling:
+            # Killed by a signal or never started because of the cancellation
+            result.cancelled = result.exit_code is None or result.exit_code < 0
+        elif self._fail_fast and not result.success:
+            self._cancelling = True
+            self.outputter.error.write(
+                'Cancelling the remaining projects because "{0}" failed\n'.format(path)
+            )
+            self.executor.terminate()
+
+        for skipped in queue.done(path, result.success):
+            if self._cancelling:
+                self._cancel(skipped)
+            else:
                 self.outputter.error.write(
-                    'Command for path "{0}" generated an exception: {1}\n'.format(
-                        path,
-                        exc.__repr__()
-                    )
+                    'Skipping "{0}" because "{1}" failed\n'.format(skipped, path)
                 )
+                self.results.add(ExecutionResult.skip(skipped))
+
+        if self._cancelling:
+            waiting = [path for path, _ in self._backlog] + list(self._looking_up)
+            for cancelled in waiting + queue.cancel():
+                self._cancel(cancelled)
+            self._backlog = []
+            self._looking_up = {}
+            return []
+
+        return self._ready_items(queue)
+
+    def _cancel(self, path):
+        if self._outputs:
+            with self._output_lock:
+                output = self._outputs.pop(path, None)
+                self._start_order.pop(path, None)
+                if output is not None:
+                    output.close()
+
+        self.results.add(ExecutionResult.cancel(path))
+
+    def _resolve_result(self, path, result):
+        """
+
+        Args:
+            path (Path): The path the command ran for
+            result (Callable[[], ExecutionResult]): Returns the result of
+                the command or raises the exception the command raised
+
+        Returns:
+            ExecutionResult: The result that was added
+        """
+        self._flush_output(path)
+        try:
+            execution_result = result()
+        except Exception as exc:
+            execution_result = ExecutionResult(99, 0, path)
+            self.outputter.error.write(
+                'Command for path "{0}" generated an exception: {1}\n'.format(
+                    path,
+                    exc.__repr__()
+                )
+            )
+
+        self.results.add(execution_result)
+
+        return execution_result
+
+    def _flush_output(self, path):
+        if not self._outputs or path not in self._outputs:
+            return
+
+        with self._output_lock:
+            self._outputs.pop(path).flush(self.outputter)
+            self._start_order.pop(path, None)
+            self.outputter.info.write('\n')
+
+        self._tail_longest_running()
+
+    def _tail_longest_running(self):
+        if not self._tail:
+            return
+
+        with self._output_lock:
+            running = [path for path in self._outputs or () if path in self._start_order]
+            if running:
+                longest = min(running, key=self._start_order.get)
+                self._outputs[longest].go_live(self.outputter)
 
 
 def get_config_file(*filenames):
@@ -97,50 +806,268 @@ def match(lines, paths):
 
     Args:
         lines (list[Union[str, unicode]]): the files that has changed between the two commits
-        paths: (list[Path]): the configured paths we support
+        paths: (Union[list[Path], PathIndex]): the configured paths we support
 
     Returns:
         set[Path]: The matched paths
     """
-    matches = set()
-    for line in lines:
-        for path in paths:
-            matches.add(path.match(line))
+    if not isinstance(paths, PathIndex):
+        paths = PathIndex(paths)
 
-    return {x for x in matches if x}
+    return paths.match_files(lines)
 
 
-def read_config(conf_file):
+def read_config(conf_file, cache_file=None, expand_globs=True):
     """
 
     Args:
         conf_file (Union(TextIO, str)): A file pointer to read a config
             file from or a path to a file
+        cache_file (Union[str, None]): Where to keep the parsed config
+            between runs, only used when ``conf_file`` is a path
+        expand_globs (bool): Expand globbed paths against the working
+            copy, otherwise they're left for :meth:`CLI.expand_paths`
 
     Returns:
         dict: A configuration dictionary
     """
-    if isinstance(conf_file, six.string_types):
-        with open(conf_file, 'r') as fh:
-            config = yaml.load(fh)
-    else:
-        config = yaml.load(conf_file)
+    if not isinstance(conf_file, six.string_types):
+        return _parse_config(conf_file.read(), expand_globs)[0]
+
+    with open(conf_file, 'rb') as fh:
+        contents = fh.read()
+
+    if cache_file is None:
+        return _parse_config(contents, expand_globs)[0]
+
+    config_cache = ConfigCache(cache_file)
+    digest = hashlib.sha1(contents).hexdigest()
+    if not expand_globs:
+        digest += '-unexpanded'
+
+    data = config_cache.get(digest)
+    if data is None:
+        data, directories = _load_config(contents, expand_globs)
+        try:
+            config_cache.set(digest, data, directories)
+        except (IOError, OSError, TypeError, ValueError):
+            pass  # The config is still fine, it's just not cached
+
+    return _build_config(data)
+
+
+def _parse_config(contents, expand_globs=True):
+    """
+
+    Args:
+        contents (Union[str, bytes]): The YAML of a config file
+        expand_globs (bool): Expand globbed paths against the working copy
+
+    Returns:
+        (dict, dict[str, float]): The configuration dictionary, and the
+            modification time of each directory listed to expand globs
+    """
+    data, directories = _load_config(contents, expand_globs)
+
+    return _build_config(data), directories
+
+
+def _load_config(contents, expand_globs=True):
+    """
+
+    Args:
+        contents (Union[str, bytes]): The YAML of a config file
+        expand_globs (bool): Expand globbed paths against the working copy
+
+    Returns:
+        (dict, dict[str, float]): The config as plain data, with its
+            globbed paths expanded, and the modification time of each
+            directory listed to expand them
+    """
+    import yaml
+
+    data = yaml.load(contents, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+    directories = {}
 
     def expand_glob(path):
-        if '*' in path:
+        if '*' in path and expand_globs:
+            directories.update(_glob_directories(path))
             return [p for p in glob.glob(path)]
         else:
             return [path]
 
-    paths = [expand_glob(path) for path in config['paths']]
-    config['paths'] = [Path(path) for path in itertools.chain(*paths)]
+    data['paths'] = list(itertools.chain(*[expand_glob(path) for path in data['paths']]))
+
+    return data, directories
 
+
+def _build_config(data):
+    """
+
+    Args:
+        data (dict): The config as plain data
+
+    Returns:
+        dict: A configuration dictionary, with paths and commands
+    """
+    config = dict(data)
+    config['paths'] = [Path(path) for path in data['paths']]
     config['commands'] = {Command(name, mapping)
-                          for name, mapping in config.get('commands', {}).items()}
+                          for name, mapping in data.get('commands', {}).items()}
 
     return config
 
 
+def _recent_runs(state_dir, command_name, outputter):
+    """
+
+    Args:
+        state_dir (str): The directory with the history of earlier runs
+        command_name (str): The command to look up
+        outputter (Outputter): Where to write why the history couldn't be read
+
+    Returns:
+        tuple[dict[str, float], dict[str, int]]: The recent run time of
+            each path in seconds, and its recent peak memory in kilobytes
+    """
+    import sqlite3
+    from radish.history import History
+
+    history = History(os.path.join(state_dir, 'history.sqlite'))
+    if not history.exists():
+        return {}, {}
+
+    try:
+        return history.run_times(command_name), history.peak_rss(command_name)
+    except (IOError, OSError, sqlite3.Error) as exc:
+        outputter.error.write('Failed to read history: {0}\n'.format(exc))
+        return {}, {}
+    finally:
+        history.close()
+
+
+def _same_file(filename, other):
+    """
+
+    Args:
+        filename (str): A file that may not exist yet
+        other (Union[str, None]): Another file, or ``None``
+
+    Returns:
+        bool: Whether both name the same file
+    """
+    return other is not None and os.path.realpath(filename) == os.path.realpath(other)
+
+
+def _glob_directories(pattern):
+    """The directories :func:`glob.glob` lists to expand a pattern
+
+    Args:
+        pattern (str): A path with globs
+
+    Returns:
+        dict[str, float]: The modification time of each directory
+    """
+    directories = {}
+    candidates = ['']
+
+    for segment in pattern.rstrip('/').split('/'):
+        if '*' not in segment:
+            candidates = [os.path.join(candidate, segment) for candidate in candidates]
+            continue
+
+        matched = []
+        for candidate in candidates:
+            directory = candidate or '.'
+            try:
+                directories[directory] = os.stat(directory).st_mtime
+                names = os.listdir(directory)
+            except OSError:
+                continue
+
+            matched.extend(os.path.join(candidate, name) for name in fnmatch.filter(names, segment)
+                           if os.path.isdir(os.path.join(directory, name)))
+        candidates = matched
+
+    return directories
+
+
+def watch(cli, command, arguments):
+    """Runs a command for the projects whose files change until interrupted
+
+    Args:
+        cli (CLI): The configured CLI
+        command (Command): The command to run
+        arguments (dict): The parsed command line
+
+    Raises:
+        RadishExit: When interrupted
+    """
+    from radish.watch import Watch, create_watcher
+
+    try:
+        jobs = int(arguments['--jobs'] or 1)
+        debounce = float(arguments['--debounce'])
+    except ValueError as exc:
+        raise RadishExit(str(exc))
+
+    watcher = create_watcher(cli.base_dir, cli.config['paths'], poll=arguments['--poll'])
+    watching = Watch(cli, command, watcher, debounce=debounce, jobs=jobs)
+    cli.outputter.info.write(
+        'Watching {0} paths for changes to run {1}, press Ctrl-C to stop\n\n'.format(
+            len(cli.config['paths']), command.name
+        )
+    )
+
+    try:
+        watching.run()
+    except KeyboardInterrupt:
+        watching.stop(grace_period=1)
+
+    raise RadishExit(0)
+
+
+def daemon(config_file, state_dir):
+    """Keeps radish loaded for the commands run in the repository until interrupted
+
+    Args:
+        config_file (str): The Radishfile
+        state_dir (str): Where the socket is created
+
+    Raises:
+        RadishExit: When interrupted, or when a daemon is running already
+    """
+    from radish.daemon import Daemon
+
+    server = Daemon(config_file, state_dir)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    except (IOError, OSError) as exc:
+        raise RadishExit(str(exc))
+
+    raise RadishExit(0)
+
+
+def current_commit(differ, to_commit=None):
+    """The commit commands are run at, for recording alongside results
+
+    Args:
+        differ (DifferBase): The differ for the repository
+        to_commit (Union[str, None]): The commit compared to, or ``None``
+            for the working copy
+
+    Returns:
+        Union[str, None]: The resolved commit, ``None`` when it can't be resolved
+    """
+    try:
+        return differ.resolve_commit(to_commit or 'HEAD')
+    except differs.DiffError:  # Also when not in a repository
+        return None
+
+
 class RadishExit(SystemExit):
     def __init__(self, message_or_code):
         super(RadishExit, self).__init__(message_or_code)
@@ -150,28 +1077,139 @@ def main(args=None):
     """radish a task runner that understands version control
 
 Usage:
-  radish command <command> [--from=<from_commit> [--to=<to_commit>]]
-                           [--jobs=<jobs> [--job=<job_index>]]
+  radish command <command> [--from=<from_commit> [--to=<to_commit>] | --uncommitted]
+                           [--jobs=<jobs> [--job=<job_index> [--timings=<file>]] [--tail]]
+                           [--no-cache]
+                           [--differ=<differ>] [--async] [--fail-fast]
+  radish watch <command> [--jobs=<jobs>] [--debounce=<seconds>] [--poll]
+  radish daemon
   radish (-h | --help)
   radish --version
 
   --from=<from_commit>         The commit or reference to compare from
   --to=<to_commit>             The commit or reference to compare to
-  -j <jobs>, --jobs=<jobs>     The number of parallel jobs to run
+  --uncommitted                Run for the projects with staged, unstaged
+                               or untracked changes
+  --no-cache                   Don't reuse the changed paths found by an
+                               earlier run for the same commits, or the
+                               results cached with cache_results
+  --differ=<differ>            How to find changes between commits: git,
+                               git-tree or libgit2, overrides the Radishfile
+  -j <jobs>, --jobs=<jobs>     The number of parallel jobs to run, or auto
+                               to follow the load of the machine
   -J <job_index>, --job=<job_index>  The index of the current job to run, will
                                consistently map jobs to run to this index.
+  --timings=<file>             The run times to split the jobs by, every
+                               node has to pass the same file
+  --tail                       Write the output of the longest running job
+                               as it happens, other jobs when they finish
+  --async                      Run all jobs from one event loop instead of a
+                               thread per job, needs Python 3.5+
+  --fail-fast                  Cancel the remaining jobs when one fails
+  --debounce=<seconds>         How long files have to stay unchanged before
+                               the projects they're in run [default: 0.2]
+  --poll                       Look for changed files every second instead
+                               of having the kernel report them
   -h, --help                   Show this screen
   --version                    Show version
     """
-    arguments = docopt(
+    arguments = parse_arguments(args)
+
+    config_file = get_config_file('Radishfile', 'Radishfile.yml')
+    state_dir = os.path.join(os.path.dirname(config_file), '.radish')
+    if arguments['daemon']:
+        daemon(config_file, state_dir)
+
+    if arguments['command'] and not os.environ.get('RADISH_NO_DAEMON'):
+        from radish.daemon import forward, socket_path
+
+        code = forward(socket_path(state_dir), sys.argv[1:] if args is None else args)
+        if code is not None:
+            raise RadishExit(code)
+
+    config = read_config(
+        config_file,
+        cache_file=os.path.join(state_dir, 'config.json'),
+        expand_globs=arguments['--to'] is None
+    )
+    differ = create_differ(arguments['--differ'] or config.get('differ', 'git'))
+
+    run_command(arguments, config, differ, Outputter(), state_dir)
+
+
+def parse_arguments(args=None):
+    """
+
+    Args:
+        args (Union[list[str], None]): The command line arguments, those
+            of the process by default
+
+    Returns:
+        dict: The arguments parsed by the usage of :func:`main`
+    """
+    from docopt import docopt
+
+    return docopt(
         six.text_type(main.__doc__),
         version='radish {0}'.format(radish.__version__),
         argv=args
     )
 
+
+def create_differ(name):
+    """
+
+    Args:
+        name (str): The name of a differ
+
+    Returns:
+        DifferBase: The differ
+
+    Raises:
+        RadishExit: When there's no differ by that name
+    """
+    try:
+        return differs.create(name)
+    except ValueError as exc:
+        raise RadishExit(str(exc))
+
+
+def run_command(arguments, config, differ, outputter, state_dir):
+    """Runs a command for the changed projects and reports how it went
+
+    Args:
+        arguments (dict): The parsed command line
+        config (dict): The parsed Radishfile
+        differ (DifferBase): How to find the changed projects
+        outputter (Outputter): Where to write the output
+        state_dir (str): Where timings and history are kept
+
+    Raises:
+        RadishExit: With 0 when every project succeeded, 10 otherwise
+    """
+    executor = None
+    if arguments['--async']:
+        try:
+            from radish.async_executor import AsyncExecutor
+        except SyntaxError:  # pragma: no cover - async/await needs Python 3.5+
+            raise RadishExit('--async needs Python 3.5 or newer')
+        executor = AsyncExecutor(outputter=outputter)
+
     cli = CLI(
-        config=read_config(get_config_file('Radishfile', 'Radishfile.yml'))
+        config=config,
+        differ=differ,
+        executor=executor,
+        outputter=outputter,
+        cache_diffs=not arguments['--no-cache'],
+        cache_results=bool(config.get('cache_results')) and not arguments['--no-cache']
     )
+    if arguments['--to'] is not None:
+        # The projects are the ones in the commit compared to, not the checkout
+        cli.expand_paths(arguments['--to'])
+    try:
+        cli.graph  # Fail on invalid dependencies before running anything
+    except ValueError as exc:
+        raise RadishExit(str(exc))
 
     command = cli.find_command(arguments['<command>'])
     if not command:
@@ -182,14 +1220,32 @@ Usage:
             )
         )
 
-    changed_projects = splitter.split(
-        cli.changed_projects(
+    if arguments['watch']:
+        watch(cli, command, arguments)
+
+    timings = Timings.load(os.path.join(state_dir, 'timings.json'))
+
+    try:
+        changed_projects = cli.changed_projects(
             from_commit=arguments['--from'],
             to_commit=arguments['--to'],
-        ),
-        splits=arguments['--jobs'],
-        index=arguments['--job']
-    )
+            uncommitted=arguments['--uncommitted'],
+        )
+    except differs.DiffError as exc:
+        raise RadishExit(exc.message)
+    if arguments['--job'] is not None:
+        if arguments['--jobs'] == 'auto':
+            raise RadishExit('--job needs the number of --jobs, not auto')
+        # Only the shared timings, each node's own only has the projects it ran
+        shared_timings = {}
+        if arguments['--timings']:
+            shared_timings = Timings.load(arguments['--timings']).for_command(command.name)
+        changed_projects = splitter.split(
+            changed_projects,
+            splits=arguments['--jobs'],
+            index=arguments['--job'],
+            timings=shared_timings
+        )
 
     jobs = 1
     if arguments['--jobs']:
@@ -198,6 +1254,16 @@ Usage:
                 int(arguments['--job']) + 1,
                 arguments['--jobs']
             )
+        elif arguments['--jobs'] == 'auto':
+            bounds = config.get('auto_jobs') or {}
+            jobs = scheduler.ConcurrencyController(
+                min_jobs=bounds.get('min', 1),
+                max_jobs=bounds.get('max')
+            )
+            no_jobs = 'with {}-{} processes depending on the load'.format(
+                jobs.min_jobs,
+                jobs.max_jobs
+            )
         else:
             jobs = int(arguments['--jobs'])
             no_jobs = 'with {} processes'.format(arguments['--jobs'])
@@ -212,11 +1278,21 @@ Usage:
         cli.outputter.info.write('\t{0}\n'.format(project))
     cli.outputter.info.write('\n')
 
+    # Only parallel runs depend on the order projects start in, and have
+    # to keep projects from using too much memory together
+    run_times, peak_rss = {}, {}
+    if jobs != 1:
+        run_times, peak_rss = _recent_runs(state_dir, command.name, cli.outputter)
+
     results, actual_run_time = timer(
         lambda: cli.run(
             command_name=command,
             paths=changed_projects,
-            jobs=jobs
+            jobs=jobs,
+            tail=arguments['--tail'],
+            timings=run_times,
+            fail_fast=arguments['--fail-fast'],
+            peak_rss=peak_rss
         )
     )
 
@@ -224,13 +1300,39 @@ Usage:
         cli.outputter.info.write(
             '{}: {} ({})\n'.format(
                 result.path,
-                'Success' if result.success else 'Failure',
-                result.run_time
+                'Success' if result.success else
+                'Cancelled' if result.cancelled else
+                'Skipped' if result.skipped else
+                'Failure',
+                'cached' if result.cached else result.run_time
             )
         )
     cli.outputter.info.write('\n')
-    if jobs > 1:
+    if jobs != 1:
         cli.outputter.info.write('Cumulative run time: {}\n'.format(results.run_time))
+    if results.concurrency_changes:
+        cli.outputter.info.write('Concurrency: {}\n'.format(', '.join(
+            '{} jobs after {:.0f}s'.format(count, seconds) if seconds else '{} jobs'.format(count)
+            for seconds, count in results.concurrency_changes
+        )))
+    if results.predicted_run_time is not None:
+        cli.outputter.info.write('Predicted run time: {}\n'.format(results.predicted_run_time))
     cli.outputter.info.write('Finished in {}\n'.format(actual_run_time))
 
+    # The shared timings are only read, so every node keeps splitting the same way
+    if not _same_file(timings.filename, arguments['--timings']):
+        timings.record(command.name, results)
+        try:
+            timings.save()
+        except (IOError, OSError) as exc:
+            cli.outputter.error.write('Failed to save timings: {0}\n'.format(exc))
+
+    from radish.history import History
+
+    history = History(os.path.join(state_dir, 'history.sqlite'))
+    try:
+        history.record(command.name, results, commit=current_commit(differ, arguments['--to']))
+    except (IOError, OSError) as exc:
+        cli.outputter.error.write('Failed to record history: {0}\n'.format(exc))
+
     raise RadishExit(0 if results else 10)
@@ -1,41 +1,155 @@
 from __future__ import unicode_literals
 
-from fnmatch import fnmatch
+import re
+from fnmatch import translate
+
+from radish.scheduler import Resources, parse_memory
+
+_GLOB = re.compile(r'[*?[]')
+_WILDCARDS = re.compile(r'\[[^\]]*\]|[*?]')
 
 
 class Command(object):
+    # Python 2 and 3.4 allow at most 100 groups in a regular expression
+    GROUPS_PER_PATTERN = 99
+
     def __init__(self, name, mapping):
         """
 
         Args:
             name (Union[str, unicode]): The name of this command
-            mapping (Dict[radish.Path, Command]): What commands to run at what paths.
-                The key ``default`` is used when no match is found.
+            mapping (Dict[radish.Path, Union[str, dict]]): What commands to run at
+                what paths. The key ``default`` is used when no match is
+                found. Paths with globs are tried from the most specific to
+                the least. A command can be a dict of the command to ``run``
+                and the ``cpu`` and ``memory`` it needs.
+
+        Raises:
+            ValueError: When a command's dict is missing ``run`` or its
+                ``memory`` isn't an amount of memory
         """
+        for path, value in mapping.items():
+            if isinstance(value, dict):
+                if 'run' not in value:
+                    raise ValueError('Command {0} for "{1}" has nothing to run'.format(name, path))
+                parse_memory(value.get('memory'))
+
         self.name = name
         self.mapping = mapping
+        self._exact = None
+        self._globs = None
+        self._resolved = {}
 
     def items(self, filter=None):
         if filter:
             return [(path, self._get_command(path)) for path in filter]
         else:
-            return self.mapping.items()
+            return [(path, _run(value)) for path, value in self.mapping.items()]
+
+    def resources(self, path):
+        """
+
+        Args:
+            path (Path): The path the command runs for
+
+        Returns:
+            Resources: The CPUs and memory the command needs there, one
+                CPU and unknown memory unless the mapping says otherwise
+        """
+        value = self._resolve(path)
+        if not isinstance(value, dict):
+            return Resources(cpu=1, memory=None)
+
+        return Resources(cpu=value.get('cpu', 1), memory=parse_memory(value.get('memory')))
 
     def _get_command(self, path):
-        return (self.mapping.get(str(path)) or
-                self._glob_command(path) or
-                self._default_command())
+        return _run(self._resolve(path))
+
+    def _resolve(self, path):
+        path = str(path)
+        if path not in self._resolved:
+            self._resolved[path] = (self._exact_command(path) or
+                                    self._glob_command(path) or
+                                    self._default_command())
+
+        return self._resolved[path]
 
     def _default_command(self):
         return self.mapping.get('default')
 
+    def _exact_command(self, path):
+        if self._exact is None:
+            self._compile()
+
+        return self._exact.get(path)
+
+    def _glob_command(self, actual_path):
+        if self._globs is None:
+            self._compile()
+
+        for pattern, commands in self._globs:
+            match = pattern.match(actual_path)
+            if match:
+                return commands[match.lastgroup]
+
+    def _compile(self):
+        """Splits the mapping into exact paths and combined glob patterns
+
+        Each glob is wrapped in a named group so a single match tells
+        which of its globs matched first, whatever groups
+        :func:`fnmatch.translate` adds itself.
+        """
+        globs = sorted((path for path in self.mapping if _GLOB.search(path)), key=_specificity)
+
+        self._exact = {path: command for path, command in self.mapping.items()
+                       if not _GLOB.search(path)}
+        self._globs = []
+
+        alternatives, commands, groups = [], {}, 0
+        for index, path in enumerate(globs):
+            pattern = translate(path)
+            pattern_groups = re.compile(pattern).groups + 1
+            if alternatives and groups + pattern_groups > self.GROUPS_PER_PATTERN:
+                self._globs.append((re.compile('|'.join(alternatives)), commands))
+                alternatives, commands, groups = [], {}, 0
+
+            name = 'c{0}'.format(index)
+            alternatives.append('(?P<{0}>{1})'.format(name, pattern))
+            commands[name] = self.mapping[path]
+            groups += pattern_groups
+
+        if alternatives:
+            self._globs.append((re.compile('|'.join(alternatives)), commands))
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return (isinstance(other, Command) and
+                self.name == other.name and
+                self.mapping == other.mapping)
+
+    def __ne__(self, other):
+        return not self == other
 
     def __hash__(self):
-        return hash(frozenset(self.__dict__))
+        return hash((self.name, frozenset(self.mapping)))
 
-    def _glob_command(self, actual_path):
-        for command_path, command in self.mapping.items():
-            if fnmatch(str(actual_path), command_path):
-                return command
+    def __getstate__(self):
+        return {'name': self.name, 'mapping': self.mapping}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['mapping'])
+
+
+def _specificity(path):
+    """Orders globs with the most literal characters, then the fewest wildcards, first
+
+    Args:
+        path (str): A path with globs
+
+    Returns:
+        tuple: A sort key, ties are broken by the path itself
+    """
+    return -len(_WILDCARDS.sub('', path)), len(_WILDCARDS.findall(path)), path
+
+
+def _run(value):
+    return value['run'] if isinstance(value, dict) else value
@@ -0,0 +1,452 @@
+from __future__ import unicode_literals
+
+import errno
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import traceback
+
+__all__ = ['Daemon', 'forward', 'socket_path']
+
+
+def socket_path(state_dir):
+    """
+
+    Args:
+        state_dir (str): The directory radish keeps its state in
+
+    Returns:
+        str: Where the daemon for the repository listens
+    """
+    return os.path.join(state_dir, 'daemon.sock')
+
+
+def forward(path, argv):
+    """Runs radish in the daemon listening on a socket, if there is one
+
+    Only the standard library is used here, so a client starts about as
+    fast as Python does. The output of the daemon is written to
+    ``sys.stdout`` and ``sys.stderr`` as it arrives.
+
+    Args:
+        path (str): The socket of the daemon
+        argv (list[str]): The command line arguments to run with
+
+    Returns:
+        Union[int, str, None]: What radish exited with in the daemon, or
+            ``None`` when no daemon is listening
+    """
+    if not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(_address(path))
+    except socket.error as exc:
+        sock.close()
+        if exc.errno in (errno.ECONNREFUSED, errno.ENOENT):  # Left behind by a daemon that died
+            return None
+        raise
+
+    connection = Connection(sock)
+    try:
+        connection.send(argv=list(argv), cwd=os.getcwd(), env=dict(os.environ))
+        for message in iter(connection.receive, None):
+            if 'exit' in message:
+                return message['exit']
+
+            stream = sys.stdout if message['stream'] == 'info' else sys.stderr
+            stream.write(message['data'])
+            stream.flush()
+    finally:
+        connection.close()
+
+    return 'The radish daemon stopped before the command finished'
+
+
+class Connection(object):
+    def __init__(self, sock):
+        """Sends and receives messages as lines of JSON
+
+        Args:
+            sock (socket.socket): A connected socket
+        """
+        self.socket = sock
+        self._file = sock.makefile('rb')
+        self._lock = threading.Lock()
+
+    def send(self, **message):
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        with self._lock:
+            self.socket.sendall(data)
+
+    def receive(self):
+        """
+
+        Returns:
+            Union[dict, None]: The next message, ``None`` once the other
+                side closed the connection
+        """
+        line = self._file.readline()
+        if not line:
+            return None
+
+        return json.loads(line.decode('utf-8'))
+
+    def close(self):
+        self._file.close()
+        self.socket.close()
+
+
+class ConnectionStream(object):
+    def __init__(self, connection, name):
+        """Writes output to a client, for an :class:`Outputter`
+
+        Args:
+            connection (Connection): The client
+            name (str): ``info`` or ``error``
+        """
+        self.connection = connection
+        self.name = name
+
+    def write(self, message):
+        self.connection.send(stream=self.name, data=message)
+
+    def flush(self):
+        pass
+
+
+class Daemon(object):
+    # Seconds between looking for changes to the Radishfile while idle
+    RELOAD_INTERVAL = 1.0
+    # Seconds a refused client gets to send its request
+    REFUSE_TIMEOUT = 1.0
+
+    def __init__(self, config_file, state_dir, outputter=None):
+        """Keeps radish loaded and runs the commands clients forward to it
+
+        The config, the differ and everything radish imports are loaded
+        once. Each request is run in a process forked from the daemon,
+        so it starts with all of that ready and requests can't affect
+        each other. The config is loaded again when the Radishfile, or
+        a directory its globs listed, changes.
+
+        Args:
+            config_file (str): The Radishfile, requests run in its directory
+            state_dir (str): Where the socket is created
+            outputter (Union[Outputter, None]): Where the daemon reports
+                what it does
+        """
+        from radish.outputter import Outputter
+
+        self.config_file = os.path.abspath(config_file)
+        self.base_dir = os.path.dirname(self.config_file)
+        self.state_dir = state_dir
+        self.socket_path = socket_path(state_dir)
+        self.outputter = outputter or Outputter()
+        self.configs = {}
+        self.differs = {}
+        self._mtimes = {}
+        self._socket = None
+        self._children = set()
+        self._stopped = False
+
+    def load(self):
+        """Parses the Radishfile, with and without expanding its globs
+
+        Raises:
+            ValueError: When the differ the Radishfile names doesn't exist
+        """
+        from radish import differs
+        from radish.cli import _parse_config
+
+        mtimes = {self.config_file: _mtime(self.config_file)}
+        with open(self.config_file, 'rb') as fh:
+            contents = fh.read()
+
+        configs = {}
+        for expand_globs in (True, False):
+            configs[expand_globs], directories = _parse_config(contents, expand_globs)
+            mtimes.update(directories)
+
+        name = configs[True].get('differ', 'git')
+        differ = differs.create(name, self.base_dir)
+        in_repository = os.path.exists(os.path.join(self.base_dir, '.git'))
+        if in_repository and getattr(type(differ), 'repo', None):
+            differ.repo  # Opened once, every request is forked with it open
+
+        self.configs = configs
+        self.differs = {name: differ}
+        self._mtimes = mtimes
+
+    def stale(self):
+        """
+
+        Returns:
+            bool: Whether the Radishfile, or a directory its globs listed,
+                changed since it was loaded
+        """
+        return any(_mtime_or_none(path) != mtime for path, mtime in self._mtimes.items())
+
+    def serve(self, requests=None):
+        """Listens for clients until stopped
+
+        Args:
+            requests (Union[int, None]): How many requests to run before
+                returning, runs until stopped by default
+
+        Raises:
+            OSError: When another daemon is listening already
+        """
+        self.load()
+        _preload()
+        self._listen()
+        self.outputter.info.write('Listening on {0}, press Ctrl-C to stop\n'.format(
+            os.path.relpath(self.socket_path, self.base_dir)
+        ))
+
+        served = 0
+        try:
+            while not self._stopped and (requests is None or served < requests):
+                self._reap()
+                try:
+                    connection, _ = self._socket.accept()
+                except socket.timeout:
+                    self._reload()
+                    continue
+
+                connection.settimeout(None)
+                served += 1
+                uid = _peer_uid(connection)
+                if uid not in (None, os.getuid()):
+                    self._refuse(Connection(connection), uid)
+                    continue
+
+                self._reload()
+                self._fork(Connection(connection))
+        finally:
+            self._socket.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            for pid in list(self._children):
+                self._wait(pid, 0)
+
+    def stop(self):
+        """Stops accepting requests, requests already running finish"""
+        self._stopped = True
+
+    def _listen(self):
+        if os.path.exists(self.socket_path):
+            if _listening(self.socket_path):
+                raise OSError(
+                    errno.EADDRINUSE,
+                    'A radish daemon is already listening on {0}'.format(self.socket_path)
+                )
+            os.unlink(self.socket_path)
+        elif not os.path.isdir(self.state_dir):
+            os.makedirs(self.state_dir)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Requests run as the user of the daemon, in the directory and
+        # environment they ask for, so only that user may connect
+        umask = os.umask(0o177)
+        try:
+            self._socket.bind(_address(self.socket_path))
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        self._socket.listen(16)
+        self._socket.settimeout(self.RELOAD_INTERVAL)
+
+    def _reload(self):
+        if not self.stale():
+            return
+
+        import yaml
+
+        try:
+            self.load()
+        except (yaml.YAMLError, IOError, OSError, KeyError, TypeError, ValueError) as exc:
+            # The config that was loaded keeps being used
+            self.outputter.error.write('Failed to reload {0}: {1}\n'.format(
+                os.path.basename(self.config_file), exc
+            ))
+            # Not tried again until it changes again
+            self._mtimes = {path: _mtime_or_none(path) for path in self._mtimes}
+        else:
+            self.outputter.info.write('Reloaded {0}\n'.format(os.path.basename(self.config_file)))
+
+    def _refuse(self, connection, uid):
+        self.outputter.error.write('Refused a request from user {0}\n'.format(uid))
+        try:
+            # Read first, closing with the request unread resets the connection
+            connection.socket.settimeout(self.REFUSE_TIMEOUT)
+            connection.receive()
+            connection.send(exit='The radish daemon only runs commands of the user running it')
+        except (socket.error, ValueError):
+            pass
+        finally:
+            connection.close()
+
+    def _fork(self, connection):
+        pid = os.fork()
+        if pid:
+            connection.close()
+            self._children.add(pid)
+            return
+
+        code = 1
+        try:
+            self._socket.close()
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = self._run(connection)
+        finally:
+            os._exit(code)
+
+    def _run(self, connection):
+        """Runs a request in the forked process
+
+        Returns:
+            int: What the forked process exits with
+        """
+        from radish.cli import RadishExit, create_differ, parse_arguments, run_command
+        from radish.outputter import Outputter
+
+        request = connection.receive()
+        if request is None:
+            return 1
+
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        # What the client's Ctrl-C would have interrupted is interrupted
+        # when it goes away
+        os.setpgrp()
+        _on_disconnect(connection, lambda: os.killpg(0, signal.SIGINT))
+
+        outputter = Outputter(
+            ConnectionStream(connection, 'info'),
+            ConnectionStream(connection, 'error')
+        )
+        try:
+            arguments = parse_arguments(request['argv'])
+            if not arguments['command']:
+                raise RadishExit('The radish daemon only runs commands')
+
+            config = self.configs[arguments['--to'] is None]
+            name = arguments['--differ'] or config.get('differ', 'git')
+            differ = self.differs.get(name) or create_differ(name)
+            run_command(arguments, config, differ, outputter, self.state_dir)
+        except SystemExit as exc:
+            code = exc.code
+        except Exception:  # Reported to the client like it would be without a daemon
+            outputter.error.write(traceback.format_exc())
+            code = 1
+        except KeyboardInterrupt:
+            return 130
+
+        # Interrupting now would only keep the process from exiting
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            connection.send(exit=code)
+        except socket.error:  # The client is gone
+            return 1
+
+        return 0
+
+    def _reap(self):
+        for pid in list(self._children):
+            self._wait(pid, os.WNOHANG)
+
+    def _wait(self, pid, options):
+        try:
+            finished, _ = os.waitpid(pid, options)
+        except OSError as exc:
+            if exc.errno != errno.ECHILD:
+                raise
+            finished = pid
+
+        if finished:
+            self._children.discard(pid)
+
+
+def _listening(path):
+    """
+
+    Args:
+        path (str): The socket of a daemon
+
+    Returns:
+        bool: Whether a daemon is listening on it
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(_address(path))
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+    return True
+
+
+def _peer_uid(sock):
+    """
+
+    Args:
+        sock (socket.socket): A connected Unix socket
+
+    Returns:
+        Union[int, None]: The user of the process on the other end,
+            ``None`` where the platform can't tell
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize(str('3i')))
+    _, uid, _ = struct.unpack(str('3i'), credentials)
+
+    return uid
+
+
+def _address(path):
+    # Sockets paths are limited to about 100 bytes, the relative path is
+    # usually much shorter than the absolute one
+    return min(path, os.path.relpath(path), key=len)
+
+
+def _on_disconnect(connection, callback):
+    def wait():
+        try:
+            data = connection.socket.recv(1)
+        except socket.error:
+            data = b''
+        if not data:
+            callback()
+
+    thread = threading.Thread(target=wait)
+    thread.daemon = True
+    thread.start()
+
+
+def _mtime(path):
+    return os.stat(path).st_mtime
+
+
+def _mtime_or_none(path):
+    try:
+        return _mtime(path)
+    except OSError:
+        return None
+
+
+def _preload():
+    # Imported by every request, once here instead of in each of them
+    import concurrent.futures  # noqa: F401
+    import sqlite3  # noqa: F401
+
+    import radish.history  # noqa: F401
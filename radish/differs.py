@@ -1,8 +1,16 @@
 from __future__ import unicode_literals
 
+import binascii
+import fnmatch
+import hashlib
+import io
 import os
+import subprocess
 
-import git
+from radish.path import Path, PathIndex
+
+# git and pygit2 are imported where they're used, they take longer to
+# import than most radish runs that don't diff at all
 
 
 class DiffError(BaseException):
@@ -12,10 +20,17 @@ class DiffError(BaseException):
 
 
 class DifferBase(object):
+    cache_dir = None
+
     def __init__(self, base_path='.'):
         self._base_path = None
         self.base_path = base_path
 
+    @classmethod
+    def available(cls):
+        """Whether the dependencies of this differ are installed"""
+        return True
+
     @property
     def base_path(self):
         return self._base_path
@@ -27,17 +42,286 @@ class DifferBase(object):
     def changed_files_between(self, from_commit, to_commit=None):  # pragma: no cover
         raise NotImplementedError('changed_files_between is not implemented.')
 
+    def changed_paths_between(self, from_commit, to_commit, paths):
+        """Returns which of the paths have changes between two commits
+
+        Args:
+            from_commit (str): A commit reference
+            to_commit (Union[str, None}): A commit reference
+            paths (Union[list[Path], PathIndex]): The configured paths
+
+        Returns:
+            set[Path]: The paths with changes, with globs expanded
+        """
+        if not isinstance(paths, PathIndex):
+            paths = PathIndex(paths)
+
+        return paths.match_files(self.iter_changed_files_between(from_commit, to_commit))
+
+    def resolve_commit(self, commit):
+        """Resolves a commit reference to an immutable identifier
+
+        Args:
+            commit (str): A commit reference
+
+        Returns:
+            Union[str, None]: The identifier of the commit, or ``None``
+                when the differ can't resolve references
+        """
+        return None
+
+    def tree_ids(self, paths, commit='HEAD'):
+        """The id of the tree of each path at a commit
+
+        Args:
+            paths (Iterable[Path]): Paths without globs
+            commit (str): A commit reference
+
+        Returns:
+            dict[Path, str]: The tree id of each path that exists at the
+                commit, empty when the differ can't tell
+        """
+        return {}
+
+    def expand_globs(self, patterns, commit):
+        """Expands globs against the tree of a commit instead of the working copy
+
+        Args:
+            patterns (list[str]): Paths with globs, like ``extensions/*/``
+            commit (str): A commit reference
+
+        Returns:
+            Union[dict[str, list[str]], None]: The sorted matches of each
+                pattern, ``None`` when the differ can't read trees
+        """
+        return None
+
+    def _expand_globs_in_tree(self, patterns, tree_id, entries):
+        """Expands globs in a tree, keeping the matches for later runs
+
+        A tree never changes, so the matches of each pattern are stored
+        under :attr:`cache_dir` keyed on the tree's id, when the differ
+        has somewhere to store them.
+
+        Args:
+            patterns (list[str]): Paths with globs
+            tree_id (str): The id of the root tree of the commit
+            entries (Callable[[list[str], int], Iterable[tuple[str, bool]]]):
+                Lists the name of every entry below the directories, down
+                to a number of path segments, and whether it's a tree
+
+        Returns:
+            dict[str, list[str]]: The sorted matches of each pattern
+        """
+        from radish.cache import DiffCache
+
+        cache = DiffCache(os.path.join(self.cache_dir, 'globs')) if self.cache_dir else None
+        keys = {pattern: _glob_key(tree_id, pattern) for pattern in patterns}
+        expanded = {}
+        if cache is not None:
+            for pattern in patterns:
+                matches = cache.get(keys[pattern])
+                if matches is not None:
+                    expanded[pattern] = matches
+
+        missing = [pattern for pattern in patterns if pattern not in expanded]
+        if not missing:
+            return expanded
+
+        directories = {pattern[:pattern.find(Path.GLOB_CHARACTER)].rpartition('/')[0]
+                       for pattern in missing}
+        # Globs don't match across slashes, nothing deeper than the deepest pattern matches
+        depth = max(len(pattern.rstrip('/').split('/')) for pattern in missing)
+        matched = match_globs(
+            missing, entries([] if '' in directories else sorted(directories), depth)
+        )
+        expanded.update(matched)
+
+        if cache is not None:
+            try:
+                for pattern in missing:
+                    cache.set(keys[pattern], matched[pattern])
+            except (IOError, OSError):  # Only slower next time
+                pass
+
+        return expanded
+
+    def dirty_paths(self, paths):
+        """Which paths have uncommitted changes in the working copy
+
+        Args:
+            paths (Union[list[Path], PathIndex]): The configured paths
+
+        Returns:
+            set[Path]: The paths with uncommitted or untracked files
+        """
+        return set(getattr(paths, 'paths', paths))
+
+    def iter_changed_files_between(self, from_commit, to_commit=None):
+        """Yields the changed files between two commits as they're found
+
+        Differs that can produce their output incrementally should
+        override this, by default it iterates over
+        :meth:`changed_files_between`.
+
+        Args:
+            from_commit (str): A commit reference
+            to_commit (Union[str, None}): A commit reference,
+                default: None
+
+        Returns:
+            Iterator[str]: The files that changed between
+                the passed in commits
+        """
+        return iter(self.changed_files_between(from_commit, to_commit))
+
 
 class Git(DifferBase):
     DiffError = DiffError
     _repo = None
 
+    # The fields before the path of changed, renamed or copied, and
+    # unmerged entries in ``git status --porcelain=v2``
+    STATUS_FIELDS = {'1': 8, '2': 9, 'u': 10}
+
     @property
     def repo(self):
         if not self._repo:
+            import git
             self._repo = git.Repo(self.base_path)
         return self._repo
 
+    @property
+    def cache_dir(self):
+        return os.path.join(self.repo.git_dir, 'radish')
+
+    def resolve_commit(self, commit):
+        """
+
+        Args:
+            commit (str): A git commit reference
+
+        Returns:
+            str: The full sha of the commit
+
+        Raises:
+            DiffError: When the reference doesn't resolve to a commit
+        """
+        # Through git itself, resolving doesn't need to load GitPython
+        args = ['git', 'rev-parse', '--verify', '--quiet', '{0}^{{commit}}'.format(commit)]
+        try:
+            process = subprocess.Popen(
+                args, cwd=self.base_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            output, _ = process.communicate()
+        except OSError as exc:
+            raise DiffError("Failed to resolve commit '{0}'".format(commit), exc)
+
+        if process.returncode != 0:
+            raise DiffError(
+                "Failed to resolve commit '{0}'".format(commit),
+                subprocess.CalledProcessError(process.returncode, args, output)
+            )
+
+        return output.decode('ascii').strip()
+
+    def tree_ids(self, paths, commit='HEAD'):
+        paths = list(paths)
+        names = ['{0}:{1}'.format(commit, str(path).rstrip('/')) for path in paths]
+
+        process = self.repo.git.cat_file('--batch-check', as_process=True, istream=subprocess.PIPE)
+        try:
+            output, _ = process.proc.communicate(
+                ''.join('{0}\n'.format(name) for name in names).encode('utf-8')
+            )
+        finally:
+            self._terminate(process.proc)
+
+        return {path: line.split(b' ')[0].decode('ascii')
+                for path, line in zip(paths, output.splitlines())
+                if not line.endswith(b' missing')}
+
+    def expand_globs(self, patterns, commit):
+        """Expands globs by reading the trees of the commit, down to the
+        depth of the deepest pattern
+
+        Raises:
+            DiffError: When the reference doesn't resolve to a commit
+        """
+        # Files are only listed when a pattern can match them
+        files = any(not pattern.endswith('/') for pattern in patterns)
+
+        def entries(directories, depth):
+            trees = []
+            for directory in directories or ['']:
+                try:
+                    tree = root[directory] if directory else root
+                except KeyError:
+                    continue
+                if tree.type == 'tree':
+                    trees.append(tree)
+
+            while trees:
+                for item in trees.pop():
+                    is_tree = item.type == 'tree'
+                    if is_tree or files:
+                        yield item.path, is_tree
+
+                    if is_tree and item.path.count('/') + 1 < depth:
+                        trees.append(item)
+
+        root = self.repo.commit(self.resolve_commit(commit)).tree
+        return self._expand_globs_in_tree(patterns, root.hexsha, entries)
+
+    def dirty_paths(self, paths):
+        if not isinstance(paths, PathIndex):
+            paths = PathIndex(paths)
+
+        return paths.match_files(self.iter_uncommitted_files())
+
+    def iter_uncommitted_files(self):
+        """Yields the staged, unstaged and untracked files while git is
+        still finding them.
+
+        Reads ``git status --porcelain=v2 -z`` incrementally from the
+        pipe. Git checks the files against the stat information in the
+        index, and the untracked cache is turned on so directories that
+        haven't changed aren't read again.
+
+        Returns:
+            Iterator[str]: The files with uncommitted changes, renamed
+                and copied files with where they came from
+
+        Raises:
+            DiffError: When git fails to get the status
+        """
+        import git
+
+        process = None
+        try:
+            process = self.repo.git(c='core.untrackedCache=true').status(
+                porcelain='v2',
+                z=True,
+                untracked_files='all',
+                as_process=True
+            )
+
+            fields = self._stream_of_files(process.proc.stdout)
+            for field in fields:
+                if field[0] in self.STATUS_FIELDS:
+                    yield field.split(' ', self.STATUS_FIELDS[field[0]])[-1]
+                    if field[0] == '2':  # Renames and copies are followed by where they came from
+                        yield next(fields, '')
+                elif field[0] == '?':
+                    yield field[2:]
+
+            process.wait()
+        except git.exc.GitCommandError as exc:
+            raise DiffError('Failed to get the uncommitted changes', exc)
+        finally:
+            if process is not None:
+                self._terminate(process.proc)
+
     def changed_files_between(self, from_commit, to_commit=None):
         """Returns a list of changed files between two commits.
 
@@ -50,10 +334,43 @@ class Git(DifferBase):
             list[str]: The files that changed between
                 the passed in commits
         """
+        return list(self.iter_changed_files_between(from_commit, to_commit))
+
+    def iter_changed_files_between(self, from_commit, to_commit=None):
+        """Yields the changed files between two commits while git is
+        still producing them.
+
+        Reads ``git diff --name-only -z`` incrementally from the pipe,
+        so memory use stays flat no matter how big the diff is.
+
+        Args:
+            from_commit (str): A git commit reference
+            to_commit (Union[str, None}): A git commit reference,
+                default: None
+
+        Returns:
+            Iterator[str]: The files that changed between
+                the passed in commits
+
+        Raises:
+            DiffError: When git fails to produce the diff
+        """
+        import git
+
+        process = None
         try:
-            return self._list_of_files(
-                self.repo.git.diff(from_commit, to_commit, name_only=True)
+            process = self.repo.git.diff(
+                from_commit,
+                to_commit,
+                name_only=True,
+                z=True,
+                as_process=True
             )
+
+            for filename in self._stream_of_files(process.proc.stdout):
+                yield filename
+
+            process.wait()
         except git.exc.GitCommandError as exc:
             raise DiffError(
                 "Failed to get list of changed files between '{0}' and {1}'".format(
@@ -62,6 +379,457 @@ class Git(DifferBase):
                 ),
                 exc
             )
+        finally:
+            if process is not None:
+                self._terminate(process.proc)
+
+    def _terminate(self, process):
+        """Stops git when the caller stopped reading before the diff was done"""
+        if process.poll() is None:
+            process.terminate()
+            process.wait()
+
+    def _stream_of_files(self, stream, chunk_size=io.DEFAULT_BUFFER_SIZE):
+        read = getattr(stream, 'read1', stream.read)
+        remainder = b''
+
+        for chunk in iter(lambda: read(chunk_size), b''):
+            files = (remainder + chunk).split(b'\0')
+            remainder = files.pop()
+
+            for filename in files:
+                if filename:
+                    yield filename.decode('utf-8')
+
+        if remainder:
+            yield remainder.decode('utf-8')
+
+
+class LibGit2(DifferBase):
+    """Compares commits in-process through libgit2
+
+    Walks both trees side by side and skips every subtree whose id is
+    the same in both commits, so only the directories that actually
+    changed are read. Requires :mod:`pygit2`.
+    """
+    DiffError = DiffError
+    _repo = None
+
+    @classmethod
+    def available(cls):
+        try:
+            import pygit2  # noqa: F401
+        except ImportError:
+            return False
+
+        return True
+
+    @property
+    def repo(self):
+        if not self._repo:
+            import pygit2
+            self._repo = pygit2.Repository(pygit2.discover_repository(self.base_path))
+        return self._repo
+
+    @property
+    def cache_dir(self):
+        return os.path.join(self.repo.path, 'radish')
+
+    def resolve_commit(self, commit):
+        """
+
+        Args:
+            commit (str): A git commit reference
+
+        Returns:
+            str: The full sha of the commit
+
+        Raises:
+            DiffError: When the reference doesn't resolve to a commit
+        """
+        return str(self._commit(commit).id)
+
+    def tree_ids(self, paths, commit='HEAD'):
+        tree = self._commit(commit).tree
+        ids = {}
+
+        for path in paths:
+            try:
+                ids[path] = str(tree[str(path).rstrip('/')].id)
+            except KeyError:
+                pass
+
+        return ids
+
+    def expand_globs(self, patterns, commit):
+        import pygit2
+
+        def entries(directories, depth):
+            trees = []
+            for directory in directories or ['']:
+                try:
+                    tree = root[directory] if directory else root
+                except KeyError:
+                    continue
+                if tree.type_str == 'tree':
+                    trees.append((directory, self.repo[tree.id]))
+
+            while trees:
+                directory, tree = trees.pop()
+                for entry in tree:
+                    name = '{0}/{1}'.format(directory, entry.name) if directory else entry.name
+                    is_tree = entry.filemode == pygit2.GIT_FILEMODE_TREE
+                    yield name, is_tree
+
+                    if is_tree and name.count('/') + 1 < depth:
+                        trees.append((name, self.repo[entry.id]))
+
+        root = self._commit(commit).tree
+        return self._expand_globs_in_tree(patterns, str(root.id), entries)
+
+    def dirty_paths(self, paths):
+        import pygit2
+
+        if not isinstance(paths, PathIndex):
+            paths = PathIndex(paths)
+
+        return paths.match_files(
+            filename for filename, flags in self.repo.status().items()
+            if flags not in (pygit2.GIT_STATUS_CURRENT, pygit2.GIT_STATUS_IGNORED)
+        )
+
+    def changed_files_between(self, from_commit, to_commit=None):
+        """Returns a list of changed files between two commits.
+
+        Args:
+            from_commit (str): A git commit reference
+            to_commit (Union[str, None}): A git commit reference,
+                default: None
+
+        Returns:
+            list[str]: The files that changed between
+                the passed in commits
+        """
+        return list(self.iter_changed_files_between(from_commit, to_commit))
+
+    def iter_changed_files_between(self, from_commit, to_commit=None):
+        """Yields the changed files between two commits
+
+        Args:
+            from_commit (str): A git commit reference
+            to_commit (Union[str, None}): A git commit reference,
+                default: None which compares against the working copy
+
+        Returns:
+            Iterator[str]: The files that changed between
+                the passed in commits
+
+        Raises:
+            DiffError: When either reference doesn't resolve to a commit
+        """
+        old = self._commit(from_commit).tree
+
+        if to_commit is None:
+            for patch in old.diff_to_workdir():
+                yield patch.delta.new_file.path
+        else:
+            for filename in self._diff_trees(old, self._commit(to_commit).tree):
+                yield filename
+
+    def _commit(self, commit):
+        import pygit2
+
+        try:
+            return self.repo.revparse_single(commit).peel(pygit2.Commit)
+        except (KeyError, ValueError, pygit2.GitError) as exc:
+            raise DiffError("Failed to resolve commit '{0}'".format(commit), exc)
+
+    def _diff_trees(self, old, new, prefix=''):
+        if old is not None and new is not None and old.id == new.id:
+            return
+
+        old_entries = self._entries(old)
+        new_entries = self._entries(new)
+
+        for name in sorted(set(old_entries) | set(new_entries)):
+            old_entry = old_entries.get(name)
+            new_entry = new_entries.get(name)
+            if self._same_entry(old_entry, new_entry):
+                continue
+
+            path = prefix + name
+            old_tree = self._tree_or_none(old_entry)
+            new_tree = self._tree_or_none(new_entry)
+
+            if (old_entry is not None and old_tree is None or
+                    new_entry is not None and new_tree is None):
+                yield path
+
+            if old_tree is not None or new_tree is not None:
+                for filename in self._diff_trees(old_tree, new_tree, path + '/'):
+                    yield filename
+
+    def _entries(self, tree):
+        if tree is None:
+            return {}
+
+        return {entry.name: entry for entry in tree}
+
+    def _same_entry(self, old, new):
+        return (old is not None and new is not None and
+                old.id == new.id and old.filemode == new.filemode)
+
+    def _tree_or_none(self, entry):
+        import pygit2
+
+        if entry is None or entry.filemode != pygit2.GIT_FILEMODE_TREE:
+            return None
+
+        return self.repo[entry.id]
+
+
+class GitTree(Git):
+    """Finds changed paths by comparing tree ids instead of listing files
+
+    A path changed between two commits when the id of its tree differs,
+    so the cost is proportional to the number of configured paths rather
+    than to the number of changed files. The ids of directories are
+    looked up in a single ``git cat-file --batch-check`` session, the
+    trees globs are expanded against are read in a single
+    ``git cat-file --batch`` session.
+
+    Paths without a trailing slash are a prefix of other names, like in
+    :meth:`Path.match`, so every entry of their directory that starts
+    with the name is compared.
+    """
+
+    def changed_paths_between(self, from_commit, to_commit, paths):
+        """Returns which of the paths have changes between two commits
+
+        Args:
+            from_commit (str): A git commit reference
+            to_commit (Union[str, None}): A git commit reference, when
+                ``None`` the working copy is compared by listing files
+            paths (Union[list[Path], PathIndex]): The configured paths
+
+        Returns:
+            set[Path]: The paths with changes, with globs expanded
+        """
+        if to_commit is None:
+            return super(GitTree, self).changed_paths_between(from_commit, to_commit, paths)
+
+        paths = list(getattr(paths, 'paths', paths))
+        commits = [self.resolve_commit(from_commit), self.resolve_commit(to_commit)]
+
+        globs = [path for path in paths if Path.GLOB_CHARACTER in path.path]
+        literals = [path for path in paths if Path.GLOB_CHARACTER not in path.path]
+        directories = [path for path in literals if path.path.endswith('/')]
+        prefixes = [path for path in literals if not path.path.endswith('/')]
+
+        # Only the ids of directories are needed, the trees of the
+        # directories that globs and prefixes are matched in are read
+        ids = self._cat_file([
+            '{0}:{1}'.format(commit, path.path.rstrip('/'))
+            for path in directories
+            for commit in commits
+        ], contents=False)
+        parents = {self._glob_directory(path)[0] for path in globs} | {
+            path.path.rpartition('/')[0] for path in prefixes
+        }
+        objects = self._cat_file([
+            '{0}:{1}'.format(commit, name) for name in sorted(parents) for commit in commits
+        ])
+
+        changed = set()
+        for path in directories:
+            name = path.path.rstrip('/')
+            if self._object_id(ids, commits[0], name) != self._object_id(ids, commits[1], name):
+                changed.add(path)
+
+        for path in prefixes:
+            directory, _, partial = path.path.rpartition('/')
+            if self._entries(objects, commits[0], directory, partial) != self._entries(
+                    objects, commits[1], directory, partial):
+                changed.add(path)
+
+        for path in globs:
+            directory, partial = self._glob_directory(path)
+            old = self._entries(objects, commits[0], directory, partial, trees_only=True)
+            new = self._entries(objects, commits[1], directory, partial, trees_only=True)
+
+            for name in set(old) | set(new):
+                if old.get(name) != new.get(name):
+                    changed.add(Path('{0}{1}/'.format(directory and directory + '/', name)))
+
+        return changed
+
+    def _glob_directory(self, path):
+        basepath = path.path[0:path.path.find(Path.GLOB_CHARACTER)]
+        directory, _, partial = basepath.rpartition('/')
+
+        return directory, partial
+
+    def _object_id(self, objects, commit, name):
+        return objects['{0}:{1}'.format(commit, name)][0]
+
+    def _entries(self, objects, commit, directory, partial, trees_only=False):
+        object_id, object_type, contents = objects['{0}:{1}'.format(commit, directory)]
+        if object_type != 'tree':
+            return {}
+
+        return {name: (mode, entry_id)
+                for mode, name, entry_id in self._tree_entries(contents, len(object_id) // 2)
+                if name.startswith(partial) and (mode == b'40000' or not trees_only)}
+
+    def _tree_entries(self, contents, id_length):
+        index = 0
+        while index < len(contents):
+            space = contents.index(b' ', index)
+            nul = contents.index(b'\0', space)
+
+            yield (
+                contents[index:space],
+                contents[space + 1:nul].decode('utf-8'),
+                binascii.hexlify(contents[nul + 1:nul + 1 + id_length]).decode('ascii')
+            )
+
+            index = nul + 1 + id_length
+
+    def _cat_file(self, names, contents=True):
+        """Looks up all objects in one ``git cat-file`` session
+
+        Args:
+            names (list[str]): Object names like ``<commit>:<path>``
+            contents (bool): Whether to read the contents of the objects,
+                with ``--batch``, or only their ids, with ``--batch-check``
+
+        Returns:
+            dict[str, tuple]: The id, type and contents of each object,
+                ``(None, None, None)`` for objects that are missing. The
+                contents are ``None`` when they aren't read.
+        """
+        if not names:
+            return {}
+
+        process = self.repo.git.cat_file(
+            '--batch' if contents else '--batch-check', as_process=True, istream=subprocess.PIPE
+        )
+        try:
+            output, _ = process.proc.communicate(
+                ''.join('{0}\n'.format(name) for name in names).encode('utf-8')
+            )
+        finally:
+            self._terminate(process.proc)
+
+        objects = {}
+        index = 0
+        for name in names:
+            end = output.index(b'\n', index)
+            header = output[index:end].split(b' ')
+            index = end + 1
+
+            if header[-1] == b'missing':
+                objects[name] = (None, None, None)
+                continue
+
+            if not contents:
+                objects[name] = (header[0].decode('ascii'), header[1].decode('ascii'), None)
+                continue
+
+            size = int(header[2])
+            objects[name] = (
+                header[0].decode('ascii'),
+                header[1].decode('ascii'),
+                output[index:index + size]
+            )
+            index += size + 1
+
+        return objects
+
+
+DIFFERS = {
+    'git': Git,
+    'git-tree': GitTree,
+    'libgit2': LibGit2,
+}
+
+
+def create(name, base_path='.'):
+    """Creates a differ by the name it's configured with
+
+    Falls back to :class:`Git` when the requested differ's
+    dependencies aren't installed.
+
+    Args:
+        name (str): The name of the differ, one of :data:`DIFFERS`
+        base_path (str): The path to the repository
+
+    Returns:
+        DifferBase: The differ
+
+    Raises:
+        ValueError: When there's no differ by that name
+    """
+    try:
+        differ = DIFFERS[name]
+    except KeyError:
+        raise ValueError('No differ "{0}", available differs: {1}'.format(
+            name,
+            ', '.join(sorted(DIFFERS))
+        ))
+
+    if not differ.available():
+        differ = Git
+
+    return differ(base_path)
+
+
+def _glob_key(tree_id, pattern):
+    """
+
+    Args:
+        tree_id (str): The id of a tree
+        pattern (str): A path with globs
+
+    Returns:
+        str: A key for the matches of the pattern in the tree
+    """
+    return hashlib.sha1('{0}\0{1}'.format(tree_id, pattern).encode('utf-8')).hexdigest()
+
+
+def match_globs(patterns, entries):
+    """Matches globs the way :func:`glob.glob` does against a list of entries
+
+    A ``*`` doesn't match ``/`` or a leading ``.``, and patterns ending
+    in ``/`` only match trees.
+
+    Args:
+        patterns (list[str]): Paths with globs
+        entries (Iterable[tuple[str, bool]]): The name of each entry and
+            whether it's a tree
+
+    Returns:
+        dict[str, list[str]]: The sorted matches of each pattern, with a
+            trailing ``/`` when the pattern has one
+    """
+    compiled = [(pattern, pattern.rstrip('/').split('/'), pattern.endswith('/'))
+                for pattern in patterns]
+    matches = {pattern: [] for pattern in patterns}
+
+    for name, is_tree in entries:
+        segments = name.split('/')
+
+        for pattern, pattern_segments, trees_only in compiled:
+            if (len(segments) == len(pattern_segments) and (is_tree or not trees_only) and
+                    all(_match_segment(segment, pattern_segment)
+                        for segment, pattern_segment in zip(segments, pattern_segments))):
+                matches[pattern].append(name + '/' if trees_only else name)
+
+    return {pattern: sorted(set(names)) for pattern, names in matches.items()}
+
+
+def _match_segment(segment, pattern):
+    if segment.startswith('.') and not pattern.startswith('.'):
+        return False
 
-    def _list_of_files(self, files):
-        return filter(lambda x: x, files.strip().split('\n'))
+    return fnmatch.fnmatch(segment, pattern)
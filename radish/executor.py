@@ -1,7 +1,11 @@
 from __future__ import unicode_literals
 
+import codecs
 import os
+import signal
 import subprocess
+import sys
+import threading
 
 import six
 
@@ -9,14 +13,73 @@ from radish.utils import timer, TimeTaken
 
 
 class BaseExecutor(object):
+    # Seconds terminated commands get to exit before they're killed
+    GRACE_PERIOD = 5
+
+    # Whether commands start in a process group of their own, so
+    # terminating them stops their children as well. They lose the
+    # terminal then, and Ctrl-C doesn't reach them
+    process_groups = False
+
     _base_path = None
 
-    def execute(self, path, command):  # pragma: no cover
+    def execute(self, path, command, outputter=None):  # pragma: no cover
+        """
+
+        Args:
+            path (Path): the path where the command should be executed
+            command (str): the command to execute
+            outputter (Union[Outputter, SpooledOutputter, None]): Where to
+                write the output of this command instead of the
+                executor's outputter
+
+        Returns:
+            ExecutionResult: The result of running the command
+        """
         raise NotImplementedError('execute is not implemented')
 
+    def terminate(self, grace_period=None, paths=None):
+        """Stops the commands that are running
+
+        Each command is sent ``SIGTERM`` and, if it's still running after
+        the grace period, ``SIGKILL``. With :attr:`process_groups` the
+        signals go to everything the command started as well. Executors
+        that can't stop their commands let them finish.
+
+        Args:
+            grace_period (Union[float, None]): Seconds to wait before
+                killing, defaults to :attr:`GRACE_PERIOD`
+            paths (Union[Iterable[Path], None]): Only stop the commands
+                running for these paths, all of them by default
+        """
+
     def _null_response(self):
         return ExecutionResult.none()
 
+    def _skip_missing(self, path, outputter):
+        """Skips projects that aren't in the checkout
+
+        Projects found in a commit that's compared to don't have to be
+        checked out, their command can't run without the directory.
+
+        Args:
+            path (Path): The path the command would run in
+            outputter (Union[Outputter, SpooledOutputter, None]): Where to
+                write why the project is skipped
+
+        Returns:
+            Union[ExecutionResult, None]: A skipped result when the
+                directory is missing, ``None`` otherwise
+        """
+        if os.path.isdir(str(path)):
+            return None
+
+        if outputter:
+            outputter.error.write(
+                'Skipping "{0}" because it isn\'t in the checkout\n'.format(path)
+            )
+        return ExecutionResult.skip(path)
+
     @property
     def base_path(self):
         return self._base_path
@@ -37,71 +100,213 @@ class NullExecutor(BaseExecutor):
 
         self.command = None
 
-    def execute(self, path, command):
+    def execute(self, path, command, outputter=None):
         self.command = command
         if command is None:
             return self._null_response()
 
-        if self.outputter:
-            self.outputter.info.write(six.text_type(self.output))
+        outputter = outputter or self.outputter
+        if outputter:
+            outputter.info.write(six.text_type(self.output))
 
         return ExecutionResult(self.exit_code, self.run_time, path)
 
 
 class Executor(BaseExecutor):
-    def __init__(self, outputter=None, base_path='.'):
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, outputter=None, base_path='.', process_groups=False):
         self.outputter = outputter
         self.base_path = base_path
+        self.process_groups = process_groups
+        self._running = {}
+        self._running_lock = threading.Lock()
 
-    def execute(self, path, command):
+    def execute(self, path, command, outputter=None):
         if command is None:
             return self._null_response()
 
-        process, run_time = timer(lambda: self._run(command, path))
+        outputter = outputter or self.outputter
+        missing = self._skip_missing(path, outputter)
+        if missing is not None:
+            return missing
+
+        (process, usage), run_time = timer(lambda: self._run(command, path, outputter))
 
         return ExecutionResult(
             exit_code=process.returncode,
             run_time=run_time,
             path=path,
+            **resource_usage(usage)
         )
 
-    def _run(self, command, path):
+    def _run(self, command, path, outputter):
         """
 
         Args:
             command (str): the command to execute
             path (Path): the path where the command should be executed
+            outputter (Union[Outputter, None]): where to write the output
 
         Returns:
-            subprocess.Popen: A finished popen process
+            (subprocess.Popen, Union[resource.struct_rusage, None]): A
+                finished popen process and the resources it used, where
+                the platform can tell
         """
         process = subprocess.Popen(
             command,
             shell=True,
             cwd=str(path),
             stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE
+            stdout=subprocess.PIPE,
+            **(new_process_group() if self.process_groups else {})
+        )
+        with self._running_lock:
+            self._running[process.pid] = str(path)
+
+        try:
+            stderr = threading.Thread(
+                target=self._pump,
+                args=(process.stderr, outputter and outputter.error)
+            )
+            stderr.daemon = True
+            stderr.start()
+
+            self._pump(process.stdout, outputter and outputter.info)
+            stderr.join()
+
+            return process, self._wait(process)
+        finally:
+            with self._running_lock:
+                self._running.pop(process.pid, None)
+
+    def terminate(self, grace_period=None, paths=None):
+        if not hasattr(os, 'killpg'):  # pragma: no cover
+            return
+
+        paths = None if paths is None else {str(path) for path in paths}
+        with self._running_lock:
+            running = {pid for pid, path in self._running.items() if paths is None or path in paths}
+
+        def send(signum):
+            with self._running_lock:
+                for pid in running & set(self._running):
+                    signal_process(pid, signum, self.process_groups)
+
+        send(signal.SIGTERM)
+
+        timer = threading.Timer(
+            self.GRACE_PERIOD if grace_period is None else grace_period, send, (signal.SIGKILL,)
         )
+        timer.daemon = True
+        timer.start()
 
-        while process.returncode is None:
-            stdout, stderr = process.communicate()
-            if self.outputter:
-                self.outputter.info.write(six.text_type(stdout.decode('utf-8')))
-                self.outputter.error.write(six.text_type(stderr.decode('utf-8')))
+    def _wait(self, process):
+        if hasattr(os, 'waitid'):
+            # Wait without reaping the process, its pid can't be reused
+            # until it's no longer running and can't be signalled anymore
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        with self._running_lock:
+            self._running.pop(process.pid, None)
 
-        return process
+        return reap(process)
+
+    def _pump(self, pipe, stream):
+        """Writes the output of a pipe to a stream as it arrives
+
+        Args:
+            pipe (file): The pipe to read from until it's closed
+            stream (Union[OutputStream, None]): Where to write the output
+        """
+        output = OutputPump(stream, self.CHUNK_SIZE)
+
+        try:
+            for chunk in iter(lambda: os.read(pipe.fileno(), self.CHUNK_SIZE), b''):
+                output.feed(chunk)
+
+            output.close()
+        finally:
+            pipe.close()
+
+
+class OutputPump(object):
+    def __init__(self, stream, chunk_size):
+        """Decodes the output of a command and writes it to a stream
+
+        Output is written a line at a time, and at the latest when
+        ``chunk_size`` characters are waiting, so a command with a
+        lot of output never gets buffered in full.
+
+        Args:
+            stream (Union[OutputStream, None]): Where to write the output
+            chunk_size (int): The most characters to hold back
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._pending = ''
+
+    def feed(self, chunk):
+        """
+
+        Args:
+            chunk (bytes): The output read from the command
+        """
+        self._pending += self._decoder.decode(chunk)
+
+        if len(self._pending) >= self.chunk_size:
+            index = len(self._pending)
+        else:
+            index = self._pending.rfind('\n') + 1
+
+        self._write(self._pending[0:index])
+        self._pending = self._pending[index:]
+
+    def close(self):
+        """Writes whatever output is still pending"""
+        self._pending += self._decoder.decode(b'', True)
+        self._write(self._pending)
+        self._pending = ''
+
+    def _write(self, output):
+        if output and self.stream:
+            self.stream.write(six.text_type(output))
 
 
 class ExecutionResult(object):
-    def __init__(self, exit_code, run_time, path):
+    def __init__(self, exit_code, run_time, path, cpu_time=None, max_rss=None, cancelled=False,
+                 cached=False):
+        """
+
+        Args:
+            exit_code (int): The exit code of the command
+            run_time (Union[TimeTaken, int, float]): The wall time it took
+            path (Path): The path the command ran for
+            cpu_time (Union[float, None]): The user and system CPU seconds
+                used by the command, when known
+            max_rss (Union[int, None]): The peak resident memory of the
+                command in kilobytes, when known
+            cancelled (bool): Whether the command was stopped, or never
+                started, because another command failed
+            cached (bool): Whether the result was reused from an earlier
+                run instead of running the command
+        """
         self.exit_code = exit_code
         self.run_time = run_time
         self.path = path
+        self.cpu_time = cpu_time
+        self.max_rss = max_rss
+        self.cancelled = cancelled
+        self.cached = cached
 
     @property
     def success(self):
         return True if self.exit_code == 0 else False
 
+    @property
+    def skipped(self):
+        return self.exit_code is None and not self.cancelled
+
     def __bool__(self):
         return self.success
 
@@ -120,10 +325,48 @@ class ExecutionResult(object):
         """
         return cls(0, 0, None)
 
+    @classmethod
+    def skip(cls, path):
+        """A result for a path that never ran its command
+
+        Args:
+            path (Path): The path that was skipped
+
+        Returns:
+            ExecutionResult: without an exit code, it's not successful
+        """
+        return cls(None, TimeTaken(0), path)
+
+    @classmethod
+    def cancel(cls, path):
+        """A result for a path whose command was cancelled before it started
+
+        Args:
+            path (Path): The path that was cancelled
+
+        Returns:
+            ExecutionResult: without an exit code, it's not successful
+        """
+        return cls(None, TimeTaken(0), path, cancelled=True)
+
+    @classmethod
+    def from_cache(cls, path):
+        """A result for a path whose command already succeeded for the same tree
+
+        Args:
+            path (Path): The path the result is for
+
+        Returns:
+            ExecutionResult: A successful result that took no time
+        """
+        return cls(0, TimeTaken(0), path, cached=True)
+
 
 class ExecutionResults(object):
     def __init__(self):
         self._results = []
+        self.predicted_run_time = None
+        self.concurrency_changes = None
 
     def add(self, result):
         """
@@ -148,6 +391,14 @@ class ExecutionResults(object):
     def paths(self):
         return [x.path for x in self._results if x.path is not None]
 
+    @property
+    def cancelled(self):
+        """
+        Returns:
+            list[ExecutionResult]: The results of the cancelled commands
+        """
+        return [x for x in self._results if x.cancelled]
+
     def __bool__(self):
         return self.success
 
@@ -156,3 +407,84 @@ class ExecutionResults(object):
 
     def __getitem__(self, item):
         return self._results[item]
+
+
+def _max_rss_in_kilobytes(max_rss):
+    # macOS reports the peak resident set size in bytes, everyone else in kilobytes
+    if sys.platform == 'darwin':  # pragma: no cover
+        return max_rss // 1024
+
+    return max_rss
+
+
+def reap(process):
+    """Waits for a process and sets its return code
+
+    Args:
+        process (subprocess.Popen): The process to wait for
+
+    Returns:
+        Union[resource.struct_rusage, None]: The resources the process
+            used, where the platform can tell
+    """
+    if not hasattr(os, 'wait4'):  # pragma: no cover
+        process.wait()
+        return None
+
+    _, status, usage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+
+    return usage
+
+
+def resource_usage(usage):
+    """
+
+    Args:
+        usage (Union[resource.struct_rusage, None]): What :func:`reap` returned
+
+    Returns:
+        dict: The ``cpu_time`` and ``max_rss`` of an :class:`ExecutionResult`
+    """
+    if usage is None:  # pragma: no cover
+        return {'cpu_time': None, 'max_rss': None}
+
+    return {
+        'cpu_time': usage.ru_utime + usage.ru_stime,
+        'max_rss': _max_rss_in_kilobytes(usage.ru_maxrss),
+    }
+
+
+def new_process_group():
+    """The arguments for :class:`subprocess.Popen` to start a process group
+
+    Returns:
+        dict: Keyword arguments, empty where process groups aren't supported
+    """
+    if not hasattr(os, 'killpg'):  # pragma: no cover
+        return {}
+    if six.PY2:  # pragma: no cover
+        return {'preexec_fn': os.setsid}
+
+    return {'start_new_session': True}
+
+
+def signal_process(pid, signum, group=False):
+    """Sends a signal to a process, or every process in the group it leads
+
+    Args:
+        pid (int): The process to signal
+        signum (int): The signal to send
+        group (bool): Whether to signal the group the process leads, it
+            has to be started with :func:`new_process_group`
+    """
+    try:
+        if group:
+            os.killpg(pid, signum)
+        else:
+            os.kill(pid, signum)
+    except OSError:  # The process has already exited
+        pass
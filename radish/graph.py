@@ -0,0 +1,209 @@
+from __future__ import unicode_literals
+
+import collections
+
+import six
+
+from radish.path import Path
+
+__all__ = ['DependencyGraph', 'DependencyQueue']
+
+
+class DependencyGraph(object):
+    def __init__(self, paths, depends_on=None):
+        """Which of the configured paths depend on which
+
+        Args:
+            paths (Iterable[Path]): The configured paths
+            depends_on (dict[str, Union[str, list[str]]]): The paths each
+                path depends on, globs match against the configured paths
+
+        Raises:
+            ValueError: When a path isn't configured or the dependencies
+                form a cycle
+        """
+        self.paths = [Path(str(path)) for path in paths]
+        self._dependencies = collections.defaultdict(set)
+        self._dependents = collections.defaultdict(set)
+
+        for name, dependencies in (depends_on or {}).items():
+            if isinstance(dependencies, six.string_types):
+                dependencies = [dependencies]
+
+            for path in self._resolve(name):
+                for dependency_name in dependencies:
+                    for dependency in self._resolve(dependency_name):
+                        if dependency != path:
+                            self._dependencies[path].add(dependency)
+                            self._dependents[dependency].add(path)
+
+        self._check_for_cycles()
+
+    def dependencies(self, path):
+        """
+
+        Args:
+            path (Union[str, Path]): A configured path
+
+        Returns:
+            set[Path]: The paths ``path`` depends on directly
+        """
+        return set(self._dependencies.get(path, ()))
+
+    def dependents(self, path):
+        """
+
+        Args:
+            path (Union[str, Path]): A configured path
+
+        Returns:
+            set[Path]: The paths that depend on ``path`` directly
+        """
+        return set(self._dependents.get(path, ()))
+
+    def with_dependents(self, paths):
+        """
+
+        Args:
+            paths (Iterable[Path]): Paths that have changed
+
+        Returns:
+            set[Path]: The paths and every path that depends on them,
+                directly or through other paths
+        """
+        return self._closure(paths, self._dependents)
+
+    def with_dependencies(self, paths):
+        """
+
+        Args:
+            paths (Iterable[Path]): Configured paths
+
+        Returns:
+            set[Path]: The paths and every path they depend on, directly
+                or through other paths
+        """
+        return self._closure(paths, self._dependencies)
+
+    def _closure(self, paths, edges):
+        found = set(paths)
+        pending = list(found)
+
+        while pending:
+            for path in edges.get(pending.pop(), ()):
+                if path not in found:
+                    found.add(path)
+                    pending.append(path)
+
+        return found
+
+    def _resolve(self, name):
+        pattern = Path(str(name))
+        if Path.GLOB_CHARACTER in str(name):
+            matched = [path for path in self.paths if pattern._match_glob(str(path)) == str(path)]
+        else:
+            matched = [path for path in self.paths if path.path == pattern.path]
+
+        if not matched:
+            raise ValueError('"{0}" in depends_on is not a configured path'.format(name))
+
+        return matched
+
+    def _check_for_cycles(self):
+        waiting_on = {path: len(dependencies) for path, dependencies in self._dependencies.items()}
+        pending = [path for path in self._dependents if not waiting_on.get(path)]
+
+        while pending:
+            for dependent in self._dependents.get(pending.pop(), ()):
+                waiting_on[dependent] -= 1
+                if not waiting_on[dependent]:
+                    pending.append(dependent)
+
+        in_cycle = sorted(str(path) for path, count in waiting_on.items() if count)
+        if in_cycle:
+            raise ValueError('Dependency cycle between: {0}'.format(', '.join(in_cycle)))
+
+    def __bool__(self):
+        return bool(self._dependencies)
+
+    def __nonzero__(self):
+        return self.__bool__()
+
+
+class DependencyQueue(object):
+    def __init__(self, graph, items):
+        """Hands out items as soon as the items they depend on have succeeded
+
+        Only dependencies between the queued items are waited for, a
+        dependency that isn't queued is expected to be fine as it is.
+
+        Args:
+            graph (DependencyGraph): The dependencies between paths
+            items (Iterable[tuple[Path, str]]): The path and command to
+                run, ready items are handed out in this order
+        """
+        self.graph = graph
+        self._items = list(items)
+        self._order = {path: index for index, (path, _) in enumerate(self._items)}
+        self._commands = dict(self._items)
+        self._waiting_on = {
+            path: {dependency for dependency in graph.dependencies(path)
+                   if dependency in self._order}
+            for path in self._order
+        }
+        self._ready = [path for path, _ in self._items if not self._waiting_on[path]]
+        self._handled = set(self._ready)
+
+    def ready(self):
+        """Takes the items that can start now
+
+        Returns:
+            list[tuple[Path, str]]: The path and command of each item
+        """
+        ready = sorted(self._ready, key=self._order.get)
+        self._ready = []
+
+        return [(path, self._commands[path]) for path in ready]
+
+    def done(self, path, success=True):
+        """Marks an item as finished
+
+        Args:
+            path (Path): The path of the finished item
+            success (bool): Whether it finished successfully, items that
+                depend on a failed item are never handed out
+
+        Returns:
+            list[Path]: The items skipped because they depend on ``path``
+        """
+        if not success:
+            skipped = [dependent for dependent in self.graph.with_dependents([path])
+                       if dependent in self._order and dependent not in self._handled]
+            self._handled.update(skipped)
+
+            return sorted(skipped, key=self._order.get)
+
+        for dependent in self.graph.dependents(path):
+            waiting_on = self._waiting_on.get(dependent)
+            if waiting_on is None or dependent in self._handled:
+                continue
+
+            waiting_on.discard(path)
+            if not waiting_on:
+                self._ready.append(dependent)
+                self._handled.add(dependent)
+
+        return []
+
+    def cancel(self):
+        """Takes every item that hasn't been handed out
+
+        Returns:
+            list[Path]: The items that will never be handed out
+        """
+        cancelled = [path for path, _ in self._items
+                     if path in self._ready or path not in self._handled]
+        self._ready = []
+        self._handled.update(cancelled)
+
+        return cancelled
@@ -0,0 +1,266 @@
+from __future__ import unicode_literals
+
+import collections
+import errno
+import json
+import os
+import time
+
+import six
+
+from radish.utils import total_seconds
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+__all__ = ['History', 'Record']
+
+Record = collections.namedtuple('Record', [
+    'recorded_at',
+    'command',
+    'path',
+    'commit',
+    'exit_code',
+    'wall_time',
+    'cpu_time',
+    'max_rss',
+])
+
+
+class History(object):
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS results (
+            recorded_at REAL NOT NULL,
+            command TEXT NOT NULL,
+            path TEXT NOT NULL,
+            commit_sha TEXT,
+            exit_code INTEGER,
+            wall_time REAL NOT NULL,
+            cpu_time REAL,
+            max_rss INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS results_by_command_path
+            ON results (command, path, recorded_at);
+    '''
+
+    # How many runs of each command and path are kept
+    KEEP = 100
+
+    def __init__(self, filename, keep=KEEP):
+        """The results radish has run, stored in an SQLite database
+
+        Results are appended to a log next to the database as they're
+        recorded, and moved into the database the next time it's read.
+        Most runs only record, they don't have to load SQLite then.
+
+        Args:
+            filename (str): The database file, it's created when missing
+            keep (Union[int, None]): How many of the most recent runs of
+                each command and path to keep, older ones are dropped as
+                new ones are moved into the database. ``None`` keeps
+                every run.
+        """
+        self.filename = filename
+        self.pending_filename = filename + '.pending'
+        self.keep = keep
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            import sqlite3
+
+            self._make_directory()
+            self._connection = sqlite3.connect(self.filename)
+            self._connection.executescript(self.SCHEMA)
+
+        self._move_pending()
+        return self._connection
+
+    def exists(self):
+        """
+
+        Returns:
+            bool: Whether anything was recorded, without creating the database
+        """
+        return os.path.exists(self.filename) or os.path.exists(self.pending_filename)
+
+    def record(self, command, results, commit=None):
+        """Appends the results of running a command, cached results didn't run
+
+        Args:
+            command (str): The name of the command that was run
+            results (Iterable[ExecutionResult]): The results of running it
+            commit (Union[str, None]): The commit the command ran at
+        """
+        now = time.time()
+        data = ''.join(
+            json.dumps([now, command, str(result.path), commit, result.exit_code,
+                        total_seconds(result.run_time), result.cpu_time, result.max_rss]) + '\n'
+            for result in results if result.path is not None and not result.cached
+        )
+        if not data:
+            return
+
+        self._make_directory()
+        with open(self.pending_filename, 'ab') as fh:
+            _lock(fh)
+            fh.write(data.encode('utf-8'))  # In one write, so appends don't interleave
+
+    def _move_pending(self):
+        """Moves the recorded results into the database"""
+        try:
+            fh = open(self.pending_filename, 'r+b')
+        except (IOError, OSError) as exc:
+            if exc.errno == errno.ENOENT:
+                return
+            raise
+
+        with fh:
+            _lock(fh)
+            rows = []
+            for line in fh:
+                try:
+                    row = json.loads(line.decode('utf-8'))
+                except ValueError:  # Cut short by a radish that was killed while recording
+                    continue
+                if _valid_row(row):
+                    rows.append(row)
+
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+                )
+                if self.keep is not None:
+                    self._prune({(row[1], row[2]) for row in rows})
+
+            fh.truncate(0)
+
+    def _prune(self, runs):
+        """Drops all but the most recent :attr:`keep` runs
+
+        Args:
+            runs (set[tuple[str, str]]): The commands and paths whose runs to drop
+        """
+        self._connection.executemany(
+            'DELETE FROM results WHERE rowid IN ('
+            '    SELECT rowid FROM results WHERE command = ? AND path = ?'
+            '    ORDER BY recorded_at DESC, rowid DESC LIMIT -1 OFFSET ?'
+            ')',
+            [(command, path, self.keep) for command, path in sorted(runs)]
+        )
+
+    def _make_directory(self):
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def records(self, command=None, path=None, limit=None):
+        """
+
+        Args:
+            command (Union[str, None]): Only records for this command
+            path (Union[str, Path, None]): Only records for this path
+            limit (Union[int, None]): At most this many records
+
+        Returns:
+            list[Record]: The matching records, most recent first
+        """
+        query = ('SELECT recorded_at, command, path, commit_sha, exit_code, '
+                 'wall_time, cpu_time, max_rss FROM results')
+        conditions, parameters = [], []
+
+        if command is not None:
+            conditions.append('command = ?')
+            parameters.append(command)
+        if path is not None:
+            conditions.append('path = ?')
+            parameters.append(str(path))
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        query += ' ORDER BY recorded_at DESC, rowid DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(int(limit))
+
+        return [Record(*row) for row in self.connection.execute(query, parameters)]
+
+    def run_times(self, command, last=5):
+        """The average wall time of each path's most recent successful runs
+
+        Args:
+            command (str): The name of the command
+            last (int): How many of the most recent runs to average
+
+        Returns:
+            dict[str, float]: Seconds per path
+        """
+        rows = self.connection.execute(
+            'SELECT path, wall_time FROM results '
+            'WHERE command = ? AND exit_code = 0 '
+            'ORDER BY recorded_at DESC, rowid DESC',
+            (command,)
+        )
+
+        samples = collections.defaultdict(list)
+        for path, wall_time in rows:
+            if len(samples[path]) < last:
+                samples[path].append(wall_time)
+
+        return {path: sum(times) / len(times) for path, times in samples.items()}
+
+    def peak_rss(self, command, last=5):
+        """The highest peak memory of each path's most recent runs
+
+        Args:
+            command (str): The name of the command
+            last (int): How many of the most recent runs to look at
+
+        Returns:
+            dict[str, int]: Kilobytes per path, paths without a recorded
+                peak are left out
+        """
+        rows = self.connection.execute(
+            'SELECT path, max_rss FROM results '
+            'WHERE command = ? AND max_rss IS NOT NULL '
+            'ORDER BY recorded_at DESC, rowid DESC',
+            (command,)
+        )
+
+        samples = collections.defaultdict(list)
+        for path, max_rss in rows:
+            if len(samples[path]) < last:
+                samples[path].append(max_rss)
+
+        return {path: max(peaks) for path, peaks in samples.items()}
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _valid_row(row):
+    """
+
+    Args:
+        row (object): A line of the pending log
+
+    Returns:
+        bool: Whether it can be inserted as a :class:`Record`
+    """
+    return (
+        isinstance(row, list) and len(row) == len(Record._fields) and
+        all(value is None or isinstance(value, six.string_types + six.integer_types + (float,))
+            for value in row) and
+        isinstance(row[1], six.string_types) and isinstance(row[2], six.string_types)
+    )
+
+
+def _lock(fh):
+    # Released when the file is closed
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
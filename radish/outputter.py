@@ -1,6 +1,10 @@
 from __future__ import unicode_literals, print_function
 
+import codecs
+import io
 import sys
+import tempfile
+import threading
 
 
 class Outputter(object):
@@ -36,3 +40,104 @@ class OutputStream(object):
     def write(self, message):
         for stream in self.streams:
             stream.write(message)
+
+
+class SpooledOutputter(object):
+    SPOOL_SIZE = 1024 * 1024
+
+    def __init__(self, max_size=SPOOL_SIZE, lock=None):
+        """Captures the output of one project so it can be written in one go
+
+        Output is kept in memory until it grows past ``max_size`` bytes,
+        after that it spills over to a temporary file.
+
+        Args:
+            max_size (int): How many bytes to keep in memory per stream
+            lock (threading.RLock): Shared by all outputters flushing to
+                the same :class:`Outputter`, so flushes and live output
+                never interleave
+        """
+        self.lock = lock or threading.RLock()
+        self.info = SpooledStream(max_size, self.lock)
+        self.error = SpooledStream(max_size, self.lock)
+
+    def flush(self, outputter):
+        """Writes everything captured so far to the outputter
+
+        Args:
+            outputter (Outputter): Where to write the output
+        """
+        with self.lock:
+            self.info.flush(outputter.info)
+            self.error.flush(outputter.error)
+
+    def go_live(self, outputter):
+        """Flushes the output and writes all further output directly
+
+        Args:
+            outputter (Outputter): Where to write the output
+        """
+        with self.lock:
+            self.info.go_live(outputter.info)
+            self.error.go_live(outputter.error)
+
+    def close(self):
+        """Throws away the output that hasn't been flushed"""
+        with self.lock:
+            self.info.close()
+            self.error.close()
+
+
+class SpooledStream(object):
+    def __init__(self, max_size, lock):
+        """Captures output, the spool is only created once there's output
+
+        Args:
+            max_size (int): How many bytes to keep in memory
+            lock (threading.RLock): Held while writing and flushing
+        """
+        self._max_size = max_size
+        self._spool = None
+        self._lock = lock
+        self._live = None
+
+    def write(self, message):
+        with self._lock:
+            if self._live:
+                self._live.write(message)
+                return
+
+            if self._spool is None:
+                self._spool = tempfile.SpooledTemporaryFile(max_size=self._max_size, mode='w+b')
+            self._spool.write(message.encode('utf-8'))
+
+    def flush(self, stream):
+        """Writes the captured output and closes the spool, its memory
+        or temporary file is released
+
+        Args:
+            stream (OutputStream): Where to write the output
+        """
+        with self._lock:
+            if self._live or self._spool is None:
+                return
+
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            self._spool.seek(0)
+            for chunk in iter(lambda: self._spool.read(io.DEFAULT_BUFFER_SIZE), b''):
+                output = decoder.decode(chunk)
+                if output:
+                    stream.write(output)
+
+            self.close()
+
+    def go_live(self, stream):
+        with self._lock:
+            self.flush(stream)
+            self._live = stream
+
+    def close(self):
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
@@ -1,7 +1,5 @@
 from __future__ import unicode_literals
 
-import os
-
 import six
 
 
@@ -44,11 +42,7 @@ class Path(object):
             file_base_removed = filename.replace(basepath, '', 1)
 
             if '/' in file_base_removed:
-                return os.path.join(
-                    basepath,
-                    file_base_removed.split('/', 1)[0],
-                    ''  # Required to add a slash at the end
-                )
+                return '{0}{1}/'.format(basepath, file_base_removed.split('/', 1)[0])
 
         return None
 
@@ -95,3 +89,138 @@ class Path(object):
             return self.path < other
         else:
             raise NotImplementedError("Don't know how to sort <Path>")
+
+
+class PathIndex(object):
+    def __init__(self, paths=()):
+        """A prefix trie of :class:`Path` keyed on directory segments
+
+        Matches a filename against every indexed path in a single walk
+        over the filename's segments, giving the same results as calling
+        :meth:`Path.match` for each indexed path.
+
+        Args:
+            paths (Iterable[Path]): The paths to index
+        """
+        self._root = _Node()
+        self._has_globs = False
+        self.paths = []
+
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        """
+
+        Args:
+            path (Union(str, Path)): A path to index
+        """
+        if not hasattr(path, 'path'):
+            path = Path(path)
+        if not path:
+            return
+
+        self.paths.append(path)
+
+        prefix = path.path
+        index = prefix.find(Path.GLOB_CHARACTER)
+        if index != -1:
+            prefix = prefix[0:index]
+
+        segments = prefix.split('/')
+        node = self._root
+        for segment in segments[0:-1]:
+            node = node.children.setdefault(segment, _Node())
+
+        if index != -1:
+            self._has_globs = True
+            node.globs.append((segments[-1], prefix))
+        elif segments[-1]:
+            node.partials.append((segments[-1], path))
+        else:
+            node.paths.append(path)
+
+    def match(self, filename):
+        """
+
+        Args:
+            filename (Union(str, Path)): A path in the repository that we're matching against
+
+        Returns:
+            set[Path]: All indexed paths matching the filename, with glob
+              paths expanded to the directory that matched.
+        """
+        filename = str(filename)
+        matches = set()
+
+        node = self._root
+        offset = 0
+        while node:
+            rest = filename[offset:]
+            matches.update(node.paths)
+
+            for partial, path in node.partials:
+                if rest.startswith(partial):
+                    matches.add(path)
+
+            for partial, basepath in node.globs:
+                if rest.startswith(partial):
+                    directory, slash, _ = rest[len(partial):].partition('/')
+                    if slash:
+                        matches.add(Path('{0}{1}/'.format(basepath, directory)))
+
+            end = filename.find('/', offset)
+            if end == -1:
+                break
+
+            node = node.children.get(filename[offset:end])
+            offset = end + 1
+
+        return matches
+
+    def match_files(self, filenames):
+        """Matches all files against the index
+
+        Stops consuming ``filenames`` as soon as every indexed path has
+        matched, unless there are globs in the index since they may
+        expand to any number of paths. The iterator is closed when
+        matching is done, so generators can clean up after themselves.
+
+        Args:
+            filenames (Iterable[Union(str, Path)]): The files to match
+
+        Returns:
+            set[Path]: The matched paths
+        """
+        matches = set()
+        unmatched = None if self._has_globs else set(self.paths)
+        filenames = iter(filenames)
+
+        try:
+            for filename in filenames:
+                found = self.match(filename)
+                matches.update(found)
+
+                if unmatched is not None and found:
+                    unmatched.difference_update(found)
+                    if not unmatched:
+                        break
+        finally:
+            close = getattr(filenames, 'close', None)
+            if close:
+                close()
+
+        return matches
+
+    def __len__(self):
+        return len(self.paths)
+
+
+class _Node(object):
+    __slots__ = ('children', 'paths', 'partials', 'globs')
+
+    def __init__(self):
+        self.children = {}
+        self.paths = []
+        self.partials = []
+        self.globs = []
@@ -0,0 +1,361 @@
+from __future__ import unicode_literals
+
+import collections
+import heapq
+import io
+import time
+
+__all__ = [
+    'ConcurrencyController',
+    'ResourceBudget',
+    'Resources',
+    'order_by_timings',
+    'predict_run_time',
+    'sample_load',
+]
+
+LoadSample = collections.namedtuple('LoadSample', [
+    'load_average',  # Runnable processes over the last minute
+    'runnable',  # Processes runnable right now, besides the one reading
+    'cpu_pressure',  # Percent of the last 10 seconds some task waited on a CPU
+    'memory_pressure',  # Percent of the last 10 seconds some task waited on memory
+    'memory_available',  # Fraction of the memory that's available
+])
+
+
+def order_by_timings(items, timings, key=lambda item: str(item[0])):
+    """Orders items so the ones expected to take the longest come first
+
+    Starting the slowest projects first keeps them from being the tail
+    of a parallel run. Items without a timing are expected to take the
+    average time of the ones with a timing.
+
+    Args:
+        items (Iterable[T]): The items to order
+        timings (dict[str, float]): The seconds each item takes, keyed
+            by ``key(item)``
+        key (Callable[[T], str]): Gets the timings key of an item,
+            by default the string of the first element of the item
+
+    Returns:
+        list[T]: The items, longest expected first
+    """
+    items = list(items)
+    if not timings:
+        return items
+
+    expected = expected_times(timings, [key(item) for item in items])
+    return sorted(items, key=lambda item: (-expected[key(item)], key(item)))
+
+
+def expected_times(timings, names):
+    """
+
+    Args:
+        timings (dict[str, float]): Seconds per name
+        names (Iterable[str]): The names to get the expected time for
+
+    Returns:
+        dict[str, float]: The recorded time of each name, or the average
+            of the recorded times when there is none
+    """
+    average = sum(timings.values()) / len(timings) if timings else 0.0
+
+    return {name: timings.get(name, average) for name in names}
+
+
+def predict_run_time(durations, workers):
+    """How long it takes to run everything when started in order
+
+    Args:
+        durations (Iterable[float]): The expected seconds of each item in
+            the order they start
+        workers (int): How many items run at the same time
+
+    Returns:
+        float: The expected seconds until the last item finishes
+    """
+    finish_times = [0.0] * max(int(workers), 1)
+
+    for duration in durations:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + duration)
+
+    return max(finish_times)
+
+
+Resources = collections.namedtuple('Resources', [
+    'cpu',  # How many CPUs a command keeps busy
+    'memory',  # The peak memory of a command in kilobytes, None when unknown
+])
+
+MEMORY_UNITS = {'K': 1, 'M': 1024, 'G': 1024 ** 2, 'T': 1024 ** 3}
+
+
+def parse_memory(value):
+    """
+
+    Args:
+        value (Union[int, float, str, None]): An amount of memory, plain
+            numbers are megabytes, strings can end in ``K``, ``M``, ``G``
+            or ``T`` like ``512M`` or ``3G``
+
+    Returns:
+        Union[int, None]: The amount in kilobytes
+
+    Raises:
+        ValueError: When the value isn't an amount of memory
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value * MEMORY_UNITS['M'])
+
+    amount = str(value).strip().upper()
+    for suffix in ('IB', 'B'):
+        if amount.endswith(suffix) and amount[:-len(suffix)][-1:] in MEMORY_UNITS:
+            amount = amount[:-len(suffix)]
+
+    unit = MEMORY_UNITS['M']
+    if amount[-1:] in MEMORY_UNITS:
+        amount, unit = amount[:-1], MEMORY_UNITS[amount[-1]]
+
+    try:
+        return int(float(amount) * unit)
+    except ValueError:
+        raise ValueError('"{0}" is not an amount of memory'.format(value))
+
+
+def available_memory(proc='/proc'):
+    """
+
+    Args:
+        proc (str): Where procfs is mounted
+
+    Returns:
+        Union[int, None]: The memory available to start commands in
+            kilobytes, ``None`` where the kernel doesn't report it
+    """
+    try:
+        with io.open('{0}/meminfo'.format(proc), encoding='utf-8') as fh:
+            for line in fh:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+
+    return None
+
+
+class ResourceBudget(object):
+    def __init__(self, cpu=None, memory=None):
+        """The CPUs and memory the running commands share
+
+        Args:
+            cpu (Union[float, None]): The CPUs to hand out, no limit when ``None``
+            memory (Union[int, None]): The kilobytes to hand out, no limit
+                when ``None``
+        """
+        self.cpu = cpu
+        self.memory = memory
+        self._cpu_used = 0
+        self._memory_used = 0
+
+    def fits(self, resources):
+        """
+
+        Args:
+            resources (Resources): What a command needs
+
+        Returns:
+            bool: Whether the command fits next to the running ones
+        """
+        if self.cpu is not None and self._cpu_used + resources.cpu > self.cpu:
+            return False
+        if self.memory is not None and self._memory_used + (resources.memory or 0) > self.memory:
+            return False
+
+        return True
+
+    def take(self, resources):
+        self._cpu_used += resources.cpu
+        self._memory_used += resources.memory or 0
+
+    def give(self, resources):
+        self._cpu_used -= resources.cpu
+        self._memory_used -= resources.memory or 0
+
+
+def cpu_count():
+    """
+
+    Returns:
+        int: The number of CPUs, 1 when it can't be told
+    """
+    import multiprocessing
+
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:  # pragma: no cover
+        return 1
+
+
+def sample_load(proc='/proc'):
+    """Reads how busy the machine is
+
+    Args:
+        proc (str): Where procfs is mounted
+
+    Returns:
+        LoadSample: The load, every value is ``None`` where the kernel
+            doesn't report it
+    """
+    def read(name):
+        try:
+            with io.open('{0}/{1}'.format(proc, name), encoding='utf-8') as fh:
+                return fh.read()
+        except (IOError, OSError):
+            return None
+
+    loadavg = read('loadavg')
+
+    return LoadSample(
+        load_average=_parse_loadavg(loadavg),
+        runnable=_parse_runnable(loadavg),
+        cpu_pressure=_parse_pressure(read('pressure/cpu')),
+        memory_pressure=_parse_pressure(read('pressure/memory')),
+        memory_available=_parse_meminfo(read('meminfo')),
+    )
+
+
+def _parse_loadavg(contents):
+    if contents:
+        return float(contents.split()[0])
+
+
+def _parse_runnable(contents):
+    if contents and len(contents.split()) > 3:
+        return max(int(contents.split()[3].split('/')[0]) - 1, 0)
+
+
+def _parse_pressure(contents):
+    for line in (contents or '').splitlines():
+        if line.startswith('some '):
+            fields = dict(field.split('=', 1) for field in line.split()[1:])
+            return float(fields['avg10'])
+
+
+def _parse_meminfo(contents):
+    fields = {}
+    for line in (contents or '').splitlines():
+        name, _, value = line.partition(':')
+        fields[name] = value.split()[0] if value.split() else None
+
+    if fields.get('MemTotal') and fields.get('MemAvailable'):
+        return float(fields['MemAvailable']) / float(fields['MemTotal'])
+
+
+class ConcurrencyController(object):
+    # Seconds between samples of the load
+    INTERVAL = 2.0
+
+    # Runnable processes per CPU below which another job is started, and
+    # above which one fewer runs. A load average of the last minute above
+    # the busy load keeps jobs from being added, it trails them by about
+    # a minute
+    IDLE_LOAD = 0.75
+    BUSY_LOAD = 1.25
+
+    # Percent of time tasks waited on a CPU before jobs are added, or removed
+    IDLE_CPU_PRESSURE = 10.0
+    BUSY_CPU_PRESSURE = 40.0
+
+    # Memory is tight when tasks waited on it this percent of the time, or
+    # less than this fraction is available, the jobs are halved then
+    MEMORY_PRESSURE = 20.0
+    MEMORY_AVAILABLE = 0.1
+
+    def __init__(self, min_jobs=1, max_jobs=None, interval=INTERVAL, sample=sample_load,
+                 clock=time.time, cpus=None):
+        """Decides how many projects to run as the load of the machine changes
+
+        Another project is started while the CPUs are idle and memory is
+        plentiful, one fewer while the CPUs are overloaded, and half as
+        many while memory is tight. Whether the CPUs are idle or
+        overloaded is told by the CPU pressure of the last 10 seconds and
+        the processes runnable right now, which follow the jobs as they
+        change. The load average of the last minute only holds back
+        adding jobs while it's high, it trails them by about a minute.
+
+        Args:
+            min_jobs (int): The fewest projects to run at the same time
+            max_jobs (Union[int, None]): The most projects to run at the
+                same time, defaults to the number of CPUs
+            interval (float): Seconds between samples of the load
+            sample (Callable[[], LoadSample]): Reads the load
+            clock (Callable[[], float]): The current time in seconds
+            cpus (Union[int, None]): The number of CPUs, detected by default
+        """
+        self.cpus = cpus or cpu_count()
+        self.min_jobs = max(int(min_jobs), 1)
+        self.max_jobs = max(int(max_jobs or self.cpus), self.min_jobs)
+        self.interval = interval
+        self._sample = sample
+        self._clock = clock
+        self._started = clock()
+        self._sampled = None
+
+        load = sample()
+        idle = self.cpus - (load.load_average or 0)
+        self.jobs = self._clamp(int(round(idle)))
+        self.changes = [(0.0, self.jobs)]
+
+    def update(self):
+        """Samples the load if it's time to and adjusts the jobs
+
+        Returns:
+            int: How many projects to run at the same time now
+        """
+        now = self._clock()
+        if self._sampled is not None and now - self._sampled < self.interval:
+            return self.jobs
+        self._sampled = now
+
+        jobs = self._adjust(self.jobs, self._sample())
+        if jobs != self.jobs:
+            self.jobs = jobs
+            self.changes.append((now - self._started, jobs))
+
+        return self.jobs
+
+    def _adjust(self, jobs, load):
+        runnable_per_cpu = self._per_cpu(load.runnable)
+
+        if (_above(load.memory_pressure, self.MEMORY_PRESSURE) or
+                _below(load.memory_available, self.MEMORY_AVAILABLE)):
+            return self._clamp(jobs // 2)
+        if (_above(runnable_per_cpu, self.BUSY_LOAD) or
+                _above(load.cpu_pressure, self.BUSY_CPU_PRESSURE)):
+            return self._clamp(jobs - 1)
+
+        idle = [value < threshold for value, threshold in [
+            (runnable_per_cpu, self.IDLE_LOAD),
+            (load.cpu_pressure, self.IDLE_CPU_PRESSURE),
+        ] if value is not None]
+        if idle and all(idle) and not _above(self._per_cpu(load.load_average), self.BUSY_LOAD):
+            return self._clamp(jobs + 1)
+
+        return jobs
+
+    def _per_cpu(self, value):
+        return None if value is None else float(value) / self.cpus
+
+    def _clamp(self, jobs):
+        return min(max(jobs, self.min_jobs), self.max_jobs)
+
+
+def _above(value, threshold):
+    return value is not None and value > threshold
+
+
+def _below(value, threshold):
+    return value is not None and value < threshold
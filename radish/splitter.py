@@ -1,7 +1,9 @@
+import heapq
+
 __all__ = ['split']
 
 
-def split(splittable, splits=None, index=None):
+def split(splittable, splits=None, index=None, timings=None):
     """Splits a list into :arg:`jobs` chunks
 
     Args:
@@ -11,6 +13,11 @@ def split(splittable, splits=None, index=None):
         index (Union[int, str]): If this is a specified agent of a
             parallel job, this is the split index to return. 0 indexed.
             Default: None, which means return all splits.
+        timings (dict[str, float]): How many seconds each item usually
+            takes, when some items have one the items are split so every
+            chunk takes about the same time. Every node has to pass the
+            same timings, or nodes split differently and items are run
+            twice or not at all. Default: None
 
     Returns:
         List[T]: list of T split into jobs chunks or the chunk
@@ -22,9 +29,13 @@ def split(splittable, splits=None, index=None):
     if splits == 1:
         return splittable
 
-    splits = split_consistently(splittable, splits)
+    if timings and any(str(item) in timings for item in splittable):
+        splits = split_by_timings(splittable, splits, timings)
+    else:
+        # Sorted, so nodes that got the items in another order agree
+        splits = split_consistently(sorted(splittable, key=str), splits)
 
-    if index:
+    if index is not None:
         return splits[index]
     else:
         return splits
@@ -40,8 +51,59 @@ def split_consistently(splittable, splits):
     return _splits
 
 
+def split_by_timings(splittable, splits, timings):
+    """Splits so that every chunk takes about the same time to run
+
+    Assigns the items longest first, each to the chunk with the least
+    total run time so far. Items without a run time are expected to take
+    the median of the ones that have one.
+
+    Args:
+        splittable (Sequence[T]): A list of any T to be split
+        splits (int): The number of chunks
+        timings (dict[str, float]): The seconds each item takes, keyed
+            by the item as a string
+
+    Returns:
+        List[List[T]]: The chunks
+    """
+    default = _median([timings[str(item)] for item in splittable if str(item) in timings])
+    expected = {str(item): timings.get(str(item), default) for item in splittable}
+    items = sorted(splittable, key=lambda item: (-expected[str(item)], str(item)))
+
+    _splits = [[] for _ in range(0, splits)]
+    loads = [(0, j) for j in range(0, splits)]
+
+    for item in items:
+        load, j = heapq.heappop(loads)
+        _splits[j].append(item)
+        heapq.heappush(loads, (load + expected[str(item)], j))
+
+    return _splits
+
+
+def _median(values):
+    """
+
+    Args:
+        values (list[float]): The values to take the median of
+
+    Returns:
+        float: Their median, 0 without values
+    """
+    values = sorted(values)
+    if not values:
+        return 0
+
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
 def _default_int(value, default=None):
-    if not value:
+    if value is None:
         return default
     else:
         return int(value)
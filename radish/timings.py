@@ -0,0 +1,86 @@
+from __future__ import unicode_literals
+
+import json
+import os
+import tempfile
+
+from radish.utils import total_seconds
+
+__all__ = ['Timings']
+
+
+class Timings(object):
+    # How much a new run time counts compared to the earlier ones
+    WEIGHT = 0.5
+
+    def __init__(self, filename, timings=None):
+        """How long each project took to run a command, persisted as JSON
+
+        Run times are smoothed with an exponential moving average so a
+        single slow or fast run doesn't throw off the next split.
+
+        Args:
+            filename (str): The file the timings are stored in
+            timings (dict[str, dict[str, float]]): Seconds per path per command
+        """
+        self.filename = filename
+        self.timings = timings or {}
+
+    @classmethod
+    def load(cls, filename):
+        """
+
+        Args:
+            filename (str): The file to read, it's fine if it doesn't exist
+
+        Returns:
+            Timings: The timings read from the file
+        """
+        try:
+            with open(filename, 'r') as fh:
+                return cls(filename, json.load(fh))
+        except (IOError, OSError, ValueError):
+            return cls(filename)
+
+    def for_command(self, command):
+        """
+
+        Args:
+            command (str): The name of a command
+
+        Returns:
+            dict[str, float]: The seconds each path takes to run the command
+        """
+        return dict(self.timings.get(command, {}))
+
+    def record(self, command, results):
+        """Updates the timings with the run times of successful results
+
+        Cached results didn't run, so they don't count.
+
+        Args:
+            command (str): The name of the command that was run
+            results (Iterable[ExecutionResult]): The results of running it
+        """
+        timings = self.timings.setdefault(command, {})
+
+        for result in results:
+            if result.path is None or not result.success or result.cached:
+                continue
+
+            seconds = total_seconds(result.run_time)
+            previous = timings.get(str(result.path))
+            if previous is not None:
+                seconds = previous + self.WEIGHT * (seconds - previous)
+
+            timings[str(result.path)] = round(seconds, 3)
+
+    def save(self):
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        fd, tmp_filename = tempfile.mkstemp(dir=directory or '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(self.timings, fh, indent=2, sort_keys=True)
+        os.rename(tmp_filename, self.filename)
@@ -18,6 +18,22 @@ def timer(kallable):
     return kallable(), TimeTaken(datetime.now() - start_time)
 
 
+def total_seconds(run_time):
+    """
+
+    Args:
+        run_time (Union[TimeTaken, timedelta, int, float]): A run time
+
+    Returns:
+        float: The run time in seconds
+    """
+    run_time = getattr(run_time, 'elapsed_time', run_time)
+    if isinstance(run_time, timedelta):
+        return run_time.total_seconds()
+
+    return float(run_time)
+
+
 class TimeTaken(object):
     def __init__(self, elapsed_time):
         """Presentation class for :class:`datetime.timedelta`
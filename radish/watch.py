@@ -0,0 +1,514 @@
+from __future__ import unicode_literals
+
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from radish.executor import ExecutionResult
+from radish.graph import DependencyQueue
+from radish.outputter import SpooledOutputter
+
+__all__ = ['InotifyWatcher', 'PollingWatcher', 'Watch', 'create_watcher', 'wait_for_changes']
+
+# Directories whose changes never concern a project
+IGNORED_DIRECTORIES = {'.git', '.hg', '.radish'}
+
+
+class Watcher(object):
+    def __init__(self, base_dir, paths):
+        """Reports the files that change below the configured paths
+
+        Args:
+            base_dir (str): The directory the paths are relative to
+            paths (Iterable[Path]): The paths to watch, directories are
+                watched with everything below them
+        """
+        self.base_dir = os.path.abspath(base_dir)
+        self.roots = sorted({_root(str(path)) for path in paths})
+
+    def changes(self, timeout=None):  # pragma: no cover
+        """Waits for files to change
+
+        Args:
+            timeout (Union[float, None]): The most seconds to wait
+
+        Returns:
+            set[str]: The changed files relative to the base directory,
+                empty when nothing changed before the timeout
+        """
+        raise NotImplementedError('changes is not implemented')
+
+    def close(self):
+        """Stops watching"""
+
+    def _walk(self, root):
+        """
+
+        Args:
+            root (str): A directory relative to the base directory
+
+        Returns:
+            Iterator[tuple[str, list[str]]]: Every directory below it,
+                relative to the base directory, and the files in it
+        """
+        for directory, directories, files in os.walk(os.path.join(self.base_dir, root)):
+            directories[:] = [name for name in directories if name not in IGNORED_DIRECTORIES]
+            yield os.path.relpath(directory, self.base_dir), files
+
+
+class InotifyWatcher(Watcher):
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    EVENT = struct.Struct('iIII')
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, base_dir, paths):
+        """Watches through Linux's inotify, with a watch per directory
+
+        Raises:
+            OSError: When inotify isn't available or out of watches
+        """
+        super(InotifyWatcher, self).__init__(base_dir, paths)
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise _os_error(self._libc)
+
+        self._directories = {}
+        try:
+            for root in self.roots:
+                self._watch_tree(root)
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def available(cls):
+        """
+
+        Returns:
+            bool: Whether inotify can be used on this platform
+        """
+        if not sys.platform.startswith('linux'):
+            return False
+
+        try:
+            return hasattr(_libc(), 'inotify_init1')
+        except OSError:  # pragma: no cover
+            return False
+
+    def changes(self, timeout=None):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        try:
+            data = os.read(self._fd, self.BUFFER_SIZE)
+        except OSError as exc:  # pragma: no cover
+            if exc.errno == errno.EAGAIN:
+                return set()
+            raise
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were lost, anything could have changed
+                changed.update(os.path.join(root, '') for root in self.roots)
+                continue
+            if mask & self.IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+
+            directory = self._directories.get(wd)
+            if directory is None or name in IGNORED_DIRECTORIES:
+                continue
+
+            path = os.path.normpath(os.path.join(directory, name))
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    # Files can be created before the new directory is watched
+                    changed.update(self._watch_tree(path))
+                changed.add(os.path.join(path, ''))
+            else:
+                changed.add(path)
+
+        return changed
+
+    def close(self):
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
+
+    def _watch_tree(self, root):
+        """Watches a directory and every directory below it
+
+        Args:
+            root (str): The directory relative to the base directory
+
+        Returns:
+            set[str]: The files that are already there
+        """
+        files = set()
+        if not os.path.isdir(os.path.join(self.base_dir, root)):
+            # A file is watched through its directory
+            self._watch(os.path.dirname(root))
+            return files
+
+        for directory, names in self._walk(root):
+            self._watch(directory)
+            files.update(os.path.normpath(os.path.join(directory, name)) for name in names)
+
+        return files
+
+    def _watch(self, directory):
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.path.join(self.base_dir, directory).encode(sys.getfilesystemencoding()),
+            self.MASK
+        )
+        if wd < 0:
+            error = _os_error(self._libc)
+            if error.errno != errno.ENOENT:  # Gone already
+                raise error
+        else:
+            self._directories[wd] = '' if directory == '.' else directory
+
+
+class PollingWatcher(Watcher):
+    # Seconds between looking at every file
+    INTERVAL = 1.0
+
+    def __init__(self, base_dir, paths, interval=INTERVAL):
+        """Watches by comparing the modification time and size of every file
+
+        Args:
+            interval (float): Seconds between looking at every file
+        """
+        super(PollingWatcher, self).__init__(base_dir, paths)
+        self.interval = interval
+        self._files = self._scan()
+
+    def changes(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            files = self._scan()
+            changed = {name for name in set(files) | set(self._files)
+                       if files.get(name) != self._files.get(name)}
+            self._files = files
+
+            if changed:
+                return changed
+
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return set()
+            time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+
+    def _scan(self):
+        files = {}
+        for root in self.roots:
+            if os.path.isdir(os.path.join(self.base_dir, root)):
+                names = (os.path.normpath(os.path.join(directory, name))
+                         for directory, names in self._walk(root) for name in names)
+            else:
+                names = [root]
+
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(self.base_dir, name))
+                except OSError:  # Removed while scanning
+                    continue
+                files[name] = (stat.st_mtime, stat.st_size)
+
+        return files
+
+
+def create_watcher(base_dir, paths, poll=False):
+    """
+
+    Args:
+        base_dir (str): The directory the paths are relative to
+        paths (Iterable[Path]): The paths to watch
+        poll (bool): Poll even when inotify is available
+
+    Returns:
+        Watcher: An inotify watcher where possible, a polling one otherwise
+    """
+    if not poll and InotifyWatcher.available():
+        try:
+            return InotifyWatcher(base_dir, paths)
+        except OSError:  # Out of watches, fall back to polling
+            pass
+
+    return PollingWatcher(base_dir, paths)
+
+
+def wait_for_changes(watcher, debounce, timeout=None):
+    """Waits for files to change, and for the burst of changes to end
+
+    Editors and build tools change many files at once, waiting until no
+    file has changed for ``debounce`` seconds handles them in one go.
+
+    Args:
+        watcher (Watcher): Where the changes come from
+        debounce (float): Seconds without changes that end a burst
+        timeout (Union[float, None]): The most seconds to wait for the
+            first change
+
+    Returns:
+        set[str]: The changed files, empty when nothing changed before
+            the timeout
+    """
+    changed = watcher.changes(timeout)
+
+    while changed:
+        more = watcher.changes(debounce)
+        if not more:
+            break
+        changed |= more
+
+    return changed
+
+
+class Watch(object):
+    # Seconds without changes before the changed projects are run
+    DEBOUNCE = 0.2
+
+    def __init__(self, cli, command, watcher, debounce=DEBOUNCE, jobs=1):
+        """Runs a command for the projects whose files change
+
+        Projects are run in the background while changes are watched for,
+        a project starts once the projects it depends on have succeeded
+        and is skipped if one of them fails. When a project changes again
+        while it's running, the run is terminated and started over.
+
+        Args:
+            cli (CLI): The configured paths and the executor to run with
+            command (Command): The command to run
+            watcher (Watcher): Where the changes come from
+            debounce (float): Seconds without changes that end a burst
+            jobs (int): How many projects to run at the same time
+        """
+        self.cli = cli
+        self.command = command
+        self.watcher = watcher
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(jobs)
+        self._threads = {}
+        self._executing = set()
+        self._queue = None
+        self._unfinished = set()
+        self._runs = {}
+        self._stale = set()
+        self._stopped = False
+
+        # Terminating a project has to stop everything it started
+        self.cli.executor.process_groups = True
+
+    def run(self, iterations=None):
+        """Watches for changes until stopped
+
+        Args:
+            iterations (Union[int, None]): How many bursts of changes to
+                handle, watches until interrupted by default
+        """
+        handled = 0
+        while not self._stopped and (iterations is None or handled < iterations):
+            # Wake up now and then, so Ctrl-C gets through
+            changed = wait_for_changes(self.watcher, self.debounce, timeout=1)
+            if changed:
+                self.changed(changed)
+                handled += 1
+
+    def changed(self, files):
+        """Starts the command for the projects the files belong to
+
+        The projects that haven't finished since earlier changes are
+        queued again with them, so they still wait for their dependencies.
+
+        Args:
+            files (Iterable[str]): Files relative to the base directory
+
+        Returns:
+            list[Path]: The projects that are started or restarted, now
+                or once the projects they depend on have succeeded
+        """
+        files = [name for name in files
+                 if not IGNORED_DIRECTORIES & set(name.split(os.sep))]
+        projects = self.cli.graph.with_dependents(self.cli.path_index.match_files(files))
+        if not projects:
+            return []
+
+        changed = [path for path, cmd in self.command.items(filter=sorted(projects))
+                   if cmd is not None]
+        if not changed:
+            return []
+
+        with self._lock:
+            # Running against files that changed since
+            stale = [path for path in changed if path in self._executing]
+            self._stale.update(stale)
+            if stale:
+                self.cli.executor.terminate(paths=stale)
+
+            self._unfinished.update(changed)
+            self._queue = DependencyQueue(
+                self.cli.graph, self.command.items(filter=sorted(self._unfinished))
+            )
+            # Whatever waited to run is handed out again by the new queue
+            self._runs = {}
+            self._start(self._queue.ready())
+
+        return changed
+
+    def stop(self, grace_period=None):
+        """Terminates the running projects and waits for them to stop
+
+        Args:
+            grace_period (Union[float, None]): Seconds the projects get to
+                exit before they're killed
+        """
+        with self._lock:
+            self._stopped = True
+            threads = list(self._threads.values())
+            self._runs = {}
+
+        self.cli.executor.terminate(grace_period=grace_period)
+        for thread in threads:
+            thread.join()
+        self.watcher.close()
+
+    def _start(self, items):
+        """Starts projects the queue handed out, must hold the lock
+
+        Args:
+            items (list[tuple[Path, str]]): The path and command of each project
+        """
+        for path, cmd in items:
+            if path in self._executing and path not in self._stale:
+                continue  # Still running against the same files
+
+            self._runs[path] = cmd
+            if path in self._threads:
+                continue  # Picked up by its thread once the stale run stopped
+
+            thread = threading.Thread(target=self._run_project, args=(path,))
+            thread.daemon = True
+            self._threads[path] = thread
+            thread.start()
+
+    def _finish(self, path, result):
+        """Hands out the projects that waited for a project, must hold the lock
+
+        Args:
+            path (Path): The project that finished
+            result (ExecutionResult): How it finished
+
+        Returns:
+            list[Path]: The projects skipped because it failed
+        """
+        skipped = self._queue.done(path, result.success)
+        self._unfinished.discard(path)
+        self._unfinished.difference_update(skipped)
+        self._start(self._queue.ready())
+
+        return skipped
+
+    def _run_project(self, path):
+        outputter = self.cli.outputter
+
+        while True:
+            with self._slots:
+                with self._lock:
+                    cmd = None if self._stopped else self._runs.pop(path, None)
+                    if cmd is None:
+                        del self._threads[path]
+                        return
+                    self._executing.add(path)
+
+                output = SpooledOutputter(lock=self.cli._output_lock)
+                output.info.write('Running {0} for {1}:\n'.format(self.command.name, path))
+                try:
+                    result = self.cli.executor.execute(path, cmd, output)
+                except Exception as exc:
+                    result = ExecutionResult(99, 0, path)
+                    output.error.write(
+                        'Command for path "{0}" generated an exception: {1}\n'.format(
+                            path, repr(exc)
+                        )
+                    )
+
+            with self._lock:
+                self._executing.discard(path)
+                stale = path in self._stale
+                self._stale.discard(path)
+                restart = stale and path in self._runs
+                if not restart:
+                    del self._threads[path]
+                skipped = [] if stale or self._stopped else self._finish(path, result)
+
+            if stale:
+                output.close()
+                if not restart:
+                    return
+                outputter.info.write('Restarting {0} for {1}, it changed\n'.format(
+                    self.command.name, path
+                ))
+                continue
+
+            output.flush(outputter)
+            outputter.info.write('\n{0}: {1} ({2})\n\n'.format(
+                path, 'Success' if result.success else 'Failure', result.run_time
+            ))
+            for dependent in skipped:
+                outputter.error.write('Skipping "{0}" because "{1}" failed\n'.format(
+                    dependent, path
+                ))
+            return
+
+
+def _root(path):
+    # The directory to watch for a path, up to its first glob
+    index = path.find('*')
+    if index != -1:
+        path = path[0:index].rpartition('/')[0]
+
+    return path.rstrip('/') or '.'
+
+
+def _libc():
+    import ctypes
+    import ctypes.util
+
+    return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+
+def _os_error(libc):
+    import ctypes
+
+    number = ctypes.get_errno()
+    return OSError(number, os.strerror(number))
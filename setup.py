@@ -72,6 +72,9 @@ setup(
         'path.py',
         'gitpython'
     ] + extra_dependencies,
+    extras_require={
+        'libgit2': ['pygit2'],
+    },
     tests_require=[
         'pytest',
         'pytest-cov',
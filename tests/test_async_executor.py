@@ -0,0 +1,239 @@
+from __future__ import unicode_literals
+
+import os
+import signal
+import time
+
+import pytest
+
+from radish.command import Command
+from radish.executor import ExecutionResult
+from radish.outputter import Outputter
+from radish.path import Path
+from tests.test_executor import BaseTestExecutor
+
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+try:
+    from radish.async_executor import AsyncExecutor
+except SyntaxError:  # async/await needs Python 3.5+
+    AsyncExecutor = None
+
+pytestmark = pytest.mark.skipif(AsyncExecutor is None, reason='needs Python 3.5+')
+
+
+class TestAsyncExecutor(BaseTestExecutor):
+    def _executor(self):
+        return AsyncExecutor(outputter=Mock())
+
+    def test_run_returns_command_result_success_when_successful(self):
+        result = AsyncExecutor().execute(Path('/tmp'), 'true')
+
+        assert result.success, 'Expected command to exit successfully'
+        assert result.run_time != 0.0
+        assert result.path == Path('/tmp')
+
+    def test_run_returns_command_result_failure_when_command_fails(self):
+        result = AsyncExecutor().execute(Path('/tmp'), 'exit 3')
+
+        assert result.exit_code == 3
+
+    def test_run_outputs_through_outputter(self):
+        outputter = Mock()
+
+        AsyncExecutor(outputter=outputter).execute(Path('/tmp'), 'echo hello; echo oops >&2')
+
+        outputter.info.write.assert_called_once_with('hello\n')
+        outputter.error.write.assert_called_once_with('oops\n')
+
+    def test_skips_projects_that_are_not_in_the_checkout(self, tmpdir):
+        outputter = Mock()
+
+        result = AsyncExecutor(outputter=outputter).execute(Path(str(tmpdir.join('gone'))), 'true')
+
+        assert result.skipped
+        assert "isn't in the checkout" in outputter.error.write.call_args[0][0]
+
+    def test_records_the_cpu_time_and_peak_memory_of_the_command(self):
+        result = AsyncExecutor().execute(Path('/tmp'), 'true')
+
+        assert result.cpu_time >= 0
+        assert result.max_rss > 0
+
+    def test_exit_code_is_negative_when_killed_by_a_signal(self):
+        assert AsyncExecutor().execute(Path('/tmp'), 'kill -9 $$').exit_code == -9
+
+    def test_run_all_runs_every_job(self):
+        executor = AsyncExecutor()
+
+        finished = executor.run_all([
+            (Path('/tmp'), 'true', None),
+            (Path('/'), 'false', None),
+        ], max_jobs=2)
+
+        assert sorted((f.result().path, f.result().exit_code) for f in finished) == [
+            (Path('/'), 1),
+            (Path('/tmp'), 0),
+        ]
+
+    def test_run_all_waits_without_threads_when_there_are_no_pidfds(self, monkeypatch):
+        import asyncio
+
+        monkeypatch.delattr(os, 'pidfd_open', raising=False)
+        monkeypatch.setattr(asyncio.BaseEventLoop, 'run_in_executor',
+                            Mock(side_effect=AssertionError('Waited in a thread')))
+        executor = AsyncExecutor()
+
+        finished = executor.run_all(
+            [(Path('/tmp'), 'sleep 0.{0}; exit {0}'.format(index), None) for index in range(5)],
+            max_jobs=5
+        )
+
+        assert sorted(f.result().exit_code for f in finished) == [0, 1, 2, 3, 4]
+        assert all(f.result().cpu_time is not None for f in finished)
+        assert signal.getsignal(signal.SIGCHLD) == signal.SIG_DFL
+
+    def test_run_all_writes_to_each_jobs_outputter(self):
+        first, second = Mock(), Mock()
+
+        AsyncExecutor().run_all([
+            (Path('/tmp'), 'echo first', first),
+            (Path('/tmp'), 'echo second', second),
+        ], max_jobs=2)
+
+        first.info.write.assert_called_once_with('first\n')
+        second.info.write.assert_called_once_with('second\n')
+
+    def test_run_all_limits_how_many_jobs_run_at_the_same_time(self, tmpdir):
+        command = 'mkdir lock && sleep 0.05 && rmdir lock'
+
+        finished = AsyncExecutor().run_all(
+            [(Path(str(tmpdir)), command, None)] * 3,
+            max_jobs=1
+        )
+
+        assert all(f.result().success for f in finished)
+
+    def test_run_all_calls_on_done_as_jobs_finish(self):
+        done = []
+
+        AsyncExecutor().run_all(
+            [(Path('/tmp'), 'true', None)],
+            max_jobs=1,
+            on_done=lambda path, future: done.append((path, future.result()))
+        )
+
+        result = done[0][1]
+        assert done == [(Path('/tmp'), ExecutionResult(
+            0, result.run_time, Path('/tmp'), cpu_time=result.cpu_time, max_rss=result.max_rss
+        ))]
+
+    def test_run_all_starts_the_jobs_returned_by_on_done(self):
+        started = []
+
+        def on_done(path, future):
+            started.append(path)
+            if path == Path('/tmp'):
+                return [(Path('/'), 'true', None)]
+
+        finished = AsyncExecutor().run_all([(Path('/tmp'), 'true', None)], 1, on_done=on_done)
+
+        assert started == [Path('/tmp'), Path('/')]
+        assert len(finished) == 2
+
+    def test_run_all_starts_the_jobs_returned_by_on_poll(self):
+        polled = []
+
+        def on_poll():
+            if not polled:
+                polled.append(True)
+                return [(Path('/'), 'true', None)]
+
+        finished = AsyncExecutor().run_all(
+            [(Path('/tmp'), 'sleep 0.2', None)], 2, poll_interval=0.01, on_poll=on_poll
+        )
+
+        assert polled
+        assert [future.result().path for future in finished] == [Path('/'), Path('/tmp')]
+
+    def test_terminate_cancels_jobs_that_have_not_started(self):
+        executor = AsyncExecutor()
+
+        finished = executor.run_all(
+            [(Path('/tmp'), 'false', None), (Path('/'), 'true', None)],
+            max_jobs=1,
+            on_done=lambda path, future: executor.terminate()
+        )
+
+        assert finished[1].result() == ExecutionResult.cancel(Path('/'))
+
+    def test_terminate_stops_running_jobs(self):
+        executor = AsyncExecutor(process_groups=True)
+
+        def on_done(path, future):
+            if not future.result().success:
+                executor.terminate(grace_period=0.1)
+
+        finished = executor.run_all(
+            [(Path('/tmp'), 'trap "" TERM; sleep 10', None), (Path('/'), 'sleep 0.1; false', None)],
+            max_jobs=2,
+            on_done=on_done
+        )
+
+        assert finished[1].result().exit_code == -9
+
+    def test_the_cli_hands_all_projects_to_the_executor(self, cli):
+        cli.executor = AsyncExecutor(outputter=cli.outputter)
+
+        results = cli.run(Command('test', {'default': 'true'}), [Path('/tmp/'), Path('/')], jobs=2)
+
+        assert sorted(results.paths) == [Path('/'), Path('/tmp/')]
+        out = cli.outputter.info.streams[0].getvalue()
+        assert 'Running test for /tmp/:\n' in out
+        assert 'Running test for /:\n' in out
+
+    def test_the_cli_starts_projects_while_other_lookups_are_still_running(self, cli, tmpdir):
+        from radish.cache import DirectoryBackend
+
+        cli.executor = AsyncExecutor(outputter=cli.outputter)
+        cli.differ = Mock()
+        cli.differ.dirty_paths.return_value = set()
+        cli.differ.tree_ids.side_effect = lambda paths: {path: 'tree' for path in paths}
+        cli.result_cache = Mock(wraps=DirectoryBackend(str(tmpdir)))
+        slow_key = DirectoryBackend.key('tree', 'true', {})
+
+        def get(key):
+            if key == slow_key:
+                deadline = time.time() + 5
+                while Path('/tmp/') not in cli.results.paths and time.time() < deadline:
+                    time.sleep(0.01)
+
+        cli.result_cache.get.side_effect = get
+
+        started = time.time()
+        command = Command('test', {'/': 'true', '/tmp/': 'true '})
+        results = cli.run(command, [Path('/'), Path('/tmp/')])
+
+        assert time.time() - started < 5
+        assert results.paths == [Path('/tmp/'), Path('/')]
+
+    def test_the_cli_starts_projects_as_the_controller_allows(self, cli):
+        from radish.scheduler import ConcurrencyController, LoadSample
+
+        cli.executor = AsyncExecutor(outputter=cli.outputter)
+        controller = ConcurrencyController(
+            max_jobs=2, interval=0.01, cpus=1, sample=lambda: LoadSample(0.0, 0, 0.0, 0.0, 0.9)
+        )
+
+        results = cli.run(Command('test', {'default': 'true'}), [Path('/tmp/'), Path('/')],
+                          jobs=controller)
+
+        assert sorted(results.paths) == [Path('/'), Path('/tmp/')]
+        assert results.concurrency_changes == controller.changes
+
+
+def test_it_accepts_an_outputter():
+    AsyncExecutor(outputter=Outputter())
@@ -0,0 +1,228 @@
+from __future__ import unicode_literals
+
+import io
+import os
+import tarfile
+import threading
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pytest
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from radish import cache
+from radish.cache import DiffCache, DirectoryBackend, HTTPBackend
+from radish.path import Path
+
+
+class TestDiffCache(object):
+    def test_key_is_the_same_for_the_same_commits_and_paths(self):
+        assert DiffCache.key('a', 'b', [Path('js/'), Path('extensions/')]) == DiffCache.key(
+            'a', 'b', [Path('extensions/'), Path('js/')]
+        )
+
+    def test_key_changes_with_the_paths(self):
+        assert DiffCache.key('a', 'b', [Path('js/')]) != DiffCache.key('a', 'b', [Path('css/')])
+
+    def test_key_changes_with_the_commits(self):
+        assert DiffCache.key('a', 'b', [Path('js/')]) != DiffCache.key('b', 'a', [Path('js/')])
+
+    def test_key_changes_with_the_differ(self):
+        assert DiffCache.key('a', 'b', [Path('js/')], differ='Git') != DiffCache.key(
+            'a', 'b', [Path('js/')], differ='GitTree'
+        )
+
+    def test_missing_entry_returns_none(self, tmpdir):
+        assert DiffCache(str(tmpdir)).get('m000') is None
+
+    def test_returns_the_stored_paths(self, tmpdir):
+        cache = DiffCache(str(tmpdir.join('diffs')))
+
+        cache.set('m000', {Path('js/'), Path('extensions/rules/')})
+
+        assert cache.get('m000') == ['extensions/rules/', 'js/']
+
+    def test_stores_an_empty_set_of_paths(self, tmpdir):
+        cache = DiffCache(str(tmpdir))
+
+        cache.set('m000', set())
+
+        assert cache.get('m000') == []
+
+    def test_evicts_the_least_recently_used_entries(self, tmpdir):
+        cache = DiffCache(str(tmpdir), max_entries=2)
+        cache.set('first', ['a/'])
+        cache.set('second', ['b/'])
+        os.utime(cache._filename('first'), (1, 1))
+        os.utime(cache._filename('second'), (2, 2))
+
+        cache.set('third', ['c/'])
+
+        assert cache.get('first') is None
+        assert cache.get('second') == ['b/']
+        assert cache.get('third') == ['c/']
+
+
+    def test_entries_removed_during_eviction_are_skipped(self, tmpdir):
+        cache = DiffCache(str(tmpdir), max_entries=1)
+        cache.set('first', ['a/'])
+        getmtime = os.path.getmtime
+
+        def removed_first(filename):
+            if filename == cache._filename('first'):
+                raise OSError(2, 'No such file or directory')
+            return getmtime(filename)
+
+        with mock.patch('os.path.getmtime', side_effect=removed_first):
+            cache.set('second', ['b/'])
+
+        assert cache.get('second') == ['b/']
+
+
+class TestDirectoryBackend(object):
+    def test_key_changes_with_the_tree_command_and_environment(self):
+        key = DirectoryBackend.key('abc', 'make test', {'CI': 'true'})
+
+        assert key == DirectoryBackend.key('abc', 'make test', {'CI': 'true'})
+        assert key != DirectoryBackend.key('abd', 'make test', {'CI': 'true'})
+        assert key != DirectoryBackend.key('abc', 'make lint', {'CI': 'true'})
+        assert key != DirectoryBackend.key('abc', 'make test', {'CI': 'false'})
+
+    def test_key_changes_with_the_trees_of_the_dependencies(self):
+        key = DirectoryBackend.key('abc', 'make test', {}, {'lib/': 'def'})
+
+        assert key == DirectoryBackend.key('abc', 'make test', {}, {'lib/': 'def'})
+        assert key != DirectoryBackend.key('abc', 'make test', {}, {'lib/': 'deg'})
+        assert key != DirectoryBackend.key('abc', 'make test', {})
+        assert DirectoryBackend.key('abc', 'make test', {}, {}) == DirectoryBackend.key(
+            'abc', 'make test', {}
+        )
+
+    def test_missing_entry_returns_none(self, tmpdir):
+        assert DirectoryBackend(str(tmpdir)).get('m000') is None
+
+    def test_returns_the_stored_result(self, tmpdir):
+        cache = DirectoryBackend(str(tmpdir.join('results')))
+
+        cache.set('m000', {'run_time': 1.5})
+
+        assert cache.get('m000') == {'run_time': 1.5}
+
+    def test_evicts_the_least_recently_used_entries_over_the_max_size(self, tmpdir):
+        cache = DirectoryBackend(str(tmpdir), max_size=len('{"run_time": 1}') * 2)
+        cache.set('first', {'run_time': 1})
+        cache.set('second', {'run_time': 2})
+        os.utime(cache._filename('first'), (1, 1))
+        os.utime(cache._filename('second'), (2, 2))
+
+        cache.set('third', {'run_time': 3})
+
+        assert cache.get('first') is None
+        assert cache.get('second') == {'run_time': 2}
+        assert cache.get('third') == {'run_time': 3}
+
+    def test_stores_artifacts_next_to_the_result(self, tmpdir):
+        backend = DirectoryBackend(str(tmpdir))
+
+        backend.set('m000', {'run_time': 1}, b'archive')
+
+        assert backend.artifacts('m000') == b'archive'
+        assert backend.artifacts('m001') is None
+
+
+@pytest.fixture
+def server():
+    entries = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/broken/m000.json':
+                self.send_error(500)
+            elif self.path in entries:
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(entries[self.path])
+            else:
+                self.send_error(404)
+
+        def do_PUT(self):
+            entries[self.path] = self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(201)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield 'http://127.0.0.1:{0}'.format(httpd.server_address[1]), entries
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestHTTPBackend(object):
+    def test_missing_entry_returns_none(self, server):
+        url, _ = server
+
+        assert HTTPBackend(url).get('m000') is None
+        assert HTTPBackend(url).artifacts('m000') is None
+
+    def test_returns_the_stored_result_and_artifacts(self, server):
+        url, entries = server
+        backend = HTTPBackend(url + '/results/')
+
+        backend.set('m000', {'run_time': 1.5}, b'archive')
+
+        assert backend.get('m000') == {'run_time': 1.5}
+        assert backend.artifacts('m000') == b'archive'
+        assert sorted(entries) == ['/results/m000.json', '/results/m000.tar.gz']
+
+    def test_server_errors_are_raised(self, server):
+        url, _ = server
+
+        with pytest.raises(IOError):
+            HTTPBackend(url + '/broken').get('m000')
+
+
+class TestCreateBackend(object):
+    def test_urls_are_stored_over_http(self):
+        backend = cache.create_backend('https://cache.example.com/radish', timeout=2)
+
+        assert isinstance(backend, HTTPBackend)
+        assert backend.timeout == 2
+
+    def test_everything_else_is_a_directory(self, tmpdir):
+        backend = cache.create_backend(str(tmpdir), max_size=10)
+
+        assert isinstance(backend, DirectoryBackend)
+        assert backend.max_size == 10
+
+
+class TestOutputs(object):
+    def test_unpacks_the_packed_outputs(self, tmpdir):
+        tmpdir.join('project', 'dist', 'app.js').write('built', ensure=True)
+        tmpdir.join('project', 'src', 'app.js').write('source', ensure=True)
+
+        data = cache.pack_outputs(str(tmpdir.join('project')), ['dist/', 'missing/'])
+        cache.unpack_outputs(data, str(tmpdir.join('restored')))
+
+        assert tmpdir.join('restored', 'dist', 'app.js').read() == 'built'
+        assert not tmpdir.join('restored', 'src').exists()
+
+    def test_leaves_out_members_outside_of_the_directory(self, tmpdir):
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode='w:gz') as archive:
+            info = tarfile.TarInfo('../escaped')
+            info.size = 2
+            archive.addfile(info, io.BytesIO(b'hi'))
+
+        cache.unpack_outputs(data.getvalue(), str(tmpdir.join('restored')))
+
+        assert not tmpdir.join('escaped').exists()
@@ -1,11 +1,17 @@
 from __future__ import unicode_literals
 
+import json
 import os
+import signal
+import subprocess
+import sys
+import threading
+import time
 from io import StringIO
 
 from docopt import DocoptExit
 
-from radish.executor import ExecutionResult, ExecutionResults
+from radish.executor import ExecutionResult, ExecutionResults, NullExecutor
 
 try:
     from unittest import mock
@@ -16,9 +22,12 @@ import pytest
 from path import path
 
 import radish.cli
+from radish.cache import DiffCache, DirectoryBackend
 from radish.command import Command
+from radish.differs import Git
 from radish.outputter import Outputter
 from radish.path import Path
+from radish.utils import TimeTaken
 
 
 class TestCli(object):
@@ -54,29 +63,36 @@ class TestCli(object):
         def test_returns_none_when_nothing_found(self, cli):
             assert cli.find_command('wololooo') is None
 
-    @mock.patch('concurrent.futures.as_completed')
-    @mock.patch('concurrent.futures.ThreadPoolExecutor')
     class TestRunParallelization(object):
-        def test_default_parallelization_of_1(self, futures_executor, as_completed, cli):
+        @pytest.fixture
+        def futures_executor(self):
+            with mock.patch('concurrent.futures.ThreadPoolExecutor') as futures_executor:
+                yield futures_executor
+
+        @pytest.fixture
+        def future(self, futures_executor):
+            future = futures_executor.return_value.__enter__.return_value.submit.return_value
+            future.add_done_callback.side_effect = lambda callback: callback(future)
+
+            return future
+
+        def test_default_parallelization_of_1(self, futures_executor, future, cli):
             pool_executor = futures_executor.return_value
 
             cli.run('test', ['extensions/rules/'])
 
             futures_executor.assert_called_once_with(max_workers=1)
             pool_executor.__enter__.return_value.submit.assert_called_once_with(mock.ANY, mock.ANY, mock.ANY)
-            as_completed.assert_called_once_with(mock.ANY)
+            future.result.assert_called_once_with()
 
-        def test_accepts_a_jobs_argument_that_sets_the_max_workers(self, futures_executor, _, cli):
+        def test_accepts_a_jobs_argument_that_sets_the_max_workers(self, futures_executor, future,
+                                                                   cli):
             cli.run('test', ['extensions/rules/'], jobs=3)
 
             futures_executor.assert_called_once_with(max_workers=3)
 
-        def test_handles_exceptions_when_resolving_futures(self, futures_executor, as_completed,
-                                                           cli):
-            pool_executor = futures_executor.return_value
-            future = pool_executor.__enter__.return_value.submit.return_value
+        def test_handles_exceptions_when_resolving_futures(self, futures_executor, future, cli):
             future.result.side_effect = Exception('Boom!')
-            as_completed.return_value.__iter__.return_value = [future]
 
             cli.run('test', ['extensions/rules/'])
 
@@ -97,6 +113,181 @@ class TestCli(object):
             to_commit=self.FIRST_GREEN_COMMIT_PY
         ) == {'extensions/rules/'}
 
+    def test_changed_projects_are_cached_for_the_same_commits(self, cli, tmpdir):
+        cli.differ = mock.Mock()
+        cli.differ.resolve_commit.side_effect = lambda commit: commit
+        cli.differ.changed_paths_between.return_value = {Path('js/frontend/')}
+        cli.diff_cache = DiffCache(str(tmpdir))
+
+        first = cli.changed_projects(from_commit='a', to_commit='b')
+        second = cli.changed_projects(from_commit='a', to_commit='b')
+
+        assert first == second == {'js/frontend/'}
+        assert cli.differ.changed_paths_between.call_count == 1
+
+    def test_changed_projects_are_found_when_they_cant_be_cached(self, cli, tmpdir):
+        cli.differ = mock.Mock()
+        cli.differ.resolve_commit.side_effect = lambda commit: commit
+        cli.differ.changed_paths_between.return_value = {Path('js/frontend/')}
+        cli.diff_cache = DiffCache(str(tmpdir))
+
+        with mock.patch.object(DiffCache, 'set', side_effect=OSError(13, 'Permission denied')):
+            assert cli.changed_projects(from_commit='a', to_commit='b') == {'js/frontend/'}
+
+        assert 'Failed to cache the changed paths: ' in cli.outputter.error.streams[0].getvalue()
+
+    def test_changed_projects_against_the_working_copy_are_not_cached(self, cli, tmpdir):
+        cli.differ = mock.Mock()
+        cli.differ.changed_paths_between.return_value = {Path('js/frontend/')}
+        cli.diff_cache = DiffCache(str(tmpdir))
+
+        cli.changed_projects(from_commit='a')
+        cli.changed_projects(from_commit='a')
+
+        assert cli.differ.changed_paths_between.call_count == 2
+        assert tmpdir.listdir() == []
+
+    def test_uncommitted_changed_projects_are_the_dirty_ones_and_their_dependents(self, cli):
+        cli.config['depends_on'] = {'js/*/': 'extensions/rules/'}
+        cli.differ = mock.Mock()
+        cli.differ.dirty_paths.return_value = {Path('extensions/rules/')}
+
+        assert cli.changed_projects(from_commit='a', uncommitted=True) == {
+            'extensions/rules/', 'js/frontend/', 'js/mobile/'
+        }
+        cli.differ.dirty_paths.assert_called_once_with(cli.path_index)
+        assert not cli.differ.changed_paths_between.called
+
+    def _cache_results(self, cli, tmpdir):
+        cli.differ = mock.Mock()
+        cli.differ.dirty_paths.return_value = set()
+        cli.differ.tree_ids.side_effect = lambda paths: {path: 'tree' for path in paths}
+        cli.result_cache = DirectoryBackend(str(tmpdir))
+        cli.executor = mock.Mock(spec=['execute'])
+        cli.executor.execute.side_effect = lambda path, *args: ExecutionResult(0, 1, path)
+
+    def test_successful_results_are_reused_for_the_same_tree(self, cli, tmpdir):
+        self._cache_results(cli, tmpdir)
+        cli.run('test', ['extensions/rules/'])
+        cli.results = ExecutionResults()
+
+        results = cli.run('test', ['extensions/rules/'])
+
+        assert cli.executor.execute.call_count == 1
+        assert results[0].cached
+        assert results.success
+
+    def test_results_are_not_reused_when_a_dependency_changed(self, cli, tmpdir):
+        self._cache_results(cli, tmpdir)
+        cli.config['depends_on'] = {'js/frontend/': 'js/mobile/', 'js/mobile/': 'extensions/rules/'}
+        cli.run('test', ['js/frontend/'])
+        cli.results = ExecutionResults()
+        cli.differ.tree_ids.side_effect = lambda paths: {
+            path: 'changed' if path == 'extensions/rules/' else 'tree' for path in paths
+        }
+
+        results = cli.run('test', ['js/frontend/'])
+
+        assert cli.executor.execute.call_count == 2
+        assert not results[0].cached
+
+    def test_projects_whose_dependencies_have_uncommitted_changes_are_always_run(self, cli,
+                                                                                  tmpdir):
+        self._cache_results(cli, tmpdir)
+        cli.config['depends_on'] = {'js/frontend/': 'extensions/rules/'}
+        cli.differ.dirty_paths.return_value = {Path('extensions/rules/')}
+        cli.run('test', ['js/frontend/'])
+
+        cli.run('test', ['js/frontend/'])
+
+        assert cli.executor.execute.call_count == 2
+        assert tmpdir.listdir() == []
+
+    def test_projects_with_uncommitted_changes_are_always_run(self, cli, tmpdir):
+        self._cache_results(cli, tmpdir)
+        cli.differ.dirty_paths.return_value = {Path('extensions/rules/')}
+        cli.run('test', ['extensions/rules/'])
+
+        cli.run('test', ['extensions/rules/'])
+
+        assert cli.executor.execute.call_count == 2
+        assert tmpdir.listdir() == []
+
+    def test_failed_results_are_not_cached(self, cli, tmpdir):
+        self._cache_results(cli, tmpdir)
+        cli.executor.execute.side_effect = lambda path, *args: ExecutionResult(1, 1, path)
+        cli.run('test', ['extensions/rules/'])
+
+        cli.run('test', ['extensions/rules/'])
+
+        assert cli.executor.execute.call_count == 2
+
+    def test_outputs_are_restored_with_the_cached_result(self, cli, tmpdir):
+        self._cache_results(cli, tmpdir.join('cache'))
+        cli.base_dir = str(tmpdir)
+        cli.config['cache_results'] = {'outputs': ['dist/']}
+
+        def build(path, *args):
+            tmpdir.join(str(path), 'dist', 'app.js').write('built', ensure=True)
+            return ExecutionResult(0, 1, path)
+
+        cli.executor.execute.side_effect = build
+        cli.run('test', ['extensions/rules/'])
+        tmpdir.join('extensions').remove()
+
+        results = cli.run('test', ['extensions/rules/'])
+
+        assert results[-1].cached
+        assert tmpdir.join('extensions', 'rules', 'dist', 'app.js').read() == 'built'
+
+    def test_projects_start_while_other_lookups_are_still_running(self, cli, tmpdir):
+        self._cache_results(cli, tmpdir)
+        slow_key = cli.result_cache.key('tree', 'py.test', {})
+        get = cli.result_cache.get
+        cli.result_cache = mock.Mock(wraps=cli.result_cache)
+
+        def slow_get(key):
+            if key == slow_key:
+                # Only finishes once the other project ran
+                deadline = time.time() + 5
+                while 'js/frontend/' not in cli.results.paths and time.time() < deadline:
+                    time.sleep(0.01)
+            return get(key)
+
+        cli.result_cache.get.side_effect = slow_get
+
+        started = time.time()
+        results = cli.run('test', ['extensions/rules/', 'js/frontend/'])
+
+        assert time.time() - started < 5
+        assert results.paths == ['js/frontend/', 'extensions/rules/']
+
+    def test_failed_lookups_run_the_project(self, cli, tmpdir):
+        self._cache_results(cli, tmpdir)
+        cli.result_cache = mock.Mock(wraps=cli.result_cache)
+        cli.result_cache.get.side_effect = IOError('Unreachable')
+
+        results = cli.run('test', ['extensions/rules/'])
+
+        assert cli.executor.execute.call_count == 1
+        assert not results[0].cached
+        assert 'Failed to look up the cached result for "extensions/rules/": Unreachable' in (
+            cli.outputter.error.streams[0].getvalue()
+        )
+
+    def test_result_cache_can_be_a_shared_backend(self, cli, tmpdir):
+        cli.cache_results = True
+        cli.config['cache_results'] = {'backend': str(tmpdir), 'max_size': 1024}
+
+        assert cli.result_cache.directory == str(tmpdir)
+        assert cli.result_cache.max_size == 1024
+
+    def test_diff_cache_is_off_by_default(self, cli):
+        assert cli.diff_cache is None
+
+    def test_result_cache_is_off_by_default(self, cli):
+        assert cli.result_cache is None
+
     def test_will_run_the_passed_in_command_for_all_configured_folders(self, cli):
         paths = list(cli.changed_projects())
 
@@ -124,6 +315,257 @@ class TestCli(object):
         out = cli.outputter.info.streams[0].getvalue()
         assert out == ''
 
+    def test_parallel_output_is_written_per_project_when_it_finishes(self, cli):
+        cli.executor = NullExecutor(0, output='Done\n')
+
+        cli.run('test', ['extensions/rules/', 'js/frontend/'], jobs=2)
+
+        out = cli.outputter.info.streams[0].getvalue()
+        assert 'Running test for extensions/rules/:\nDone\n\n' in out
+        assert 'Running test for js/frontend/:\nDone\n\n' in out
+        assert len(out) == len('Running test for extensions/rules/:\nDone\n\n'
+                               'Running test for js/frontend/:\nDone\n\n')
+
+    def test_parallel_output_can_tail_the_longest_running_project(self, cli):
+        cli.executor = NullExecutor(0, output='Done\n')
+
+        cli.run('test', ['extensions/rules/', 'js/frontend/'], jobs=2, tail=True)
+
+        out = cli.outputter.info.streams[0].getvalue()
+        assert 'Running test for extensions/rules/:\nDone\n\n' in out
+        assert 'Running test for js/frontend/:\nDone\n\n' in out
+
+    def test_tails_the_project_that_started_first(self, cli):
+        command = cli.find_command('test')
+        cli._outputs, cli._tail = {}, True
+        scheduled_first = cli._spool_output(command, Path('extensions/rules/'))
+        started_first = cli._spool_output(command, Path('js/frontend/'))
+
+        cli._started(Path('js/frontend/'))
+        cli._started(Path('extensions/rules/'))
+        started_first.info.write('Live\n')
+        scheduled_first.info.write('Captured\n')
+
+        assert cli.outputter.info.streams[0].getvalue() == 'Running test for js/frontend/:\nLive\n'
+
+    def test_tails_the_next_project_once_the_tailed_one_finishes(self, cli):
+        command = cli.find_command('test')
+        cli._outputs, cli._tail = {}, True
+        first = cli._spool_output(command, Path('extensions/rules/'))
+        second = cli._spool_output(command, Path('js/frontend/'))
+        cli._started(Path('extensions/rules/'))
+        cli._started(Path('js/frontend/'))
+
+        cli._flush_output(Path('extensions/rules/'))
+        second.info.write('Live\n')
+
+        assert first.info._live is not None
+        assert cli.outputter.info.streams[0].getvalue().endswith(
+            'Running test for js/frontend/:\nLive\n'
+        )
+
+    def test_projects_start_once_the_projects_they_depend_on_succeed(self, cli):
+        cli.config['depends_on'] = {'js/*/': 'extensions/rules/'}
+        started = []
+        cli.executor = mock.Mock(spec=['execute'])
+        cli.executor.execute.side_effect = lambda path, *args: (
+            started.append(str(path)) or ExecutionResult(0, 0, path)
+        )
+
+        results = cli.run('test', ['js/frontend/', 'js/mobile/', 'extensions/rules/'], jobs=2)
+
+        assert started[0] == 'extensions/rules/'
+        assert sorted(started[1:]) == ['js/frontend/', 'js/mobile/']
+        assert results.success
+
+    def test_projects_depending_on_a_failed_project_are_skipped(self, cli):
+        cli.config['depends_on'] = {'js/frontend/': 'extensions/rules/'}
+        cli.executor = NullExecutor(1)
+
+        results = cli.run('test', ['js/frontend/', 'extensions/rules/', 'js/mobile/'], jobs=2)
+
+        assert sorted(str(result.path) for result in results if result.skipped) == ['js/frontend/']
+        assert sorted(map(str, results.paths)) == [
+            'extensions/rules/', 'js/frontend/', 'js/mobile/'
+        ]
+        assert 'Skipping "js/frontend/" because "extensions/rules/" failed\n' in (
+            cli.outputter.error.streams[0].getvalue()
+        )
+
+    def test_fail_fast_cancels_the_other_projects_after_a_failure(self, cli):
+        terminated = threading.Event()
+        cli.executor = mock.Mock(spec=['execute', 'terminate'])
+        cli.executor.terminate.side_effect = terminated.set
+
+        def execute(path, *args):
+            if path == 'extensions/rules/':
+                return ExecutionResult(1, 0, path)
+
+            terminated.wait(5)
+            return ExecutionResult(-15, 0, path)
+
+        cli.executor.execute.side_effect = execute
+
+        results = cli.run(
+            'test', ['extensions/rules/', 'js/frontend/', 'js/mobile/'], jobs=2, fail_fast=True
+        )
+
+        assert cli.executor.terminate.called
+        assert cli.executor.process_groups
+        assert not results[0].cancelled
+        assert sorted(str(result.path) for result in results.cancelled) == [
+            'js/frontend/', 'js/mobile/'
+        ]
+        assert 'Cancelling the remaining projects because "extensions/rules/" failed\n' in (
+            cli.outputter.error.streams[0].getvalue()
+        )
+
+    def test_fail_fast_cancels_projects_waiting_on_dependencies(self, cli):
+        cli.config['depends_on'] = {'js/mobile/': 'js/frontend/'}
+        cli.executor = NullExecutor(1)
+
+        results = cli.run('test', ['extensions/rules/', 'js/frontend/', 'js/mobile/'],
+                          fail_fast=True)
+
+        assert 'js/mobile/' in [str(result.path) for result in results.cancelled]
+        assert not any(result.skipped for result in results)
+
+    def test_changed_projects_include_the_projects_depending_on_them(self, cli):
+        cli.config['depends_on'] = {'js/*/': 'extensions/rules/'}
+        cli.differ = mock.Mock()
+        cli.differ.changed_paths_between.return_value = {Path('extensions/rules/')}
+
+        assert cli.changed_projects(from_commit='a') == {
+            'extensions/rules/', 'js/frontend/', 'js/mobile/'
+        }
+
+    def test_expand_paths_expands_globs_against_the_commit(self, cli):
+        cli.config['paths'] = [Path('extensions/*/'), Path('js/mobile/')]
+        cli.differ = mock.Mock()
+        cli.differ.expand_globs.return_value = {'extensions/*/': ['extensions/rules/']}
+
+        cli.expand_paths('a')
+
+        cli.differ.expand_globs.assert_called_once_with(['extensions/*/'], 'a')
+        assert cli.config['paths'] == [Path('extensions/rules/'), Path('js/mobile/')]
+        assert cli.path_index.match_files(['extensions/rules/a.py']) == {'extensions/rules/'}
+
+    def test_expand_paths_falls_back_to_the_working_copy(self, cli, tmpdir, monkeypatch):
+        tmpdir.join('extensions', 'rules').ensure(dir=True)
+        monkeypatch.chdir(tmpdir)
+        cli.config['paths'] = [Path('extensions/*/')]
+        cli.differ = mock.Mock()
+        cli.differ.expand_globs.return_value = None
+
+        cli.expand_paths('a')
+
+        assert cli.config['paths'] == [Path('extensions/rules/')]
+
+    def test_starts_more_projects_as_the_controller_allows(self, cli):
+        from radish.scheduler import ConcurrencyController, LoadSample
+
+        samples = iter(
+            [LoadSample(1.0, None, None, None, None)] + [LoadSample(0.0, 0, None, None, None)] * 9
+        )
+        controller = ConcurrencyController(
+            max_jobs=3, interval=0, cpus=2,
+            sample=lambda: next(samples, LoadSample(0.0, 0, 0, 0, 1))
+        )
+        running = []
+        most = []
+        lock = threading.Lock()
+
+        def execute(path, cmd, outputter=None):
+            with lock:
+                running.append(path)
+                most.append(len(running))
+            threading.Event().wait(0.05)
+            with lock:
+                running.remove(path)
+            return ExecutionResult(0, 0, path)
+
+        cli.executor = mock.Mock(spec=['execute'])
+        cli.executor.execute.side_effect = execute
+
+        results = cli.run('test', ['extensions/rules/', 'js/frontend/', 'js/mobile/'],
+                          jobs=controller)
+
+        assert sorted(results.paths) == ['extensions/rules/', 'js/frontend/', 'js/mobile/']
+        assert controller.changes[0] == (0.0, 1)
+        assert max(most) <= 3
+        assert results.concurrency_changes == controller.changes
+
+    class TestResources(object):
+        def _run(self, cli, command, **kwargs):
+            running, together = set(), []
+            lock = threading.Lock()
+
+            def execute(path, cmd, outputter=None):
+                with lock:
+                    running.add(str(path))
+                    together.append(frozenset(running))
+                threading.Event().wait(0.05)
+                with lock:
+                    running.discard(str(path))
+                return ExecutionResult(0, 0, path)
+
+            cli.executor = mock.Mock(spec=['execute'])
+            cli.executor.execute.side_effect = execute
+            cli.config['commands'] = {command}
+            cli.run('build', ['extensions/rules/', 'js/frontend/', 'js/mobile/'], jobs=3,
+                    **kwargs)
+
+            return together
+
+        def test_projects_that_need_too_much_memory_together_run_apart(self, cli):
+            cli.config['resources'] = {'memory': '4G'}
+            together = self._run(cli, Command('build', {
+                'default': {'run': 'make', 'memory': '100M'},
+                'js/*/': {'run': 'webpack', 'memory': '3G'},
+            }))
+
+            assert not any({'js/frontend/', 'js/mobile/'} <= running for running in together)
+            assert any({'extensions/rules/', 'js/frontend/'} <= running or
+                       {'extensions/rules/', 'js/mobile/'} <= running for running in together)
+
+        def test_cpu_weights_count_against_the_jobs(self, cli):
+            together = self._run(cli, Command('build', {
+                'default': {'run': 'make', 'cpu': 2},
+            }))
+
+            assert max(len(running) for running in together) == 1
+
+        def test_the_learned_peak_memory_wins_over_the_hint(self, cli):
+            cli.config['resources'] = {'memory': '4G'}
+            together = self._run(cli, Command('build', {
+                'default': {'run': 'make', 'memory': '3G'},
+            }), peak_rss={'extensions/rules/': 1024, 'js/frontend/': 1024, 'js/mobile/': 1024})
+
+            assert max(len(running) for running in together) == 3
+
+    def test_starts_the_projects_expected_to_take_the_longest_first(self, cli):
+        cli.run('test', ['extensions/rules/', 'js/frontend/', 'js/mobile/'], timings={
+            'extensions/rules/': 1,
+            'js/mobile/': 5,
+        })
+
+        assert cli.outputter.info.streams[0].getvalue() == (
+            'Running test for js/mobile/:\n\n'
+            'Running test for js/frontend/:\n\n'
+            'Running test for extensions/rules/:\n\n'
+        )
+
+    def test_predicts_the_run_time_from_timings(self, cli):
+        results = cli.run('test', ['extensions/rules/', 'js/mobile/'], jobs=2, timings={
+            'extensions/rules/': 1,
+            'js/mobile/': 5,
+        })
+
+        assert results.predicted_run_time == 5
+
+    def test_no_prediction_without_timings(self, cli):
+        assert cli.run('test', ['extensions/rules/']).predicted_run_time is None
+
     def test_executing_command_outputs_info_about_what_is_running_and_where(self, cli):
         cli.run('test', ['extensions/rules/'])
 
@@ -198,6 +640,82 @@ class TestConfigParser(object):
                 Path('js/mobile/')
             ]
 
+    def test_does_not_construct_python_objects(self):
+        import yaml
+
+        with pytest.raises(yaml.YAMLError):
+            radish.cli.read_config(StringIO('paths: !!python/object/apply:os.getcwd []'))
+
+    class TestCache(object):
+        @pytest.fixture
+        def repository(self, tmpdir, monkeypatch):
+            tmpdir.join('Radishfile').write('paths:\n  - extensions/*/\n  - js/\n')
+            tmpdir.join('extensions', 'rules').ensure(dir=True)
+            monkeypatch.chdir(tmpdir)
+
+            return tmpdir
+
+        def _read(self, repository):
+            return radish.cli.read_config(
+                'Radishfile', cache_file=str(repository.join('.radish', 'config.json'))
+            )
+
+        def test_reuses_the_parsed_config(self, repository):
+            first = self._read(repository)
+
+            with mock.patch('yaml.load', side_effect=AssertionError('Parsed again')):
+                assert self._read(repository) == first
+            assert first['paths'] == [Path('extensions/rules/'), Path('js/')]
+
+        def test_parses_again_when_the_radishfile_changes(self, repository):
+            self._read(repository)
+            repository.join('Radishfile').write('paths:\n  - css/\n')
+
+            assert self._read(repository)['paths'] == [Path('css/')]
+
+        def test_expands_globs_again_when_a_listed_directory_changes(self, repository):
+            self._read(repository)
+            repository.join('extensions', 'roles').ensure(dir=True)
+            os.utime(str(repository.join('extensions')), (1, 1))
+
+            assert sorted(map(str, self._read(repository)['paths'])) == [
+                'extensions/roles/', 'extensions/rules/', 'js/'
+            ]
+
+        def test_stores_the_config_as_json(self, repository):
+            self._read(repository)
+
+            entry = json.loads(repository.join('.radish', 'config.json').read())
+            assert entry['config']['paths'] == ['extensions/rules/', 'js/']
+
+        def test_parses_again_when_the_cache_is_not_json(self, repository):
+            repository.join('.radish', 'config.json').write_binary(b'\x80\x04garbage', ensure=True)
+
+            assert self._read(repository)['paths'] == [Path('extensions/rules/'), Path('js/')]
+
+        def test_configs_json_cant_store_are_not_cached(self, repository):
+            repository.join('Radishfile').write('paths:\n  - js/\nreleased: 2020-01-01\n')
+
+            assert self._read(repository)['paths'] == [Path('js/')]
+            assert not repository.join('.radish', 'config.json').check()
+
+        def test_leaves_globs_for_the_commit_when_not_expanding(self, repository):
+            self._read(repository)
+            config = radish.cli.read_config(
+                'Radishfile',
+                cache_file=str(repository.join('.radish', 'config.json')),
+                expand_globs=False
+            )
+
+            assert config['paths'] == [Path('extensions/*/'), Path('js/')]
+
+        def test_globs_in_nested_directories_list_every_level(self, repository):
+            repository.join('extensions', 'rules', 'lib').ensure(dir=True)
+
+            assert sorted(radish.cli._glob_directories('extensions/*/lib/*/')) == [
+                'extensions', 'extensions/rules/lib'
+            ]
+
     def test_reads_a_list_of_commands_for_paths(self):
         conf_file = StringIO('\n'.join([
             '---',
@@ -308,6 +826,28 @@ class TestMain(object):
             assert kwargs['jobs'] == 2
             assert 'in parallel with 2 processes' in cli.outputter.info.streams[0].getvalue()
 
+        def test_auto_jobs_follow_the_load_between_the_configured_bounds(self, cli_mock,
+                                                                         outputter):
+            from radish.scheduler import ConcurrencyController
+
+            cli = self._setup(cli_mock, outputter)
+            cli.run.return_value.concurrency_changes = [(0.0, 2), (12.0, 3)]
+            cli.find_command.return_value = Command('test', {'default': 'true'})
+
+            with mock.patch('radish.cli.read_config', return_value={
+                'paths': [Path('extensions/m000/')],
+                'commands': {Command('test', {'default': 'true'})},
+                'auto_jobs': {'min': 2, 'max': 3},
+            }):
+                assert_command(['command', 'test', '--jobs', 'auto'], 0)
+
+            jobs = cli.run.call_args[1]['jobs']
+            assert isinstance(jobs, ConcurrencyController)
+            assert (jobs.min_jobs, jobs.max_jobs) == (2, 3)
+            output = cli.outputter.info.streams[0].getvalue()
+            assert 'in parallel with 2-3 processes depending on the load' in output
+            assert 'Concurrency: 2 jobs, 3 jobs after 12s\n' in output
+
         def test_prints_actual_time_spent_running(self, cli_mock, outputter):
             cli = self._setup(cli_mock, outputter)
 
@@ -319,3 +859,243 @@ class TestMain(object):
             )
             assert run_time in cli.outputter.info.streams[0].getvalue()
             assert cli.outputter.info.streams[0].getvalue().endswith(run_time)
+
+        def test_prints_predicted_time_next_to_actual_time(self, cli_mock, outputter):
+            cli = self._setup(cli_mock, outputter)
+            cli.run.return_value.predicted_run_time = TimeTaken(2)
+
+            assert_command(['command', 'test', '--jobs', '2'], 0)
+
+            assert cli.outputter.info.streams[0].getvalue().endswith(
+                'Cumulative run time: 1.12 seconds\n'
+                'Predicted run time: 2 seconds\n'
+                'Finished in less than 0.000 seconds\n'
+            )
+
+
+@mock.patch('radish.cli.current_commit', return_value=None)
+@mock.patch('radish.cli.CLI', autospec=True)
+class TestSharedTimings(object):
+    def _run_command(self, cli_mock, outputter, tmpdir, args):
+        results = ExecutionResults()
+        results.add(ExecutionResult(0, 3, Path('b/')))
+
+        cli = cli_mock.return_value
+        cli.outputter = outputter
+        cli.changed_projects.return_value = {Path('a/'), Path('b/'), Path('c/')}
+        cli.find_command.return_value = Command('test', {'default': 'true'})
+        cli.run.return_value = results
+
+        with pytest.raises(radish.cli.RadishExit):
+            radish.cli.run_command(
+                radish.cli.parse_arguments(['command', 'test', '--jobs', '2'] + args),
+                {}, mock.Mock(), outputter, str(tmpdir.join('.radish'))
+            )
+
+        return cli
+
+    def test_jobs_are_split_by_the_shared_timings(self, cli_mock, _, outputter, tmpdir):
+        tmpdir.join('shared.json').write(json.dumps({'test': {'a/': 10, 'b/': 1}}))
+
+        cli = self._run_command(cli_mock, outputter, tmpdir, [
+            '--job', '1', '--timings', str(tmpdir.join('shared.json'))
+        ])
+
+        # c/ is expected to take the median time
+        assert cli.run.call_args[1]['paths'] == ['c/', 'b/']
+
+    def test_jobs_are_split_evenly_without_shared_timings(self, cli_mock, _, outputter, tmpdir):
+        tmpdir.join('.radish', 'timings.json').write(
+            json.dumps({'test': {'a/': 10, 'b/': 1}}), ensure=True
+        )
+
+        cli = self._run_command(cli_mock, outputter, tmpdir, ['--job', '1'])
+
+        assert cli.run.call_args[1]['paths'] == ['b/']
+
+    def test_the_shared_timings_are_never_written(self, cli_mock, _, outputter, tmpdir):
+        shared = tmpdir.join('.radish', 'timings.json')
+        shared.write(json.dumps({'test': {'a/': 10}}), ensure=True)
+
+        self._run_command(cli_mock, outputter, tmpdir, ['--job', '1', '--timings', str(shared)])
+
+        assert json.loads(shared.read()) == {'test': {'a/': 10}}
+
+    def test_the_timings_of_the_run_are_recorded(self, cli_mock, _, outputter, tmpdir):
+        self._run_command(cli_mock, outputter, tmpdir, ['--job', '1'])
+
+        assert json.loads(tmpdir.join('.radish', 'timings.json').read()) == {'test': {'b/': 3}}
+
+
+class TestRecentRuns(object):
+    def test_reads_the_run_times_and_peak_memory_from_the_history(self, tmpdir, outputter):
+        from radish.history import History
+
+        History(str(tmpdir.join('history.sqlite'))).record('test', [
+            ExecutionResult(0, 2, Path('js/'), max_rss=1024)
+        ])
+
+        assert radish.cli._recent_runs(str(tmpdir), 'test', outputter) == (
+            {'js/': 2}, {'js/': 1024}
+        )
+
+    def test_nothing_without_a_history(self, tmpdir, outputter):
+        assert radish.cli._recent_runs(str(tmpdir), 'test', outputter) == ({}, {})
+        assert not tmpdir.join('history.sqlite').check()
+
+
+class TestCurrentCommit(object):
+    def test_resolves_the_commit_compared_to(self):
+        differ = mock.Mock()
+        differ.resolve_commit.return_value = 'abc123'
+
+        assert radish.cli.current_commit(differ, 'main') == 'abc123'
+        differ.resolve_commit.assert_called_once_with('main')
+
+    def test_no_commit_outside_of_a_repository(self, tmpdir):
+        assert radish.cli.current_commit(Git(base_path=str(tmpdir))) is None
+
+    def test_other_errors_are_raised(self):
+        differ = mock.Mock()
+        differ.resolve_commit.side_effect = RuntimeError('broken')
+
+        with pytest.raises(RuntimeError):
+            radish.cli.current_commit(differ)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime needs Python 3.7+')
+class TestStartup(object):
+    # Slow to import and only needed by some commands
+    HEAVY_MODULES = {
+        'asyncio', 'concurrent.futures', 'docopt', 'git', 'pygit2', 'sqlite3', 'tarfile',
+        'urllib.request', 'yaml',
+    }
+
+    def _import_times(self, code):
+        """
+
+        Returns:
+            dict[str, int]: The cumulative microseconds it took to import each module
+        """
+        output = subprocess.check_output(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            stderr=subprocess.STDOUT
+        ).decode('utf-8')
+
+        times = {}
+        for line in output.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, name = line[len('import time:'):].split('|')
+                if cumulative.strip().isdigit():
+                    times[name.strip()] = int(cumulative)
+
+        return times
+
+    def test_importing_the_cli_leaves_out_heavy_dependencies(self):
+        times = self._import_times('import radish.cli')
+
+        assert set(times) & self.HEAVY_MODULES == set(), (
+            'radish.cli took {0}us to import'.format(times.get('radish.cli'))
+        )
+
+    def test_version_only_needs_docopt(self):
+        times = self._import_times(
+            'import radish.cli\n'
+            'try:\n'
+            '    radish.cli.main(["--version"])\n'
+            'except SystemExit:\n'
+            '    pass\n'
+        )
+
+        assert set(times) & self.HEAVY_MODULES == {'docopt'}
+
+    def test_running_a_command_leaves_out_git_and_sqlite(self, tmpdir):
+        tmpdir.join('Radishfile').write('paths: [app/]\ncommands:\n  test:\n    default: "true"\n')
+        tmpdir.join('app').ensure(dir=True)
+        subprocess.check_call(['git', 'init', '-q'], cwd=str(tmpdir))
+
+        output = subprocess.check_output(
+            [sys.executable, '-c',
+             'import sys, radish.cli\n'
+             'try:\n'
+             '    radish.cli.main(["command", "test"])\n'
+             'except SystemExit:\n'
+             '    pass\n'
+             'print(sorted({"git", "sqlite3"} & set(sys.modules)))\n'],
+            cwd=str(tmpdir),
+            env=dict(
+                os.environ,
+                RADISH_NO_DAEMON='1',
+                PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(radish.__file__)))
+            ),
+        ).decode('utf-8')
+
+        assert 'app/: Success' in output
+        assert output.splitlines()[-1] == '[]'
+        assert tmpdir.join('.radish', 'history.sqlite.pending').check()
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self') or sys.version_info < (3, 5),
+                    reason='Reads processes from /proc, --async needs Python 3.5+')
+class TestInterrupt(object):
+    @pytest.mark.parametrize('options', [[], ['--async']])
+    def test_interrupting_fail_fast_stops_the_projects(self, tmpdir, options):
+        tmpdir.join('Radishfile').write(
+            'paths: [a/, b/]\n'
+            'commands:\n'
+            '  test:\n'
+            '    default: "sleep 60 & echo $! > sleep.pid; wait"\n'
+        )
+        pid_files = [tmpdir.join(name, 'sleep.pid') for name in ('a', 'b')]
+        for pid_file in pid_files:
+            pid_file.dirpath().ensure(dir=True)
+        subprocess.check_call(['git', 'init', '-q'], cwd=str(tmpdir))
+
+        process = subprocess.Popen(
+            [sys.executable, '-c',
+             'import radish.cli\n'
+             'radish.cli.main({0!r})\n'.format(
+                 ['command', 'test', '--jobs=2', '--fail-fast'] + options
+             )],
+            cwd=str(tmpdir),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=dict(
+                os.environ,
+                RADISH_NO_DAEMON='1',
+                PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(radish.__file__)))
+            ),
+        )
+        try:
+            pids = [int(self._wait_for(pid_file).strip()) for pid_file in pid_files]
+
+            process.send_signal(signal.SIGINT)
+            _, error = process.communicate(timeout=10)
+        finally:
+            if process.poll() is None:
+                process.kill()
+
+        assert process.returncode != 0
+        assert 'Interrupted, stopping the running projects' in error.decode('utf-8')
+        assert not any(self._running(pid) for pid in pids)
+
+    def _wait_for(self, pid_file):
+        for _ in range(100):
+            if pid_file.check() and pid_file.read().strip():
+                return pid_file.read()
+            time.sleep(0.1)
+        raise AssertionError('{0} was never written'.format(pid_file))
+
+    def _running(self, pid):
+        # Killed processes can linger as zombies until they're reaped
+        for _ in range(50):
+            try:
+                with open('/proc/{0}/stat'.format(pid)) as fh:
+                    state = fh.read().rsplit(')', 1)[1].split()[0]
+            except (IOError, OSError):
+                return False
+            if state == 'Z':
+                return False
+            time.sleep(0.1)
+
+        return True
@@ -1,6 +1,9 @@
 from __future__ import unicode_literals
 
+import pytest
+
 from radish.command import Command
+from radish.scheduler import Resources
 
 
 class TestCommand(object):
@@ -35,3 +38,72 @@ class TestCommand(object):
         assert command.items(filter=['ruby/mobile/']) == [
             ('ruby/mobile/', 'bundle exec rspec')
         ]
+
+    def test_most_specific_glob_wins(self):
+        command = Command('test', {
+            'js/*': 'npm test',
+            'js/legacy/*': 'grunt test',
+            '*/legacy/*': 'make test',
+        })
+
+        assert command.items(filter=['js/legacy/app/', 'ruby/legacy/app/', 'js/app/']) == [
+            ('js/legacy/app/', 'grunt test'),
+            ('ruby/legacy/app/', 'make test'),
+            ('js/app/', 'npm test'),
+        ]
+
+    def test_matches_globs_with_a_star_in_the_middle(self):
+        command = Command('test', {
+            '*/legacy/*': 'make test',
+            'js/*': 'npm test',
+            'x/*/y/*': 'tox',
+        })
+
+        assert command.items(filter=['x/a/y/b/', 'js/app/', 'ruby/legacy/app/', 'go/']) == [
+            ('x/a/y/b/', 'tox'),
+            ('js/app/', 'npm test'),
+            ('ruby/legacy/app/', 'make test'),
+            ('go/', None),
+        ]
+
+    def test_exact_paths_win_over_globs(self, command):
+        command.mapping['ruby/mobile/'] = 'rake test'
+
+        assert command.items(filter=['ruby/mobile/']) == [('ruby/mobile/', 'rake test')]
+
+    def test_matches_more_globs_than_fit_in_one_pattern(self):
+        command = Command('test', {'project{0}/*'.format(i): str(i) for i in range(250)})
+
+        assert command.items(filter=['project7/a/', 'project249/b/']) == [
+            ('project7/a/', '7'),
+            ('project249/b/', '249'),
+        ]
+
+    def test_commands_with_different_mappings_are_not_equal(self):
+        assert Command('test', {'a': 'npm test'}) != Command('test', {'a': 'make test'})
+
+    def test_pickles_without_the_resolved_commands(self, command):
+        import pickle
+
+        command.items(filter=['ruby/mobile/'])
+        unpickled = pickle.loads(pickle.dumps(command))
+
+        assert unpickled == command
+        assert unpickled._resolved == {}
+        assert unpickled.items(filter=['ruby/mobile/']) == [('ruby/mobile/', 'bundle exec rspec')]
+
+    def test_commands_can_say_what_resources_they_need(self):
+        command = Command('build', {
+            'default': 'make',
+            'js/*/': {'run': 'webpack', 'cpu': 2, 'memory': '3G'},
+        })
+
+        assert command.items(filter=['js/app/', 'go/']) == [('js/app/', 'webpack'), ('go/', 'make')]
+        assert command.resources('js/app/') == Resources(cpu=2, memory=3 * 1024 ** 2)
+        assert command.resources('go/') == Resources(cpu=1, memory=None)
+
+    def test_command_dicts_need_something_to_run(self):
+        with pytest.raises(ValueError) as exc:
+            Command('build', {'js/': {'cpu': 2}})
+
+        assert str(exc.value) == 'Command build for "js/" has nothing to run'
@@ -0,0 +1,225 @@
+from __future__ import unicode_literals
+
+import os
+import signal
+import socket
+import stat
+import subprocess
+import threading
+import sys
+import time
+
+import pytest
+
+import radish
+from radish.daemon import Daemon, forward, socket_path
+from radish.path import Path
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+RADISHFILE = '''
+paths:
+  - app/
+  - lib/*/
+commands:
+  test:
+    default: echo "{0} $GREETING"
+'''
+
+
+@pytest.fixture
+def repository(tmpdir):
+    tmpdir.join('Radishfile').write(RADISHFILE.format('testing'))
+    tmpdir.join('app').ensure(dir=True)
+    tmpdir.join('lib', 'one').ensure(dir=True)
+
+    return tmpdir
+
+
+def _environment(**variables):
+    environment = dict(os.environ, **variables)
+    environment['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(radish.__file__)))
+
+    return environment
+
+
+def _radish(repository, *args, **variables):
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'import sys, radish.cli; radish.cli.main(sys.argv[1:])'] +
+        list(args),
+        cwd=str(repository),
+        env=_environment(**variables),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stdout, stderr = process.communicate()
+
+    return process.returncode, stdout.decode('utf-8'), stderr.decode('utf-8')
+
+
+@pytest.fixture
+def daemon(repository):
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'import radish.cli; radish.cli.main(["daemon"])'],
+        cwd=str(repository),
+        env=_environment(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    path = socket_path(str(repository.join('.radish')))
+    deadline = time.time() + 10
+    while not os.path.exists(path) and process.poll() is None and time.time() < deadline:
+        time.sleep(0.01)
+
+    yield process
+
+    if process.returncode is None:
+        process.terminate()
+        process.communicate()
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Needs Unix sockets')
+class TestDaemon(object):
+    def test_runs_commands_for_clients(self, repository, daemon):
+        code, stdout, stderr = _radish(repository, 'command', 'test', GREETING='hello')
+
+        assert code == 0
+        assert 'testing hello\n' in stdout
+        assert 'app/: Success' in stdout
+        assert 'lib/one/: Success' in stdout
+
+    def test_reports_how_commands_exited(self, repository, daemon):
+        code, stdout, stderr = _radish(repository, 'command', 'missing')
+
+        assert code == 1
+        assert 'No command "missing" registered.' in stderr
+
+    def test_reloads_when_the_radishfile_changes(self, repository, daemon):
+        _radish(repository, 'command', 'test')
+        repository.join('Radishfile').write(RADISHFILE.format('checking'))
+        os.utime(str(repository.join('Radishfile')), (time.time() + 1, time.time() + 1))
+
+        code, stdout, stderr = _radish(repository, 'command', 'test')
+
+        assert code == 0
+        assert 'checking' in stdout
+
+    def test_stops_and_removes_its_socket_when_terminated(self, repository, daemon):
+        daemon.send_signal(signal.SIGTERM)
+        output, _ = daemon.communicate()
+
+        assert daemon.returncode == 0
+        assert 'Listening on .radish/daemon.sock' in output.decode('utf-8')
+        assert not repository.join('.radish', 'daemon.sock').check()
+
+    def test_only_its_user_can_connect(self, repository, daemon):
+        mode = os.stat(str(repository.join('.radish', 'daemon.sock'))).st_mode
+
+        assert stat.S_IMODE(mode) == 0o600
+
+    def test_refuses_to_start_when_a_daemon_is_running(self, repository, daemon):
+        code, stdout, stderr = _radish(repository, 'daemon')
+
+        assert code == 1
+        assert 'A radish daemon is already listening' in stderr
+
+    def test_runs_without_the_daemon_when_told_to(self, repository, daemon):
+        daemon.terminate()
+        daemon.communicate()
+
+        code, stdout, stderr = _radish(repository, 'command', 'test', RADISH_NO_DAEMON='1')
+
+        assert code == 0
+        assert 'testing' in stdout
+
+
+class TestForward(object):
+    def test_nothing_is_forwarded_without_a_daemon(self, tmpdir):
+        assert forward(str(tmpdir.join('daemon.sock')), ['command', 'test']) is None
+
+    def test_nothing_is_forwarded_to_a_socket_left_behind(self, tmpdir):
+        path = str(tmpdir.join('daemon.sock'))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.close()
+
+        assert forward(path, ['command', 'test']) is None
+
+    def test_main_exits_with_what_the_daemon_exited_with(self, repository, monkeypatch):
+        monkeypatch.chdir(repository)
+        monkeypatch.delenv('RADISH_NO_DAEMON', raising=False)
+
+        with mock.patch('radish.daemon.forward', return_value=10) as forwarded:
+            with pytest.raises(SystemExit) as exc:
+                radish.cli.main(['command', 'test', '--jobs', '2'])
+
+        assert exc.value.code == 10
+        forwarded.assert_called_once_with(
+            str(repository.join('.radish', 'daemon.sock')), ['command', 'test', '--jobs', '2']
+        )
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_PEERCRED'), reason='Needs the peer credentials')
+class TestPeers(object):
+    def test_requests_of_other_users_are_refused(self, repository, monkeypatch):
+        monkeypatch.chdir(repository)
+        outputter = mock.Mock()
+        server = Daemon(
+            str(repository.join('Radishfile')), str(repository.join('.radish')), outputter
+        )
+        path = socket_path(str(repository.join('.radish')))
+
+        with mock.patch('radish.daemon._peer_uid', return_value=os.getuid() + 1):
+            thread = threading.Thread(target=server.serve, kwargs={'requests': 1})
+            thread.start()
+            deadline = time.time() + 10
+            # Listening once it says so
+            while not outputter.info.write.called and time.time() < deadline:
+                time.sleep(0.01)
+
+            code = forward(path, ['command', 'test'])
+            thread.join(10)
+
+        assert code == 'The radish daemon only runs commands of the user running it'
+        assert 'Refused a request from user' in outputter.error.write.call_args[0][0]
+
+
+class TestReload(object):
+    @pytest.fixture
+    def loaded(self, repository, monkeypatch):
+        monkeypatch.chdir(repository)
+        daemon = Daemon(str(repository.join('Radishfile')), str(repository.join('.radish')))
+        daemon.load()
+
+        return daemon
+
+    def test_loads_the_config_with_and_without_expanding_globs(self, loaded):
+        assert loaded.configs[True]['paths'] == [Path('app/'), Path('lib/one/')]
+        assert loaded.configs[False]['paths'] == [Path('app/'), Path('lib/*/')]
+
+    def test_is_fresh_until_something_changes(self, loaded):
+        assert not loaded.stale()
+
+    def test_is_stale_when_the_radishfile_changes(self, loaded, repository):
+        os.utime(str(repository.join('Radishfile')), (time.time() + 1, time.time() + 1))
+
+        assert loaded.stale()
+
+    def test_is_stale_when_a_globbed_directory_changes(self, loaded, repository):
+        os.utime(str(repository.join('lib')), (time.time() + 1, time.time() + 1))
+
+        assert loaded.stale()
+
+    def test_a_broken_radishfile_keeps_the_loaded_config(self, loaded, repository):
+        loaded.outputter = mock.Mock()
+        repository.join('Radishfile').write('paths: [')
+        os.utime(str(repository.join('Radishfile')), (time.time() + 1, time.time() + 1))
+
+        loaded._reload()
+
+        assert loaded.configs[True]['paths'] == [Path('app/'), Path('lib/one/')]
+        assert 'Failed to reload Radishfile' in loaded.outputter.error.write.call_args[0][0]
+        assert not loaded.stale()
@@ -1,10 +1,20 @@
+# coding=utf-8
 from __future__ import unicode_literals
 
 import os
+import subprocess
+from io import BytesIO
 
 import pytest
 
-from radish.differs import DifferBase, Git
+from radish import differs
+from radish.differs import DifferBase, Git, GitTree, LibGit2
+from radish.path import Path
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 
 class TestDifferBase(object):
@@ -13,6 +23,18 @@ class TestDifferBase(object):
             base_path='tests/support/dummy/'
         ).base_path == os.path.join(os.getcwd(), 'tests/', 'support/', 'dummy')
 
+    def test_globs_are_expanded_down_to_the_deepest_pattern(self):
+        depths = []
+
+        def entries(directories, depth):
+            depths.append((directories, depth))
+            return [('lib/one', True), ('lib/one/tests', True)]
+
+        assert DifferBase()._expand_globs_in_tree(['lib/*/', 'lib/*/tests/'], 'tree', entries) == {
+            'lib/*/': ['lib/one/'], 'lib/*/tests/': ['lib/one/tests/']
+        }
+        assert depths == [(['lib'], 3)]
+
 
 class TestGit(object):
     FIRST_GREEN_COMMIT = '10aac02e05'
@@ -33,6 +55,29 @@ class TestGit(object):
             'js/.gitignore'
         ]
 
+    def test_iter_changed_files_between_yields_the_changed_files(self):
+        assert list(self._differ().iter_changed_files_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY
+        )) == self._differ().changed_files_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY
+        )
+
+    def test_stops_git_when_iteration_is_closed_early(self):
+        changed_files = self._differ().iter_changed_files_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY
+        )
+
+        with mock.patch.object(Git, '_terminate', autospec=True,
+                               side_effect=Git._terminate) as terminate:
+            assert next(changed_files) == 'extensions/roles_and_permissions/tests/test.py'
+            changed_files.close()
+
+        process = terminate.call_args[0][1]
+        assert process.returncode is not None, 'Expected git to be stopped and waited on'
+
     def test_no_changes_returns_empty_list(self):
         assert list(self._differ().changed_files_between(self.FIRST_GREEN_COMMIT,
                                                          self.FIRST_GREEN_COMMIT)) == []
@@ -43,3 +88,287 @@ class TestGit(object):
             self._differ().changed_files_between('INVALID_REF')
 
         assert exc.value.original
+
+    class TestStreamOfFiles(object):
+        def test_splits_nul_separated_filenames(self):
+            stream = BytesIO(b'a.py\0js/b.js\0')
+
+            assert list(Git()._stream_of_files(stream)) == ['a.py', 'js/b.js']
+
+        def test_filenames_split_across_chunks_are_joined(self):
+            stream = BytesIO(b'extensions/rules/a.py\0js/b.js\0')
+
+            assert list(Git()._stream_of_files(stream, chunk_size=3)) == [
+                'extensions/rules/a.py',
+                'js/b.js'
+            ]
+
+        def test_decodes_filenames_as_utf8(self):
+            stream = BytesIO('björn.py\0'.encode('utf-8'))
+
+            assert list(Git()._stream_of_files(stream, chunk_size=4)) == ['björn.py']
+
+        def test_empty_output_yields_nothing(self):
+            assert list(Git()._stream_of_files(BytesIO(b''))) == []
+
+    def test_changed_paths_between_matches_changed_files_against_paths(self):
+        assert self._differ().changed_paths_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY,
+            [Path('extensions/*/'), Path('js/mobile/')]
+        ) == {'extensions/roles_and_permissions/', 'extensions/rules/'}
+
+
+class TestGitTree(object):
+    FIRST_GREEN_COMMIT = '10aac02e05'
+    FIRST_GREEN_COMMIT_PY = '39e0889d06'
+
+    def _differ(self):
+        return GitTree(base_path='tests/support/dummy/')
+
+    def test_returns_paths_whose_trees_changed(self):
+        assert self._differ().changed_paths_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY,
+            [Path('extensions/rules/'), Path('js/mobile/')]
+        ) == {'extensions/rules/'}
+
+    def test_expands_globs_against_the_trees(self):
+        assert self._differ().changed_paths_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY,
+            [Path('extensions/*/')]
+        ) == {'extensions/roles_and_permissions/', 'extensions/rules/'}
+
+    def test_paths_missing_in_both_commits_are_unchanged(self):
+        assert self._differ().changed_paths_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY,
+            [Path('wololooo/'), Path('wololooo/*/')]
+        ) == set()
+
+    def test_reads_entries_of_raw_tree_objects(self):
+        contents = (b'40000 extensions\0' + b'\x01' * 20 +
+                    b'100644 README.md\0' + b'\xab' * 20)
+
+        assert list(GitTree()._tree_entries(contents, 20)) == [
+            (b'40000', 'extensions', '01' * 20),
+            (b'100644', 'README.md', 'ab' * 20),
+        ]
+
+
+@pytest.mark.skipif(not LibGit2.available(), reason='pygit2 is not installed')
+class TestLibGit2(object):
+    FIRST_GREEN_COMMIT = '10aac02e05'
+    FIRST_GREEN_COMMIT_PY = '39e0889d06'
+
+    def _differ(self):
+        return LibGit2(base_path='tests/support/dummy/')
+
+    def test_returns_the_same_changed_files_as_git(self):
+        assert self._differ().changed_files_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY
+        ) == Git(base_path='tests/support/dummy/').changed_files_between(
+            self.FIRST_GREEN_COMMIT,
+            self.FIRST_GREEN_COMMIT_PY
+        )
+
+    def test_no_changes_returns_empty_list(self):
+        assert self._differ().changed_files_between(self.FIRST_GREEN_COMMIT,
+                                                    self.FIRST_GREEN_COMMIT) == []
+
+    def test_resolves_commits_to_their_full_sha(self):
+        assert self._differ().resolve_commit(self.FIRST_GREEN_COMMIT).startswith(
+            self.FIRST_GREEN_COMMIT
+        )
+
+    def test_invalid_commit_ref_raises_exception(self):
+        with pytest.raises(LibGit2.DiffError) as exc:
+            self._differ().changed_files_between('INVALID_REF')
+
+        assert exc.value.original
+
+
+@pytest.fixture
+def repository(tmpdir):
+    def git(*args):
+        subprocess.check_call(
+            ['git', '-c', 'user.name=radish', '-c', 'user.email=radish@example.com'] + list(args),
+            cwd=str(tmpdir),
+            stdout=subprocess.PIPE
+        )
+
+    git('init', '-q')
+    tmpdir.join('app', 'main.py').write('print("hello")\n', ensure=True)
+    tmpdir.join('lib', 'util.py').write('\n', ensure=True)
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+
+    return tmpdir
+
+
+class BaseTestWorkingCopy(object):
+    def _differ(self, base_path):
+        raise NotImplementedError
+
+    def test_tree_ids_are_the_same_for_the_same_contents(self, repository):
+        differ = self._differ(str(repository))
+        paths = [Path('app/'), Path('lib/')]
+        before = differ.tree_ids(paths)
+
+        repository.join('lib', 'util.py').write('# changed\n')
+        subprocess.check_call(['git', '-c', 'user.name=radish', '-c', 'user.email=r@example.com',
+                               'commit', '-qam', 'Change lib'], cwd=str(repository))
+
+        after = differ.tree_ids(paths)
+        assert before['app/'] == after['app/']
+        assert before['lib/'] != after['lib/']
+
+    def test_tree_ids_leave_out_missing_paths(self, repository):
+        assert self._differ(str(repository)).tree_ids([Path('wololooo/')]) == {}
+
+    def test_dirty_paths_have_uncommitted_or_untracked_files(self, repository):
+        repository.join('lib', 'new.py').write('\n')
+
+        assert self._differ(str(repository)).dirty_paths([Path('app/'), Path('lib/')]) == {'lib/'}
+
+    def test_clean_working_copy_has_no_dirty_paths(self, repository):
+        assert self._differ(str(repository)).dirty_paths([Path('app/'), Path('lib/')]) == set()
+
+    def test_dirty_paths_have_staged_unstaged_or_renamed_files(self, repository):
+        repository.join('docs').ensure(dir=True)
+        subprocess.check_call(['git', 'mv', 'lib/util.py', 'docs/util.py'], cwd=str(repository))
+
+        assert self._differ(str(repository)).dirty_paths([Path('app/'), Path('lib/')]) == {'lib/'}
+
+    def test_expand_globs_matches_the_trees_of_the_commit(self, repository):
+        repository.join('new', 'module.py').write('\n', ensure=True)
+
+        expanded = self._differ(str(repository)).expand_globs(['*/', 'app/*.py'], 'HEAD')
+
+        assert expanded == {'*/': ['app/', 'lib/'], 'app/*.py': ['app/main.py']}
+
+    def test_expand_globs_matches_nested_patterns(self, repository):
+        repository.join('lib', 'one', 'tests', 'test_one.py').write('\n', ensure=True)
+        repository.join('lib', 'two', 'deep', 'er', 'module.py').write('\n', ensure=True)
+        subprocess.check_call(['git', 'add', '.'], cwd=str(repository))
+        subprocess.check_call(['git', '-c', 'user.name=radish', '-c', 'user.email=r@example.com',
+                               'commit', '-qm', 'Nest'], cwd=str(repository))
+
+        expanded = self._differ(str(repository)).expand_globs(['lib/*/tests/', 'lib/*/'], 'HEAD')
+
+        assert expanded == {'lib/*/tests/': ['lib/one/tests/'], 'lib/*/': ['lib/one/', 'lib/two/']}
+
+    def test_expand_globs_are_reused_for_the_same_tree_by_later_runs(self, repository):
+        first = self._differ(str(repository)).expand_globs(['*/'], 'HEAD')
+
+        with mock.patch('radish.differs.match_globs', side_effect=AssertionError('Expanded')):
+            assert self._differ(str(repository)).expand_globs(['*/'], 'HEAD') == first
+        assert repository.join('.git', 'radish', 'globs').listdir()
+
+
+class TestGitWorkingCopy(BaseTestWorkingCopy):
+    def _differ(self, base_path):
+        return Git(base_path=base_path)
+
+    def test_uncommitted_files_are_staged_unstaged_and_untracked(self, repository):
+        repository.join('app', 'main.py').write('print("changed")\n')
+        repository.join('app', 'new file.py').write('\n')
+        subprocess.check_call(['git', 'mv', 'lib/util.py', 'lib/helpers.py'], cwd=str(repository))
+
+        assert sorted(self._differ(str(repository)).iter_uncommitted_files()) == [
+            'app/main.py', 'app/new file.py', 'lib/helpers.py', 'lib/util.py'
+        ]
+
+    def test_clean_working_copy_has_no_uncommitted_files(self, repository):
+        assert list(self._differ(str(repository)).iter_uncommitted_files()) == []
+
+    def test_resolves_commits_to_their_full_sha(self, repository):
+        sha = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=str(repository))
+
+        assert self._differ(str(repository)).resolve_commit('HEAD') == sha.decode('ascii').strip()
+
+    def test_unknown_commits_raise_diff_errors(self, repository):
+        with pytest.raises(Git.DiffError) as exc:
+            self._differ(str(repository)).resolve_commit('wololooo')
+
+        assert exc.value.original
+
+
+class TestGitTreeCommits(object):
+    def _commit(self, repository, change):
+        change()
+        subprocess.check_call(['git', 'add', '-A'], cwd=str(repository))
+        subprocess.check_call(['git', '-c', 'user.name=radish', '-c', 'user.email=r@example.com',
+                               'commit', '-qm', 'Change'], cwd=str(repository))
+
+    def _changed(self, repository, paths):
+        return GitTree(base_path=str(repository)).changed_paths_between(
+            'HEAD~1', 'HEAD', [Path(path) for path in paths]
+        )
+
+    def test_paths_without_a_trailing_slash_are_prefixes(self, repository):
+        self._commit(repository, lambda: repository.join('libraries', 'a.py').write(
+            '\n', ensure=True
+        ))
+
+        assert self._changed(repository, ['lib', 'lib/', 'app']) == {'lib'}
+
+    def test_prefixes_match_files(self, repository):
+        self._commit(repository, lambda: repository.join('app', 'main.py').write('# changed\n'))
+
+        assert self._changed(repository, ['app/main', 'app/other', 'lib/']) == {'app/main'}
+
+    def test_agrees_with_git_on_prefixes(self, repository):
+        self._commit(repository, lambda: repository.join('library.txt').write('\n'))
+        paths = [Path('lib'), Path('lib/'), Path('app/'), Path('README')]
+
+        assert GitTree(base_path=str(repository)).changed_paths_between(
+            'HEAD~1', 'HEAD', paths
+        ) == Git(base_path=str(repository)).changed_paths_between('HEAD~1', 'HEAD', paths)
+
+
+@pytest.mark.skipif(not LibGit2.available(), reason='pygit2 is not installed')
+class TestLibGit2WorkingCopy(BaseTestWorkingCopy):
+    def _differ(self, base_path):
+        return LibGit2(base_path=base_path)
+
+
+class TestMatchGlobs(object):
+    ENTRIES = [('app', True), ('app/main.py', False), ('.hidden', True), ('lib', True),
+               ('lib/util.py', False), ('setup.py', False)]
+
+    def test_trailing_slash_only_matches_trees(self):
+        assert differs.match_globs(['*/'], self.ENTRIES) == {'*/': ['app/', 'lib/']}
+
+    def test_star_does_not_match_across_slashes(self):
+        assert differs.match_globs(['*.py'], self.ENTRIES) == {'*.py': ['setup.py']}
+
+    def test_matches_every_pattern(self):
+        assert differs.match_globs(['*/*.py', 'l*/'], self.ENTRIES) == {
+            '*/*.py': ['app/main.py', 'lib/util.py'],
+            'l*/': ['lib/'],
+        }
+
+    def test_hidden_entries_only_match_patterns_starting_with_a_dot(self):
+        assert differs.match_globs(['.*/'], self.ENTRIES) == {'.*/': ['.hidden/']}
+
+
+class TestCreate(object):
+    def test_creates_the_named_differ(self):
+        assert isinstance(differs.create('git'), Git)
+
+    def test_sets_the_base_path(self):
+        assert differs.create('git', base_path='/tmp').base_path == '/tmp'
+
+    def test_falls_back_to_git_when_the_differ_isnt_available(self, monkeypatch):
+        monkeypatch.setattr(LibGit2, 'available', classmethod(lambda cls: False))
+
+        assert isinstance(differs.create('libgit2'), Git)
+
+    def test_raises_value_error_for_unknown_differs(self):
+        with pytest.raises(ValueError) as exc:
+            differs.create('svn')
+
+        assert str(exc.value) == 'No differ "svn", available differs: git, git-tree, libgit2'
@@ -2,16 +2,19 @@
 from __future__ import unicode_literals
 
 import os
+import sys
+import threading
+import time
 
-from radish.executor import ExecutionResult, NullExecutor, Executor, ExecutionResults
+from radish.executor import ExecutionResult, NullExecutor, Executor, ExecutionResults, OutputPump
 from radish.outputter import Outputter
 from radish.path import Path
 from radish.utils import TimeTaken
 
 try:
-    from unittest.mock import Mock, ANY
+    from unittest.mock import Mock, ANY, patch
 except ImportError:
-    from mock import Mock, ANY
+    from mock import Mock, ANY, patch
 
 
 class BaseTestExecutor(object):
@@ -102,6 +105,194 @@ class TestExecutor(BaseTestExecutor):
 
         outputter.info.write.assert_called_once_with('Björn\n')
 
+    def test_skips_projects_that_are_not_in_the_checkout(self, tmpdir):
+        outputter = Mock()
+
+        result = Executor(outputter=outputter).execute(Path(str(tmpdir.join('gone'))), 'true')
+
+        assert result.skipped
+        assert "isn't in the checkout" in outputter.error.write.call_args[0][0]
+
+    def test_records_the_cpu_time_and_peak_memory_of_the_command(self):
+        result = Executor().execute(Path('/tmp'), 'true')
+
+        assert result.cpu_time >= 0
+        assert result.max_rss > 0
+
+    def test_exit_code_is_negative_when_killed_by_a_signal(self):
+        result = Executor().execute(Path('/tmp'), 'kill -9 $$')
+
+        assert result.exit_code == -9
+
+    def test_run_outputs_through_the_passed_in_outputter(self):
+        outputter = Mock()
+        executor = Executor(outputter=Mock())
+
+        executor.execute(Path('/tmp'), 'echo hello', outputter)
+
+        outputter.info.write.assert_called_once_with('hello\n')
+        assert not executor.outputter.info.write.called
+
+    def test_writes_output_as_it_arrives(self):
+        outputter = Mock()
+        executor = Executor(outputter=outputter)
+        executor.CHUNK_SIZE = 2
+
+        executor.execute(Path('/tmp'), 'echo hello')
+
+        assert outputter.info.write.call_count > 1
+        assert ''.join(c[0][0] for c in outputter.info.write.call_args_list) == 'hello\n'
+
+    def test_characters_split_across_reads_are_decoded_whole(self):
+        outputter = Mock()
+        executor = Executor(outputter=outputter)
+        executor.CHUNK_SIZE = 1
+
+        executor.execute(Path('/tmp'), 'echo Björn')
+
+        assert 'ö' in [c[0][0] for c in outputter.info.write.call_args_list]
+
+    def test_reads_stdout_and_stderr_without_blocking_on_either(self):
+        outputter = Mock()
+        executor = Executor(outputter=outputter)
+
+        result = executor.execute(
+            Path('/tmp'),
+            '{0} -c "import sys; sys.stderr.write(\'e\' * 200000); print(\'done\')"'.format(
+                sys.executable
+            )
+        )
+
+        assert result.success
+        assert ''.join(c[0][0] for c in outputter.error.write.call_args_list) == 'e' * 200000
+        assert ''.join(c[0][0] for c in outputter.info.write.call_args_list) == 'done\n'
+
+    def _execute_in_background(self, executor, command, path=Path('/tmp')):
+        results = []
+        thread = threading.Thread(target=lambda: results.append(executor.execute(path, command)))
+        thread.start()
+
+        while not executor._running:
+            time.sleep(0.01)
+
+        return thread, results
+
+    def test_commands_stay_in_the_session_of_radish_by_default(self):
+        outputter = Mock()
+
+        Executor(outputter=outputter).execute(
+            Path('/tmp'), '{0} -c "import os; print(os.getsid(0))"'.format(sys.executable)
+        )
+
+        outputter.info.write.assert_called_once_with('{0}\n'.format(os.getsid(0)))
+
+    def test_finished_commands_are_no_longer_signalled(self):
+        executor = Executor()
+
+        with patch('os.kill') as kill:
+            executor.execute(Path('/tmp'), 'true')
+            executor.terminate(grace_period=0)
+
+        assert executor._running == {}
+        assert not kill.called
+
+    def test_terminate_stops_the_running_commands(self):
+        executor = Executor()
+        thread, results = self._execute_in_background(executor, 'exec sleep 10')
+
+        executor.terminate()
+        thread.join()
+
+        assert results[0].exit_code == -15
+
+    def test_terminate_stops_the_running_commands_and_their_children(self):
+        executor = Executor(process_groups=True)
+        thread, results = self._execute_in_background(executor, 'sleep 10 & sleep 10; wait')
+
+        started = time.time()
+        executor.terminate()
+        thread.join()
+
+        assert results[0].exit_code == -15
+        assert time.time() - started < 5
+
+    def test_terminate_kills_commands_still_running_after_the_grace_period(self, tmpdir):
+        executor = Executor(process_groups=True)
+        ready = tmpdir.join('ready')
+        thread, results = self._execute_in_background(
+            executor, 'trap "" TERM; touch {0}; sleep 10'.format(ready)
+        )
+        while not ready.check():  # SIGTERM isn't ignored until the trap is set
+            time.sleep(0.01)
+
+        executor.terminate(grace_period=0.1)
+        thread.join()
+
+        assert results[0].exit_code == -9
+
+    def test_terminate_only_stops_the_commands_for_the_given_paths(self):
+        executor = Executor()
+        stopped, stopped_results = self._execute_in_background(executor, 'exec sleep 10')
+        kept, kept_results = self._execute_in_background(executor, 'exec sleep 0.5', Path('/'))
+        while len(executor._running) < 2:
+            time.sleep(0.01)
+
+        executor.terminate(paths=[Path('/tmp')])
+        stopped.join()
+        kept.join()
+
+        assert stopped_results[0].exit_code == -15
+        assert kept_results[0].exit_code == 0
+
+
+class TestOutputPump(object):
+    def test_holds_back_partial_lines(self):
+        stream = Mock()
+        pump = OutputPump(stream, chunk_size=1024)
+
+        pump.feed(b'first line\nsecond')
+
+        stream.write.assert_called_once_with('first line\n')
+
+    def test_writes_a_held_back_line_once_it_ends(self):
+        stream = Mock()
+        pump = OutputPump(stream, chunk_size=1024)
+
+        pump.feed(b'sec')
+        pump.feed(b'ond')
+        assert not stream.write.called
+        pump.feed(b' line\nthird')
+
+        stream.write.assert_called_once_with('second line\n')
+
+    def test_writes_partial_lines_once_chunk_size_is_waiting(self):
+        stream = Mock()
+        pump = OutputPump(stream, chunk_size=8)
+
+        pump.feed(b'1234')
+        assert not stream.write.called
+        pump.feed(b'5678')
+
+        stream.write.assert_called_once_with('12345678')
+
+    def test_writes_the_rest_when_closed(self):
+        stream = Mock()
+        pump = OutputPump(stream, chunk_size=1024)
+
+        pump.feed(b'no newline')
+        pump.close()
+
+        stream.write.assert_called_once_with('no newline')
+
+    def test_writes_characters_cut_short_when_closed(self):
+        stream = Mock()
+        pump = OutputPump(stream, chunk_size=1024)
+
+        pump.feed('é'.encode('utf-8')[0:1])
+        pump.close()
+
+        stream.write.assert_called_once_with('\ufffd')
+
 
 class TestExecutionResults(object):
     def test_no_results_is_negative(self):
@@ -171,6 +362,13 @@ class TestExecutionResults(object):
 
         assert results == result._results
 
+    def test_cancelled_returns_the_cancelled_results(self):
+        result = ExecutionResults()
+        result.add(ExecutionResult(1, 0.1, '/m000'))
+        result.add(ExecutionResult.cancel('/meep'))
+
+        assert result.cancelled == [ExecutionResult.cancel('/meep')]
+
 
 class TestExecutionResult(object):
     def test_exit_code_0_is_success(self):
@@ -200,3 +398,17 @@ class TestExecutionResult(object):
 
     def test_none_factory_method(self):
         assert ExecutionResult.none() == ExecutionResult(0, 0, None)
+
+    def test_skip_factory_method(self):
+        result = ExecutionResult.skip('/m000')
+
+        assert result.skipped
+        assert not result.success
+        assert not result.cancelled
+
+    def test_cancel_factory_method(self):
+        result = ExecutionResult.cancel('/m000')
+
+        assert result.cancelled
+        assert not result.success
+        assert not result.skipped
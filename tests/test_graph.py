@@ -0,0 +1,88 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from radish.graph import DependencyGraph, DependencyQueue
+from radish.path import Path
+
+PATHS = [Path('libs/core/'), Path('libs/ui/'), Path('app/'), Path('docs/')]
+
+
+@pytest.fixture
+def graph():
+    return DependencyGraph(PATHS, {
+        'libs/ui/': ['libs/core/'],
+        'app/': ['libs/ui/', 'libs/core/'],
+    })
+
+
+class TestDependencyGraph(object):
+    def test_knows_direct_dependencies_and_dependents(self, graph):
+        assert graph.dependencies('app/') == {'libs/ui/', 'libs/core/'}
+        assert graph.dependents('libs/core/') == {'libs/ui/', 'app/'}
+        assert graph.dependencies('docs/') == set()
+
+    def test_with_dependents_follows_dependencies_through_other_paths(self):
+        graph = DependencyGraph(PATHS, {'libs/ui/': 'libs/core/', 'app/': 'libs/ui/'})
+
+        assert graph.with_dependents([Path('libs/core/')]) == {'libs/core/', 'libs/ui/', 'app/'}
+        assert graph.with_dependents([Path('docs/')]) == {'docs/'}
+
+    def test_with_dependencies_follows_dependencies_through_other_paths(self):
+        graph = DependencyGraph(PATHS, {'libs/ui/': 'libs/core/', 'app/': 'libs/ui/'})
+
+        assert graph.with_dependencies([Path('app/')]) == {'app/', 'libs/ui/', 'libs/core/'}
+        assert graph.with_dependencies([Path('libs/core/')]) == {'libs/core/'}
+
+    def test_globs_match_configured_paths(self):
+        graph = DependencyGraph(PATHS, {'app/': 'libs/*/'})
+
+        assert graph.dependencies('app/') == {'libs/core/', 'libs/ui/'}
+
+    def test_is_false_without_dependencies(self):
+        assert not DependencyGraph(PATHS)
+
+    def test_unknown_paths_are_an_error(self):
+        with pytest.raises(ValueError) as exc:
+            DependencyGraph(PATHS, {'app/': ['lib/core/']})
+
+        assert 'lib/core/' in str(exc.value)
+
+    def test_cycles_are_an_error(self):
+        with pytest.raises(ValueError) as exc:
+            DependencyGraph(PATHS, {
+                'libs/core/': 'app/',
+                'libs/ui/': 'libs/core/',
+                'app/': 'libs/ui/',
+            })
+
+        assert str(exc.value) == 'Dependency cycle between: app/, libs/core/, libs/ui/'
+
+
+class TestDependencyQueue(object):
+    ITEMS = [(Path('app/'), 'make'), (Path('docs/'), 'make'),
+             (Path('libs/ui/'), 'make'), (Path('libs/core/'), 'make')]
+
+    def test_hands_out_items_once_their_dependencies_are_done(self, graph):
+        queue = DependencyQueue(graph, self.ITEMS)
+
+        assert queue.ready() == [('docs/', 'make'), ('libs/core/', 'make')]
+        assert queue.ready() == []
+        assert queue.done(Path('libs/core/')) == []
+        assert queue.ready() == [('libs/ui/', 'make')]
+        queue.done(Path('libs/ui/'))
+        assert queue.ready() == [('app/', 'make')]
+
+    def test_dependencies_that_are_not_queued_are_not_waited_for(self, graph):
+        queue = DependencyQueue(graph, [(Path('app/'), 'make'), (Path('libs/ui/'), 'make')])
+
+        assert queue.ready() == [('libs/ui/', 'make')]
+        queue.done(Path('libs/ui/'))
+        assert queue.ready() == [('app/', 'make')]
+
+    def test_skips_everything_depending_on_a_failure(self, graph):
+        queue = DependencyQueue(graph, self.ITEMS)
+        queue.ready()
+
+        assert queue.done(Path('libs/core/'), success=False) == ['app/', 'libs/ui/']
+        assert queue.ready() == []
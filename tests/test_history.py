@@ -0,0 +1,114 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from radish.executor import ExecutionResult
+from radish.history import History, Record
+from radish.path import Path
+from radish.utils import TimeTaken
+
+
+def history(tmpdir):
+    return History(str(tmpdir.join('.radish', 'history.sqlite')))
+
+
+class TestHistory(object):
+    def test_no_records_in_a_new_history(self, tmpdir):
+        assert history(tmpdir).records() == []
+
+    def test_records_every_result(self, tmpdir):
+        store = history(tmpdir)
+
+        store.record('test', [
+            ExecutionResult(0, TimeTaken(1.5), Path('js/'), cpu_time=1.2, max_rss=2048),
+            ExecutionResult(1, 0.5, Path('css/')),
+            ExecutionResult.from_cache(Path('html/')),
+            ExecutionResult.none(),
+        ], commit='abc123')
+
+        records = store.records()
+        assert [r[1:] for r in records] == [
+            ('test', 'css/', 'abc123', 1, 0.5, None, None),
+            ('test', 'js/', 'abc123', 0, 1.5, 1.2, 2048),
+        ]
+        assert isinstance(records[0], Record)
+
+    def test_records_are_kept_between_instances(self, tmpdir):
+        history(tmpdir).record('test', [ExecutionResult(0, 1, Path('js/'))])
+
+        assert len(history(tmpdir).records()) == 1
+
+    def test_filters_records_by_command_and_path(self, tmpdir):
+        store = history(tmpdir)
+        store.record('test', [ExecutionResult(0, 1, Path('js/')),
+                              ExecutionResult(0, 2, Path('css/'))])
+        store.record('lint', [ExecutionResult(0, 3, Path('js/'))])
+
+        assert [r.wall_time for r in store.records(command='test', path=Path('js/'))] == [1]
+        assert len(store.records(limit=2)) == 2
+
+    def test_run_times_averages_the_last_successful_runs(self, tmpdir):
+        store = history(tmpdir)
+        for run_time in [10, 1, 3]:
+            store.record('test', [ExecutionResult(0, run_time, Path('js/'))])
+        store.record('test', [ExecutionResult(1, 100, Path('js/'))])
+
+        assert store.run_times('test', last=2) == {'js/': 2}
+        assert store.run_times('lint') == {}
+
+    def test_peak_rss_is_the_highest_of_the_last_runs(self, tmpdir):
+        store = history(tmpdir)
+        for max_rss in [4096, 1024, 2048]:
+            store.record('test', [ExecutionResult(1, 1, Path('js/'), max_rss=max_rss)])
+        store.record('test', [ExecutionResult(0, 1, Path('css/'))])
+
+        assert store.peak_rss('test', last=2) == {'js/': 2048}
+
+    def test_drops_all_but_the_most_recent_runs_of_each_path(self, tmpdir):
+        store = History(str(tmpdir.join('history.sqlite')), keep=2)
+        for run_time in [1, 2, 3]:
+            store.record('test', [ExecutionResult(0, run_time, Path('js/')),
+                                  ExecutionResult(0, run_time, Path('css/'))])
+        store.record('lint', [ExecutionResult(0, 4, Path('js/'))])
+
+        assert [r.wall_time for r in store.records(command='test', path='js/')] == [3, 2]
+        assert [r.wall_time for r in store.records(command='test', path='css/')] == [3, 2]
+        assert [r.wall_time for r in store.records(command='lint')] == [4]
+
+    def test_keeps_every_run_without_a_limit(self, tmpdir):
+        store = History(str(tmpdir.join('history.sqlite')), keep=None)
+        for run_time in range(History.KEEP + 1):
+            store.record('test', [ExecutionResult(0, run_time, Path('js/'))])
+
+        assert len(store.records()) == History.KEEP + 1
+
+    def test_recording_leaves_the_database_alone(self, tmpdir):
+        store = history(tmpdir)
+        store.record('test', [ExecutionResult(0, 1, Path('js/'))])
+
+        assert store.exists()
+        assert not tmpdir.join('.radish', 'history.sqlite').check()
+
+    def test_skips_results_cut_short_while_recording(self, tmpdir):
+        store = history(tmpdir)
+        store.record('test', [ExecutionResult(0, 1, Path('js/'))])
+        tmpdir.join('.radish', 'history.sqlite.pending').write('[1.0, "test", "cs', mode='a')
+
+        assert [r.path for r in store.records()] == ['js/']
+        assert tmpdir.join('.radish', 'history.sqlite.pending').read() == ''
+
+    @pytest.mark.parametrize('line', [
+        '{"command": "test"}', '[1.0, "test"]', '[1.0, "test", "css/", null, 0, [1], null, null]',
+        '[1.0, null, null, null, 0, 1.0, null, null]',
+    ])
+    def test_skips_results_of_the_wrong_shape(self, tmpdir, line):
+        store = history(tmpdir)
+        store.record('test', [ExecutionResult(0, 1, Path('js/'))])
+        tmpdir.join('.radish', 'history.sqlite.pending').write(line + '\n', mode='a')
+        store.record('test', [ExecutionResult(0, 2, Path('css/'))])
+
+        assert sorted(r.path for r in store.records()) == ['css/', 'js/']
+        assert tmpdir.join('.radish', 'history.sqlite.pending').read() == ''
+
+    def test_nothing_recorded_in_a_new_history(self, tmpdir):
+        assert not history(tmpdir).exists()
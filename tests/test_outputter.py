@@ -1,3 +1,4 @@
+# coding=utf-8
 from __future__ import unicode_literals, print_function
 
 import sys
@@ -5,7 +6,7 @@ from io import StringIO
 
 import pytest
 
-from radish.outputter import OutputStream
+from radish.outputter import OutputStream, SpooledOutputter
 
 
 class TestOutputter(object):
@@ -63,3 +64,67 @@ class TestOutputStream(object):
         assert out == 'Hello'
         assert output.getvalue() == 'Hello'
         assert err == ''
+
+
+class TestSpooledOutputter(object):
+    def test_keeps_output_until_flushed(self, outputter):
+        spooled = SpooledOutputter()
+        spooled.info.write('Hello')
+        spooled.error.write('There')
+
+        assert outputter.info.streams[0].getvalue() == ''
+
+        spooled.flush(outputter)
+
+        assert outputter.info.streams[0].getvalue() == 'Hello'
+        assert outputter.error.streams[0].getvalue() == 'There'
+
+    def test_spills_over_to_a_file_past_the_max_size(self, outputter):
+        spooled = SpooledOutputter(max_size=4)
+        spooled.info.write('Björn ')
+        spooled.info.write('Hello')
+
+        spooled.flush(outputter)
+
+        assert outputter.info.streams[0].getvalue() == 'Björn Hello'
+
+    def test_flushing_twice_only_writes_new_output(self, outputter):
+        spooled = SpooledOutputter()
+        spooled.info.write('Hello')
+        spooled.flush(outputter)
+        spooled.info.write(' There')
+
+        spooled.flush(outputter)
+
+        assert outputter.info.streams[0].getvalue() == 'Hello There'
+
+    def test_going_live_writes_captured_and_further_output_directly(self, outputter):
+        spooled = SpooledOutputter()
+        spooled.info.write('Hello')
+
+        spooled.go_live(outputter)
+        spooled.info.write(' There')
+
+        assert outputter.info.streams[0].getvalue() == 'Hello There'
+
+    def test_nothing_is_spooled_until_there_is_output(self):
+        assert SpooledOutputter().info._spool is None
+
+    def test_flushing_closes_the_spool(self, outputter):
+        spooled = SpooledOutputter()
+        spooled.info.write('Hello')
+        spool = spooled.info._spool
+
+        spooled.flush(outputter)
+
+        assert spool.closed
+        assert spooled.info._spool is None
+
+    def test_closing_throws_away_what_was_captured(self, outputter):
+        spooled = SpooledOutputter()
+        spooled.info.write('Hello')
+
+        spooled.close()
+        spooled.flush(outputter)
+
+        assert outputter.info.streams[0].getvalue() == ''
@@ -2,7 +2,7 @@ from __future__ import unicode_literals
 
 import pytest
 
-from radish.path import Path
+from radish.path import Path, PathIndex
 
 
 class TestPath(object):
@@ -53,6 +53,11 @@ class TestPath(object):
 
         assert path.match('extension/cool-extension/') == 'extension/cool-extension/'
 
+    def test_expanded_glob_within_a_segment(self):
+        path = Path('extension/ext-*/')
+
+        assert path.match('extension/ext-cool/a.py') == 'extension/ext-cool/'
+
     def test_assert_none_paths_are_equal(self):
         assert Path(None) == Path(None)
 
@@ -83,3 +88,87 @@ class TestPath(object):
         def test_raises_not_implemented_when_sorting_for_others(self):
             with pytest.raises(NotImplementedError):
                 sorted([1, Path('/a')])
+
+
+class TestPathIndex(object):
+    def test_returns_nothing_when_no_path_matches(self):
+        index = PathIndex([Path('extensions/cool-extension/')])
+
+        assert index.match('src/a.py') == set()
+
+    def test_matches_simple_file(self):
+        index = PathIndex([Path('extensions/cool-extension/'), Path('frontend/js/')])
+
+        assert index.match('extensions/cool-extension/src/a.py') == {'extensions/cool-extension/'}
+
+    def test_matches_all_nested_paths(self):
+        index = PathIndex([Path('frontend/'), Path('frontend/js/')])
+
+        assert index.match('frontend/js/app.js') == {'frontend/', 'frontend/js/'}
+
+    def test_path_without_trailing_slash_matches_as_a_prefix(self):
+        index = PathIndex([Path('frontend/js')])
+
+        assert index.match('frontend/jsx/app.js') == {'frontend/js'}
+
+    def test_expands_glob_to_the_matched_directory(self):
+        index = PathIndex([Path('extensions/*/')])
+
+        assert index.match('extensions/cool-extension/src/a.py') == {'extensions/cool-extension/'}
+
+    def test_expands_glob_within_a_segment(self):
+        index = PathIndex([Path('extensions/ext-*/')])
+
+        assert index.match('extensions/ext-cool/src/a.py') == {'extensions/ext-cool/'}
+        assert index.match('extensions/cool/src/a.py') == set()
+
+    def test_doesnt_match_against_glob_when_its_a_file(self):
+        index = PathIndex([Path('extensions/*/')])
+
+        assert index.match('extensions/cool-extension') == set()
+
+    def test_matches_the_same_as_path_match(self):
+        paths = [Path('extensions/*/'), Path('frontend/js'), Path('*/'), Path('a/b/')]
+        index = PathIndex(paths)
+
+        for filename in ['extensions/a/b.py', 'frontend/jsx/a', 'a/b/c', 'a', 'b/c/d']:
+            expected = {m for m in (path.match(filename) for path in paths) if m}
+            assert index.match(filename) == expected
+
+    def test_match_files_returns_unique_matched_paths(self):
+        index = PathIndex([Path('extensions/*/'), Path('js/')])
+
+        assert index.match_files([
+            'extensions/cool-extension/a.py',
+            'extensions/cool-extension/b.py',
+            'js/a.js',
+            'README.md',
+        ]) == {'extensions/cool-extension/', 'js/'}
+
+    def test_match_files_stops_reading_once_every_path_matched(self):
+        index = PathIndex([Path('extensions/rules/'), Path('js/')])
+        filenames = iter(['js/a.js', 'extensions/rules/a.py', 'extensions/rules/b.py'])
+
+        assert index.match_files(filenames) == {'extensions/rules/', 'js/'}
+        assert list(filenames) == ['extensions/rules/b.py']
+
+    def test_match_files_reads_everything_when_there_are_globs(self):
+        index = PathIndex([Path('extensions/*/')])
+        filenames = iter(['extensions/rules/a.py', 'extensions/roles/a.py'])
+
+        assert index.match_files(filenames) == {'extensions/rules/', 'extensions/roles/'}
+        assert list(filenames) == []
+
+    def test_match_files_closes_the_iterator_when_done(self):
+        closed = []
+
+        def filenames():
+            try:
+                yield 'js/a.js'
+                yield 'js/b.js'
+            finally:
+                closed.append(True)
+
+        PathIndex([Path('js/')]).match_files(filenames())
+
+        assert closed == [True]
@@ -0,0 +1,199 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from radish import scheduler
+
+
+class TestOrderByTimings(object):
+    def test_orders_longest_expected_first(self):
+        items = [('a/', 'x'), ('b/', 'x'), ('c/', 'x')]
+
+        assert scheduler.order_by_timings(items, {'a/': 1, 'b/': 5, 'c/': 3}) == [
+            ('b/', 'x'), ('c/', 'x'), ('a/', 'x')
+        ]
+
+    def test_items_without_timings_are_expected_to_take_the_average(self):
+        items = [('a/', 'x'), ('b/', 'x'), ('new/', 'x')]
+
+        assert scheduler.order_by_timings(items, {'a/': 1, 'b/': 5}) == [
+            ('b/', 'x'), ('new/', 'x'), ('a/', 'x')
+        ]
+
+    def test_keeps_the_order_without_timings(self):
+        items = [('b/', 'x'), ('a/', 'x')]
+
+        assert scheduler.order_by_timings(items, {}) == items
+
+
+class TestExpectedTimes(object):
+    def test_names_without_a_timing_are_expected_to_take_the_average(self):
+        assert scheduler.expected_times({'a/': 1, 'b/': 5}, ['a/', 'new/']) == {
+            'a/': 1, 'new/': 3
+        }
+
+    def test_nothing_is_expected_without_timings(self):
+        assert scheduler.expected_times({}, ['a/']) == {'a/': 0.0}
+
+
+class TestPredictRunTime(object):
+    def test_everything_in_sequence_with_one_worker(self):
+        assert scheduler.predict_run_time([1, 2, 3], 1) == 6
+
+    def test_starts_each_item_on_the_first_free_worker(self):
+        assert scheduler.predict_run_time([5, 3, 3, 1], 2) == 6
+
+    def test_nothing_to_run_takes_no_time(self):
+        assert scheduler.predict_run_time([], 4) == 0
+
+
+class TestSampleLoad(object):
+    def test_reads_the_load_pressure_and_memory(self, tmpdir):
+        tmpdir.join('loadavg').write('3.50 2.00 1.00 2/300 1234\n')
+        tmpdir.join('pressure', 'cpu').write(
+            'some avg10=12.50 avg60=3.00 avg300=1.00 total=100\n'
+            'full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n',
+            ensure=True
+        )
+        tmpdir.join('pressure', 'memory').write(
+            'some avg10=1.25 avg60=0.00 avg300=0.00 total=0\n'
+            'full avg10=0.50 avg60=0.00 avg300=0.00 total=0\n'
+        )
+        tmpdir.join('meminfo').write(
+            'MemTotal:       16000000 kB\n'
+            'MemFree:         1000000 kB\n'
+            'MemAvailable:    4000000 kB\n'
+        )
+
+        assert scheduler.sample_load(str(tmpdir)) == scheduler.LoadSample(
+            load_average=3.5, runnable=1, cpu_pressure=12.5, memory_pressure=1.25,
+            memory_available=0.25
+        )
+
+    def test_values_the_kernel_does_not_report_are_none(self, tmpdir):
+        assert scheduler.sample_load(str(tmpdir)) == scheduler.LoadSample(None, None, None, None, None)
+
+
+class TestConcurrencyController(object):
+    IDLE = scheduler.LoadSample(0.0, 0, 0.0, 0.0, 0.8)
+
+    def _controller(self, samples, **kwargs):
+        now = [0.0]
+
+        def clock():
+            now[0] += 1
+            return now[0]
+
+        samples = iter(samples)
+        kwargs.setdefault('cpus', 4)
+        return scheduler.ConcurrencyController(
+            sample=lambda: next(samples), clock=clock, interval=1, **kwargs
+        )
+
+    def test_starts_as_many_jobs_as_there_are_idle_cpus(self):
+        controller = self._controller([scheduler.LoadSample(1.0, None, None, None, None)])
+
+        assert controller.jobs == 3
+
+    def test_adds_jobs_while_the_cpus_are_idle_up_to_the_maximum(self):
+        controller = self._controller([self.IDLE] * 4, max_jobs=5)
+
+        assert [controller.update() for _ in range(3)] == [5, 5, 5]
+        assert controller.changes == [(0.0, 4), (1.0, 5)]
+
+    def test_removes_a_job_while_the_cpus_are_overloaded(self):
+        controller = self._controller([self.IDLE, scheduler.LoadSample(8.0, 8, 60.0, 0.0, 0.8)])
+
+        assert controller.update() == 3
+
+    def test_removes_a_job_as_soon_as_more_are_runnable_than_the_cpus_handle(self):
+        controller = self._controller([self.IDLE, scheduler.LoadSample(0.5, 8, None, 0.0, 0.8)])
+
+        assert controller.update() == 3
+
+    def test_adds_jobs_from_the_runnable_processes_without_pressure(self):
+        controller = self._controller(
+            [scheduler.LoadSample(3.0, 1, None, None, None)] * 2, max_jobs=4
+        )
+
+        assert controller.update() == 2
+
+    def test_adds_no_jobs_while_the_last_minute_was_overloaded(self):
+        recovering = scheduler.LoadSample(6.0, 0, 0.0, 0.0, 0.8)
+        controller = self._controller([self.IDLE, recovering], max_jobs=8)
+
+        assert controller.update() == 4
+
+    def test_halves_the_jobs_while_memory_is_tight(self):
+        controller = self._controller([self.IDLE, scheduler.LoadSample(0.0, 0, 0.0, 30.0, 0.05)])
+
+        assert controller.update() == 2
+
+    def test_never_goes_below_the_minimum(self):
+        busy = scheduler.LoadSample(16.0, 16, 90.0, 50.0, 0.01)
+        controller = self._controller([busy] * 4, min_jobs=2)
+
+        assert [controller.update() for _ in range(3)] == [2, 2, 2]
+
+    def test_keeps_the_jobs_without_load_information(self):
+        unknown = scheduler.LoadSample(None, None, None, None, None)
+        controller = self._controller([unknown] * 2)
+
+        assert controller.update() == 4
+
+    def test_samples_at_most_once_per_interval(self):
+        samples = []
+
+        def sample():
+            samples.append(1)
+            return self.IDLE
+
+        controller = scheduler.ConcurrencyController(
+            sample=sample, clock=lambda: 0.0, interval=10, cpus=2
+        )
+        controller.update()
+        controller.update()
+
+        assert len(samples) == 2
+
+
+class TestParseMemory(object):
+    @pytest.mark.parametrize('value, kilobytes', [
+        (None, None),
+        (512, 512 * 1024),
+        ('100K', 100),
+        ('512M', 512 * 1024),
+        ('3G', 3 * 1024 ** 2),
+        ('1.5GiB', int(1.5 * 1024 ** 2)),
+        ('2gb', 2 * 1024 ** 2),
+    ])
+    def test_parses_amounts_of_memory_into_kilobytes(self, value, kilobytes):
+        assert scheduler.parse_memory(value) == kilobytes
+
+    def test_raises_value_error_for_anything_else(self):
+        with pytest.raises(ValueError):
+            scheduler.parse_memory('lots')
+
+
+class TestResourceBudget(object):
+    def test_fits_while_there_is_enough_left(self):
+        budget = scheduler.ResourceBudget(cpu=4, memory=4096)
+        budget.take(scheduler.Resources(cpu=2, memory=3072))
+
+        assert budget.fits(scheduler.Resources(cpu=2, memory=1024))
+        assert not budget.fits(scheduler.Resources(cpu=3, memory=None))
+        assert not budget.fits(scheduler.Resources(cpu=1, memory=2048))
+
+    def test_given_back_resources_fit_again(self):
+        budget = scheduler.ResourceBudget(cpu=1)
+        resources = scheduler.Resources(cpu=1, memory=10 ** 9)
+        budget.take(resources)
+        budget.give(resources)
+
+        assert budget.fits(resources)
+
+    def test_reads_the_available_memory(self, tmpdir):
+        tmpdir.join('meminfo').write('MemTotal: 16000 kB\nMemAvailable: 4000 kB\n')
+
+        assert scheduler.available_memory(str(tmpdir)) == 4000
+        assert scheduler.available_memory(str(tmpdir.join('missing'))) is None
@@ -21,3 +21,49 @@ class TestSplit(object):
 
         def test_index_is_converted_to_integer(self):
             assert splitter.split(['1', '2', '3'], splits=2, index='1') == ['2']
+
+    def test_returns_the_first_split_for_index_0(self):
+        assert splitter.split(['1', '2', '3'], splits=2, index=0) == ['1', '3']
+
+
+class TestSplitByTimings(object):
+    def test_balances_the_run_time_of_each_split(self):
+        timings = {'a': 10, 'b': 8, 'c': 3, 'd': 3, 'e': 2}
+
+        assert splitter.split(['a', 'b', 'c', 'd', 'e'], splits=2, timings=timings) == [
+            ['a', 'd'],
+            ['b', 'c', 'e'],
+        ]
+
+    def test_items_without_a_timing_take_the_median_time(self):
+        timings = {'a': 10, 'b': 2, 'c': 4}
+
+        assert splitter.split(['c', 'a', 'b', 'd'], splits=2, timings=timings) == [
+            ['a'],
+            ['c', 'd', 'b'],
+        ]
+
+    def test_splits_consistently_when_no_item_has_a_timing(self):
+        timings = {'x': 10}
+
+        assert splitter.split(['c', 'a', 'b', 'd'], splits=2, timings=timings) == [
+            ['a', 'c'],
+            ['b', 'd'],
+        ]
+
+    def test_split_without_timings_is_the_same_regardless_of_input_order(self):
+        assert splitter.split({'c', 'a', 'b', 'd'}, splits=2) == splitter.split(
+            ['d', 'c', 'b', 'a'], splits=2
+        ) == [['a', 'c'], ['b', 'd']]
+
+    def test_is_the_same_regardless_of_input_order(self):
+        timings = {'a': 1, 'b': 1, 'c': 1}
+
+        assert splitter.split(['c', 'b', 'a'], splits=2, timings=timings) == splitter.split(
+            ['a', 'b', 'c'], splits=2, timings=timings
+        )
+
+    def test_returns_the_split_at_the_index(self):
+        timings = {'a': 10, 'b': 8, 'c': 3}
+
+        assert splitter.split(['a', 'b', 'c'], splits=2, index=1, timings=timings) == ['b', 'c']
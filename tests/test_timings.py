@@ -0,0 +1,41 @@
+from __future__ import unicode_literals
+
+from radish.executor import ExecutionResult
+from radish.path import Path
+from radish.timings import Timings
+from radish.utils import TimeTaken
+
+
+class TestTimings(object):
+    def test_loading_a_missing_file_gives_no_timings(self, tmpdir):
+        assert Timings.load(str(tmpdir.join('timings.json'))).for_command('test') == {}
+
+    def test_records_the_run_time_of_successful_results(self, tmpdir):
+        timings = Timings(str(tmpdir.join('timings.json')))
+
+        timings.record('test', [
+            ExecutionResult(0, TimeTaken(1.5), Path('js/')),
+            ExecutionResult(1, TimeTaken(9), Path('css/')),
+            ExecutionResult.from_cache(Path('html/')),
+            ExecutionResult.none(),
+        ])
+
+        assert timings.for_command('test') == {'js/': 1.5}
+
+    def test_smooths_run_times_over_runs(self, tmpdir):
+        timings = Timings(str(tmpdir.join('timings.json')))
+
+        timings.record('test', [ExecutionResult(0, 2, Path('js/'))])
+        timings.record('test', [ExecutionResult(0, 4, Path('js/'))])
+
+        assert timings.for_command('test') == {'js/': 3}
+
+    def test_saved_timings_can_be_loaded(self, tmpdir):
+        filename = str(tmpdir.join('.radish', 'timings.json'))
+        timings = Timings(filename)
+        timings.record('test', [ExecutionResult(0, 2, Path('js/'))])
+
+        timings.save()
+
+        assert Timings.load(filename).for_command('test') == {'js/': 2}
+        assert Timings.load(filename).for_command('lint') == {}
@@ -0,0 +1,232 @@
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pytest
+
+from radish.cli import CLI
+from radish.command import Command
+from radish.executor import Executor
+from radish.outputter import SpooledOutputter
+from radish.path import Path
+from radish.watch import InotifyWatcher, PollingWatcher, Watch, create_watcher, wait_for_changes
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+@pytest.fixture
+def tree(tmpdir):
+    tmpdir.join('app', 'main.py').write('\n', ensure=True)
+    tmpdir.join('lib', 'util.py').write('\n', ensure=True)
+    tmpdir.join('.git', 'index').write('\n', ensure=True)
+
+    return tmpdir
+
+
+class BaseTestWatcher(object):
+    def _watcher(self, tree):
+        raise NotImplementedError
+
+    def _changes(self, watcher):
+        return wait_for_changes(watcher, debounce=0.1, timeout=5)
+
+    def test_reports_modified_files(self, tree):
+        watcher = self._watcher(tree)
+        tree.join('app', 'main.py').write('print("changed")\n')
+
+        assert self._changes(watcher) == {'app/main.py'}
+
+    def test_reports_created_and_removed_files(self, tree):
+        watcher = self._watcher(tree)
+        tree.join('app', 'new.py').write('\n')
+        tree.join('lib', 'util.py').remove()
+
+        assert {'app/new.py', 'lib/util.py'} <= self._changes(watcher)
+
+    def test_reports_files_in_new_directories(self, tree):
+        watcher = self._watcher(tree)
+        tree.join('app', 'sub', 'module.py').write('\n', ensure=True)
+
+        assert 'app/sub/module.py' in self._changes(watcher)
+
+    def test_leaves_out_paths_that_are_not_watched(self, tree):
+        watcher = self._watcher(tree)
+        tree.join('docs', 'index.md').write('\n', ensure=True)
+
+        assert watcher.changes(0.2) == set()
+
+    def test_nothing_changed_before_the_timeout(self, tree):
+        assert self._watcher(tree).changes(0.1) == set()
+
+
+class TestPollingWatcher(BaseTestWatcher):
+    def _watcher(self, tree):
+        return PollingWatcher(str(tree), [Path('app/'), Path('lib/')], interval=0.05)
+
+
+@pytest.mark.skipif(not InotifyWatcher.available(), reason='inotify is Linux only')
+class TestInotifyWatcher(BaseTestWatcher):
+    def _watcher(self, tree):
+        return InotifyWatcher(str(tree), [Path('app/'), Path('lib/')])
+
+    def test_watches_the_directory_of_globbed_paths(self, tree):
+        watcher = InotifyWatcher(str(tree), [Path('*/')])
+        tree.join('lib', 'util.py').write('# changed\n')
+
+        assert self._changes(watcher) == {'lib/util.py'}
+
+    def test_changes_in_git_directories_are_ignored(self, tree):
+        watcher = InotifyWatcher(str(tree), [Path('*/')])
+        tree.join('.git', 'index').write('changed\n')
+
+        assert watcher.changes(0.2) == set()
+
+
+def test_create_watcher_polls_when_asked_to(tree):
+    assert isinstance(create_watcher(str(tree), [Path('app/')], poll=True), PollingWatcher)
+
+
+class TestWaitForChanges(object):
+    def test_collects_changes_until_none_arrive_within_the_debounce(self):
+        watcher = mock.Mock()
+        watcher.changes.side_effect = [{'a'}, {'b'}, {'a', 'c'}, set()]
+
+        assert wait_for_changes(watcher, debounce=0.5) == {'a', 'b', 'c'}
+        assert watcher.changes.call_args_list[1:] == [mock.call(0.5)] * 3
+
+    def test_nothing_changed_before_the_timeout(self):
+        watcher = mock.Mock()
+        watcher.changes.return_value = set()
+
+        assert wait_for_changes(watcher, debounce=0.5, timeout=1) == set()
+        watcher.changes.assert_called_once_with(1)
+
+
+class TestWatch(object):
+    @pytest.fixture
+    def watch(self, cli):
+        cli.executor = mock.Mock(spec=['execute', 'terminate', 'process_groups'])
+        cli.executor.execute.return_value = mock.Mock(success=True, run_time=0)
+
+        return Watch(cli, cli.find_command('test'), mock.Mock())
+
+    def _wait(self, watch):
+        for thread in list(watch._threads.values()):
+            thread.join(5)
+
+    def test_runs_the_projects_the_changed_files_belong_to(self, watch):
+        assert watch.changed(['js/mobile/index.js', 'README.md']) == [Path('js/mobile/')]
+        self._wait(watch)
+
+        watch.cli.executor.execute.assert_called_once_with(Path('js/mobile/'), 'npm test', mock.ANY)
+        out = watch.cli.outputter.info.streams[0].getvalue()
+        assert 'Running test for js/mobile/:\n' in out
+        assert 'js/mobile/: Success (0)\n' in out
+
+    def test_runs_the_projects_depending_on_them_as_well(self, watch):
+        watch.cli.config['depends_on'] = {'js/*/': 'extensions/rules/'}
+
+        assert watch.changed(['extensions/rules/setup.py']) == [
+            'extensions/rules/', 'js/frontend/', 'js/mobile/'
+        ]
+        self._wait(watch)
+
+    def test_dependents_start_once_their_dependencies_succeeded(self, watch):
+        watch.cli.config['depends_on'] = {'js/*/': 'extensions/rules/'}
+        events = []
+
+        def execute(path, *args):
+            events.append(('start', str(path)))
+            time.sleep(0.1)
+            events.append(('end', str(path)))
+            return mock.Mock(success=True, run_time=0)
+
+        watch.cli.executor.execute.side_effect = execute
+
+        watch.changed(['extensions/rules/setup.py'])
+        self._wait(watch)
+        self._wait(watch)
+
+        assert events[0:2] == [('start', 'extensions/rules/'), ('end', 'extensions/rules/')]
+        assert sorted(events[2:]) == [
+            ('end', 'js/frontend/'), ('end', 'js/mobile/'),
+            ('start', 'js/frontend/'), ('start', 'js/mobile/'),
+        ]
+
+    def test_dependents_of_a_failed_project_are_skipped(self, watch):
+        watch.cli.config['depends_on'] = {'js/*/': 'extensions/rules/'}
+        watch.cli.executor.execute.return_value = mock.Mock(success=False, run_time=0)
+
+        watch.changed(['extensions/rules/setup.py'])
+        self._wait(watch)
+
+        watch.cli.executor.execute.assert_called_once_with(
+            Path('extensions/rules/'), mock.ANY, mock.ANY
+        )
+        errors = watch.cli.outputter.error.streams[0].getvalue()
+        assert 'Skipping "js/frontend/" because "extensions/rules/" failed\n' in errors
+        assert 'Skipping "js/mobile/" because "extensions/rules/" failed\n' in errors
+
+    def test_changes_in_ignored_directories_run_nothing(self, watch):
+        assert watch.changed(['js/mobile/.git/HEAD']) == []
+
+    def test_terminates_and_restarts_a_project_that_changes_while_running(
+        self, outputter, tmpdir, monkeypatch
+    ):
+        monkeypatch.chdir(tmpdir)
+        runs = tmpdir.join('runs')
+        tmpdir.join('app').ensure(dir=True)
+        command = Command('test', {'app/': 'echo run >> {0}; exec sleep 10'.format(runs)})
+        cli = CLI(
+            base_path=str(tmpdir),
+            config={'paths': [Path('app/')], 'commands': {command}},
+            executor=Executor(outputter=outputter, base_path=str(tmpdir)),
+            outputter=outputter,
+        )
+        watch = Watch(cli, command, mock.Mock())
+        deadline = time.time() + 5
+
+        with mock.patch.object(SpooledOutputter, 'close', autospec=True,
+                               side_effect=SpooledOutputter.close) as close:
+            watch.changed(['app/main.py'])
+            while (not runs.check() or not cli.executor._running) and time.time() < deadline:
+                time.sleep(0.01)
+            watch.changed(['app/main.py'])
+            while len(runs.readlines()) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            # The output of the terminated run is thrown away
+            assert close.called
+            watch.stop(grace_period=0.1)
+
+        assert len(runs.readlines()) == 2
+        assert 'Restarting test for app/, it changed\n' in outputter.info.streams[0].getvalue()
+
+    def test_run_handles_bursts_of_changes_until_stopped(self, watch):
+        watch.watcher.changes.side_effect = [{'js/mobile/a.js'}, set(), {'js/frontend/b.js'}, set()]
+        watch.changed = mock.Mock()
+
+        watch.run(iterations=2)
+
+        assert watch.changed.call_args_list == [
+            mock.call({'js/mobile/a.js'}), mock.call({'js/frontend/b.js'})
+        ]
+
+    def test_uses_process_groups_to_stop_what_projects_started(self, watch):
+        assert watch.cli.executor.process_groups is True
+
+    def test_stop_waits_for_the_running_projects(self, watch):
+        finished = threading.Event()
+        watch.cli.executor.execute.side_effect = lambda *args: finished.wait(5) and mock.Mock(
+            success=True, run_time=0
+        )
+        watch.cli.executor.terminate.side_effect = lambda **kwargs: finished.set()
+
+        watch.changed(['js/mobile/index.js'])
+        watch.stop()
+
+        assert watch._threads == {}
+        watch.watcher.close.assert_called_once_with()